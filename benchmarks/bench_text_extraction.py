@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import argparse
+import pdfplumber
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from text_preprocessor import extract_text
+
+
+def get_non_bold_lines_legacy(pdf_path):
+    """Non-bold lines of the first page found with pdfplumber (previous implementation)."""
+    with pdfplumber.open(pdf_path) as pdf:
+        if not pdf.pages:
+            return []
+
+        lines = {}
+        for char in pdf.pages[0].chars:
+            lines.setdefault(round(char["top"], 1), []).append(char)
+
+        non_bold_lines = []
+        for line_chars in lines.values():
+            if not any("Bold" in char["fontname"] for char in line_chars):
+                line_text = "".join(char["text"] for char in line_chars).strip()
+                if line_text:
+                    non_bold_lines.append(line_text)
+
+        return non_bold_lines
+
+
+def extract_text_legacy(pdf_path):
+    """Text of a PDF without the bold first page lines, using pdfplumber and PyMuPDF (previous implementation)."""
+    non_bold_lines_first_page = get_non_bold_lines_legacy(pdf_path)
+
+    doc = fitz.open(pdf_path)
+    text = []
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        page_lines = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                line_text = "".join([span.get("text", "") for span in line.get("spans", [])]).strip()
+                if page_num == 0 and line_text not in non_bold_lines_first_page:
+                    continue
+                page_lines.append(line_text)
+        if page_lines:
+            text.append("\n".join(page_lines))
+    doc.close()
+
+    return "\n".join(text)
+
+
+def time_extraction(function, pdf_paths, repeats):
+    """Best wall time in seconds over repeats of running function on every PDF, and the outputs."""
+    best = float("inf")
+    outputs = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        outputs = [function(pdf_path) for pdf_path in pdf_paths]
+        best = min(best, time.perf_counter() - start_time)
+    return best, outputs
+
+
+def main(input_dir, repeats):
+    pdf_paths = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".pdf"))
+    if not pdf_paths:
+        print(f"No PDFs found in {input_dir}")
+        return
+    total_mb = sum(os.path.getsize(p) for p in pdf_paths) / 1e6
+    total_pages = 0
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            total_pages += len(doc)
+
+    print(f"{len(pdf_paths)} PDFs, {total_pages} pages, {total_mb:.1f} MB, best of {repeats} runs")
+
+    legacy_time, legacy_outputs = time_extraction(extract_text_legacy, pdf_paths, repeats)
+    new_time, new_outputs = time_extraction(extract_text, pdf_paths, repeats)
+
+    for name, elapsed in (("pdfplumber + PyMuPDF", legacy_time), ("PyMuPDF only", new_time)):
+        print(f"{name:22s} {elapsed:8.2f} s  {len(pdf_paths) / elapsed:8.1f} PDFs/s  {total_pages / elapsed:8.1f} pages/s")
+    print(f"Speedup: {legacy_time / new_time:.1f}x")
+
+    different = [p for p, a, b in zip(pdf_paths, legacy_outputs, new_outputs) if a != b]
+    print(f"Identical output for {len(pdf_paths) - len(different)} of {len(pdf_paths)} PDFs")
+    for pdf_path in different:
+        print(f"  differs: {os.path.basename(pdf_path)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the PyMuPDF-only text extraction with the previous pdfplumber + PyMuPDF one.")
+    parser.add_argument("input_dir", nargs="?", default="./transcripts", help="Folder of transcript PDFs")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of timed runs, the best one is reported")
+    args = parser.parse_args()
+
+    main(args.input_dir, args.repeats)
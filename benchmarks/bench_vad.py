@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import wave
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from vad_segmenter import segment_file
+
+
+def write_synthetic_lecture(path, minutes, sample_rate=16000, seed=0):
+    """Write a 16-bit mono WAV of noise bursts (speech) separated by short quiet gaps (pauses)."""
+    rng = np.random.default_rng(seed)
+    remaining = int(minutes * 60 * sample_rate)
+    with wave.open(path, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(sample_rate)
+        while remaining > 0:
+            speech = rng.normal(0, 4000, min(int(sample_rate * rng.uniform(1, 12)), remaining))
+            pause = rng.normal(0, 30, int(sample_rate * rng.uniform(0.1, 1.0)))
+            chunk = np.concatenate((speech, pause))[:remaining]
+            audio.writeframes(chunk.clip(-32768, 32767).astype("<i2").tobytes())
+            remaining -= len(chunk)
+
+
+def run(audio_filepath, block_seconds):
+    """Segment a file, returning the result and the peak traced memory in MB."""
+    tracemalloc.start()
+    result = segment_file(audio_filepath, block_seconds=block_seconds)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, peak
+
+
+def main(minutes_list, block_seconds):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'audio':>10s} {'mode':>14s} {'time (s)':>9s} {'RTF':>9s} {'peak MB':>8s} {'segments':>9s}")
+        for minutes in minutes_list:
+            audio_filepath = os.path.join(tmp_dir, f"lecture_{minutes}min.wav")
+            write_synthetic_lecture(audio_filepath, minutes)
+
+            for mode, block in (("whole file", None), (f"chunked {block_seconds:g}s", block_seconds)):
+                result, peak = run(audio_filepath, block)
+                rtf = result["processing_time"] / result["duration"]
+                print(f"{minutes:>7g} min {mode:>14s} {result['processing_time']:9.3f} {rtf:9.5f} {peak:8.1f} {len(result['segments']):9d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time factor and peak memory of the VAD segmenter on synthetic lectures.")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 60, 180], help="Lengths of the synthetic lectures")
+    parser.add_argument("--block-seconds", type=float, default=60.0, help="Block size of the chunked mode")
+    args = parser.parse_args()
+
+    main(args.minutes, args.block_seconds)
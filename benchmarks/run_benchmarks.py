@@ -0,0 +1,280 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "scripts"))
+from synthetic import write_transcript_pdf, write_lecture_files, write_manifest
+
+
+# Size of the synthetic corpora of every scale
+SCALES = {
+    "small": {"pdfs": 10, "pdf_pages": 5, "lectures": 20, "lecture_seconds": 5, "manifest_rows": 1000},
+    "medium": {"pdfs": 100, "pdf_pages": 10, "lectures": 200, "lecture_seconds": 10, "manifest_rows": 100000},
+    "large": {"pdfs": 500, "pdf_pages": 20, "lectures": 1000, "lecture_seconds": 10, "manifest_rows": 1000000},
+}
+
+
+def build_corpus(data_dir, scale):
+    """Write the synthetic inputs of a scale under data_dir/<scale>, unless they already exist."""
+    params = SCALES[scale]
+    corpus_dir = os.path.join(data_dir, scale)
+    done_marker = os.path.join(corpus_dir, "corpus.json")
+    if os.path.exists(done_marker):
+        return corpus_dir
+
+    start_time = time.perf_counter()
+    pdf_dir = os.path.join(corpus_dir, "pdfs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    for i in range(1, params["pdfs"] + 1):
+        write_transcript_pdf(os.path.join(pdf_dir, f"lec{i}.pdf"), pages=params["pdf_pages"], seed=i)
+    write_lecture_files(os.path.join(corpus_dir, "audio"), os.path.join(corpus_dir, "text"),
+                        params["lectures"], params["lecture_seconds"])
+    write_manifest(os.path.join(corpus_dir, "manifest.jsonl"), params["manifest_rows"])
+
+    with open(done_marker, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    print(f"Built the {scale} corpus in {time.perf_counter() - start_time:.1f} s")
+    return corpus_dir
+
+
+# Every benchmark gets the corpus directory and a scratch directory. It returns a setup function
+# (not timed) and a run function (timed) returning the number of items and bytes processed.
+
+def bench_extract_text(corpus_dir, work_dir):
+    from text_preprocessor import extract_text
+    pdf_dir = os.path.join(corpus_dir, "pdfs")
+    pdf_paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir))
+
+    def run():
+        for pdf_path in pdf_paths:
+            extract_text(pdf_path)
+        return len(pdf_paths), sum(os.path.getsize(p) for p in pdf_paths)
+    return None, run
+
+
+def bench_clean_text(corpus_dir, work_dir):
+    from text_preprocessor import extract_text, clean_text
+    pdf_dir = os.path.join(corpus_dir, "pdfs")
+    raw_texts = []
+
+    def setup():
+        raw_texts.extend(extract_text(os.path.join(pdf_dir, f)) for f in sorted(os.listdir(pdf_dir)))
+
+    def run():
+        for raw_text in raw_texts:
+            clean_text(raw_text)
+        return len(raw_texts), sum(len(t.encode("utf-8")) for t in raw_texts)
+    return setup, run
+
+
+def bench_create_training_manifest(corpus_dir, work_dir):
+    from manifest_creator import create_training_manifest
+    output_file = os.path.join(work_dir, "train_manifest.jsonl")
+
+    def run():
+        create_training_manifest(os.path.join(corpus_dir, "audio"), os.path.join(corpus_dir, "text"), output_file)
+        return sum(1 for _ in open(output_file, "rb")), os.path.getsize(output_file)
+    return None, run
+
+
+def bench_update_training_manifest(corpus_dir, work_dir):
+    from manifest_creator import create_training_manifest
+    output_file = os.path.join(work_dir, "train_manifest.jsonl")
+    audio_dir, text_dir = os.path.join(corpus_dir, "audio"), os.path.join(corpus_dir, "text")
+
+    def setup():
+        create_training_manifest(audio_dir, text_dir, output_file)
+
+    def run():
+        create_training_manifest(audio_dir, text_dir, output_file, update=True)
+        return sum(1 for _ in open(output_file, "rb")), os.path.getsize(output_file)
+    return setup, run
+
+
+def bench_build_index(corpus_dir, work_dir):
+    from manifest_index import build_index
+    manifest_path = os.path.join(corpus_dir, "manifest.jsonl")
+
+    def run():
+        index = build_index(manifest_path, os.path.join(work_dir, "manifest.idx.npz"))
+        return len(index["offsets"]), os.path.getsize(manifest_path)
+    return None, run
+
+
+def bench_compute_stats(corpus_dir, work_dir):
+    from manifest_stats import compute_stats
+    manifest_path = os.path.join(corpus_dir, "manifest.jsonl")
+
+    def run():
+        stats = compute_stats(manifest_path, num_workers=1)
+        return stats.num_entries, os.path.getsize(manifest_path)
+    return None, run
+
+
+def bench_load_cached_stats(corpus_dir, work_dir):
+    from manifest_stats import load_stats
+    manifest_path = os.path.join(corpus_dir, "manifest.jsonl")
+    cache_path = os.path.join(work_dir, "manifest.stats.npz")
+
+    def setup():
+        load_stats(manifest_path, num_workers=1, cache_path=cache_path)
+
+    def run():
+        stats = load_stats(manifest_path, cache_path=cache_path)
+        return stats.num_entries, os.path.getsize(cache_path)
+    return setup, run
+
+
+BENCHMARKS = {
+    "extract_text": bench_extract_text,
+    "clean_text": bench_clean_text,
+    "create_training_manifest": bench_create_training_manifest,
+    "create_training_manifest_update": bench_update_training_manifest,
+    "build_index": bench_build_index,
+    "compute_stats": bench_compute_stats,
+    "load_cached_stats": bench_load_cached_stats,
+}
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB (MiB), None if it cannot be measured.
+    On Unix it is ru_maxrss, which is in KiB on Linux and the BSDs but in bytes on macOS. The
+    resource module does not exist on Windows, where the peak working set of psutil is used if
+    psutil is installed (its current RSS on other platforms without resource).
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", info.rss)
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            peak *= 1024
+    return peak / 1024 ** 2
+
+
+def run_one(name, corpus_dir):
+    """Run one benchmark in the current (fresh) process. Returns its measurements."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        setup, run = BENCHMARKS[name](corpus_dir, work_dir)
+        # Progress prints of the stages are not part of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup is not None:
+                setup()
+            rss_before = peak_rss_mb()
+            start_time = time.perf_counter()
+            items, num_bytes = run()
+            seconds = time.perf_counter() - start_time
+            rss_after = peak_rss_mb()
+        return {
+            "seconds": seconds,
+            "items": items,
+            "bytes": num_bytes,
+            "items_per_second": items / seconds,
+            "mb_per_second": num_bytes / 1e6 / seconds,
+            "peak_rss_mb": rss_after,
+            "peak_rss_increase_mb": None if rss_after is None else rss_after - rss_before
+        }
+
+
+def git_commit():
+    """Commit of the working tree, with "-dirty" if it has uncommitted changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARKS_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(scales, names, data_dir, repeats=1):
+    """
+    Run every benchmark at every scale, each run in a new process so that peak memory is its own.
+    Returns:
+        dict: Results with the commit, machine and one record per (benchmark, scale), best of repeats.
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for scale in scales:
+        corpus_dir = build_corpus(data_dir, scale)
+        for name in names:
+            runs = []
+            for _ in range(repeats):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_one, name, corpus_dir).result())
+            best = min(runs, key=lambda r: r["seconds"])
+            results.append(dict(best, benchmark=name, scale=scale))
+            print(f"{name:<32}{scale:>8}{best['items']:>10}{best['seconds']:>10.3f}{best['items_per_second']:>12.1f}"
+                  f"{best['mb_per_second']:>10.2f}{format_mb(best['peak_rss_mb']):>10}")
+
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeats": repeats,
+        "results": results
+    }
+
+
+def format_mb(value):
+    """A memory size in MB for the tables, "n/a" when it could not be measured."""
+    return "n/a" if value is None else f"{value:.1f}"
+
+
+def compare(old_path, new):
+    """Print the speed-up of every benchmark of new over the results saved in old_path."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    old_results = {(r["benchmark"], r["scale"]): r for r in old["results"]}
+    print(f"\nCompared with {old['commit'][:12]} ({old['created_at']}):")
+    for result in new["results"]:
+        previous = old_results.get((result["benchmark"], result["scale"]))
+        if previous:
+            memory = "n/a"
+            if result["peak_rss_mb"] and previous.get("peak_rss_mb"):
+                memory = f"x{result['peak_rss_mb'] / previous['peak_rss_mb']:.2f}"
+            print(f"{result['benchmark']:<32}{result['scale']:>8}  time x{result['seconds'] / previous['seconds']:.2f}"
+                  f"  peak memory {memory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the pipeline stages on synthetic corpora and save the results as JSON.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small"], help="Corpus sizes to run")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per benchmark, the fastest is kept")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "nptel_bench_data"),
+                        help="Where the synthetic corpora are written (kept between runs)")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Results file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<32}{'scale':>8}{'items':>10}{'seconds':>10}{'items/s':>12}{'MB/s':>10}{'peak MB':>10}")
+    suite = run_suite(args.scales, args.benchmarks, args.data_dir, args.repeats)
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, "results", f"{suite['commit'][:12]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(suite, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, suite)
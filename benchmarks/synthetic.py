@@ -0,0 +1,81 @@
+import os
+import json
+import wave
+import random
+import fitz  # PyMuPDF
+import numpy as np
+
+
+WORDS = (
+    "the of and to in is that we this a for it be are on as with can so which network layer function "
+    "gradient descent loss weight input output neuron learning deep training data model vector matrix "
+    "activation sigmoid convolution pooling dropout batch normalization backpropagation softmax entropy"
+).split()
+
+
+def sentence(rng, min_words=8, max_words=20):
+    """A random sentence made of lecture-like words."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def write_transcript_pdf(path, pages=5, lines_per_page=40, seed=0):
+    """
+    Write an NPTEL-style transcript PDF: a bold course header on the first page, then lines of
+    text with a "(Refer Slide Time: mm:ss)" marker every few lines.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    seconds = 0
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 60
+        if page_num == 0:
+            for header in ("Deep Learning", "Prof. Mitesh M. Khapra", "Department of Computer Science and Engineering",
+                           f"Lecture - {seed + 1}"):
+                page.insert_text((72, y), header, fontname="hebo", fontsize=12)
+                y += 18
+        for line in range(lines_per_page):
+            if line % 8 == 0:
+                seconds += rng.randint(20, 90)
+                text = f"(Refer Slide Time: {seconds // 60:02d}:{seconds % 60:02d})"
+            else:
+                text = sentence(rng)[:90]
+            page.insert_text((72, y), text, fontname="helv", fontsize=10)
+            y += 16
+            if y > 800:
+                break
+    doc.save(path)
+    doc.close()
+
+
+def write_wav(path, seconds, sample_rate=16000, seed=0):
+    """Write a 16-bit mono WAV of noise of the given length."""
+    rng = np.random.default_rng(seed)
+    with wave.open(path, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(sample_rate)
+        audio.writeframes(rng.normal(0, 3000, int(seconds * sample_rate)).clip(-32768, 32767).astype("<i2").tobytes())
+
+
+def write_lecture_files(audio_dir, text_dir, count, seconds, words=200, seed=0):
+    """Write audio_<n>.wav and lec<n>.txt pairs, the inputs of create_training_manifest."""
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(text_dir, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        write_wav(os.path.join(audio_dir, f"audio_{i}.wav"), seconds, seed=seed + i)
+        with open(os.path.join(text_dir, f"lec{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choice(WORDS) for _ in range(words)))
+
+
+def write_manifest(path, rows, words=(5, 60), seed=0):
+    """Write a JSONL manifest of segment-like entries (durations of 1 to 30 s) without audio files."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+            entry = {"audio_filepath": f"./segments/audio_{i // 100}_{i % 100:04d}.wav",
+                     "duration": round(rng.uniform(1, 30), 3), "text": text}
+            f.write(json.dumps(entry) + "\n")
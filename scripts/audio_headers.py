@@ -0,0 +1,158 @@
+import os
+import struct
+
+
+OGG_MAX_PAGE = 65307  # Largest possible Ogg page: 27 byte header, 255 lacing values, 255 * 255 bytes of data
+
+
+def wav_info(f, file_size):
+    """
+    Read the fmt and data chunk headers of a RIFF/WAVE file, skipping every other chunk.
+    A data chunk with an unset size (0 or 0xFFFFFFFF, written by a stream that could not seek back)
+    is taken to run to the end of the file. data_offset is the position of the first sample.
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no data chunk")
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt_data = f.read(16)
+            if size < 16 or len(fmt_data) < 16:
+                raise ValueError("truncated fmt chunk")
+            fmt = struct.unpack("<HHIIHH", fmt_data)
+            f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            data_start = f.tell()
+            if size in (0, 0xFFFFFFFF) or data_start + size > file_size:
+                size = file_size - data_start
+            break
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)  # Chunks are padded to an even size
+
+    _, channels, sample_rate, _, block_align, bits_per_sample = fmt
+    if block_align == 0 or sample_rate == 0:
+        raise ValueError("fmt chunk with a zero block size or sample rate")
+    return {
+        "format": "wav",
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bits_per_sample": bits_per_sample,
+        "num_samples": size // block_align,
+        "duration": size / block_align / sample_rate,
+        "data_offset": data_start
+    }
+
+
+def flac_info(f):
+    """
+    Read the STREAMINFO block of a FLAC file: sample rate (20 bits), channels - 1 (3 bits),
+    bits per sample - 1 (5 bits) and total samples (36 bits), packed after the frame size fields.
+    """
+    start = f.read(10)
+    if start[:3] == b"ID3":
+        # ID3v2 tag in front of the stream, its size is a 28 bit "synchsafe" integer
+        tag_size = (start[6] << 21) | (start[7] << 14) | (start[8] << 7) | start[9]
+        f.seek(10 + tag_size)
+    else:
+        f.seek(0)
+    if f.read(4) != b"fLaC":
+        raise ValueError("not a FLAC file")
+
+    block_header = f.read(4)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:
+        raise ValueError("FLAC stream does not start with STREAMINFO")
+    streaminfo = f.read(34)
+    packed = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits_per_sample = ((packed >> 36) & 0x1F) + 1
+    num_samples = packed & 0xFFFFFFFFF
+    if sample_rate == 0 or num_samples == 0:
+        raise ValueError("FLAC STREAMINFO does not give the number of samples")
+    return {
+        "format": "flac",
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bits_per_sample": bits_per_sample,
+        "num_samples": num_samples,
+        "duration": num_samples / sample_rate
+    }
+
+
+def ogg_info(f, file_size):
+    """
+    Read an Ogg Opus or Ogg Vorbis file from its first page (codec header) and its last page,
+    whose granule position is the number of samples at the end of the stream.
+    Opus granules count 48 kHz samples and include the pre-skip of the encoder; the sample rate
+    returned for Opus is the one of the encoder input, which decoders resample back to.
+    """
+    first_page = f.read(OGG_MAX_PAGE)
+    if first_page[:4] != b"OggS":
+        raise ValueError("not an Ogg file")
+    num_segments = first_page[26]
+    packet = first_page[27 + num_segments:]
+
+    if packet[:8] == b"OpusHead":
+        channels, pre_skip, input_rate = struct.unpack("<BHI", packet[9:16])
+        codec, granule_rate = "opus", 48000
+    elif packet[:7] == b"\x01vorbis":
+        channels, granule_rate = struct.unpack("<BI", packet[11:16])
+        codec, pre_skip, input_rate = "vorbis", 0, granule_rate
+    else:
+        raise ValueError("Ogg stream is neither Opus nor Vorbis")
+
+    f.seek(max(0, file_size - OGG_MAX_PAGE))
+    tail = f.read()
+    last_page = tail.rfind(b"OggS")
+    if last_page < 0 or last_page + 14 > len(tail):
+        raise ValueError("no complete Ogg page at the end of the file")
+    granule = struct.unpack("<q", tail[last_page + 6:last_page + 14])[0]
+    duration = max(granule - pre_skip, 0) / granule_rate
+    return {
+        "format": codec,
+        "sample_rate": input_rate,
+        "channels": channels,
+        "bits_per_sample": None,
+        "num_samples": round(duration * input_rate),
+        "duration": duration
+    }
+
+
+def probe_audio(audio_filepath):
+    """
+    Get the format, sample rate, channels and duration of an audio file from its container headers,
+    without decoding any audio. WAV, FLAC and Ogg (Opus, Vorbis) are recognised by their first
+    bytes, whatever the file extension. A truncated or corrupt header raises ValueError.
+    Args:
+        audio_filepath (str): Path to the audio file.
+    Returns:
+        dict: format, sample_rate, channels, bits_per_sample (None for lossy formats), num_samples and duration (seconds).
+    """
+    file_size = os.path.getsize(audio_filepath)
+    with open(audio_filepath, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        try:
+            if magic == b"RIFF":
+                return wav_info(f, file_size)
+            if magic in (b"fLaC", b"ID3\x03", b"ID3\x04", b"ID3\x02"):
+                return flac_info(f)
+            if magic == b"OggS":
+                return ogg_info(f, file_size)
+        except (struct.error, IndexError, ZeroDivisionError) as e:
+            # Headers cut short in the middle of a field
+            raise ValueError(f"{audio_filepath}: truncated or corrupt header ({e})") from e
+    raise ValueError(f"{audio_filepath}: unknown audio format")
+
+
+def pcm_size(info):
+    """Size in bytes of the same audio as a 16-bit PCM WAV (44 byte header)."""
+    return 44 + round(info["duration"] * info["sample_rate"]) * info["channels"] * 2
@@ -0,0 +1,404 @@
+import io
+import os
+import time
+import json
+import socket
+import argparse
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from metrics import span, file_size
+from audio_headers import probe_audio, wav_info
+
+
+HEAD_TRIM = 12       # Seconds removed from the start, nothing is spoken during that period
+TAIL_TRIM = 30       # Seconds removed from the end, a song is played and credits are shown
+SAMPLE_RATE = 16000  # Output sampling rate in Hz (mono channel)
+
+AUDIO_EXTENSIONS = (".mp4", ".wav", ".flac")
+
+# Output formats: file extension and ffmpeg encoder options. FLAC is lossless (typically about half
+# the size of 16-bit PCM for speech), Opus at 32 kbit/s is lossy and 8 times smaller than 16 kHz PCM.
+OUTPUT_FORMATS = {
+    "wav": (".wav", ["-c:a", "pcm_s16le", "-f", "wav"]),
+    "flac": (".flac", ["-c:a", "flac", "-sample_fmt", "s16", "-compression_level", "5", "-f", "flac"]),
+    "opus": (".opus", ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"]),
+}
+OUTPUT_FORMAT = "wav"
+
+
+def probe_duration(source):
+    """
+    Get the duration of a media file or URL in seconds using ffprobe.
+    Only the container headers are read, for a URL this costs a few small requests.
+    Args:
+        source (str): Path or URL of the media file.
+    Returns:
+        float: Duration in seconds.
+    """
+    command = [
+        "ffprobe",
+        "-v", "quiet",
+        "-show_entries", "format=duration",
+        "-of", "csv=p=0",
+        source
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return float(output.strip())
+
+
+def build_ffmpeg_command(source, output_file, duration, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                         output_format=OUTPUT_FORMAT):
+    """
+    Build the ffmpeg command that converts a media file or URL to a trimmed mono WAV, FLAC or Opus file.
+    Seeking is done on the input (-ss before -i), so the trimmed head is skipped instead of decoded,
+    and only the audio stream is read (-vn).
+    Args:
+        source (str): Path or URL of the media file.
+        output_file (str): Path of the audio file written by ffmpeg.
+        duration (float): Duration of the source in seconds.
+        head_trim (float): Seconds removed from the start.
+        tail_trim (float): Seconds removed from the end.
+        sample_rate (int): Output sampling rate in Hz.
+        output_format (str): One of OUTPUT_FORMATS.
+    Returns:
+        list: The ffmpeg command.
+    """
+    kept = duration - head_trim - tail_trim
+    if kept <= 0:
+        raise ValueError(f"{source} is {duration:.2f} s long, nothing is left after trimming {head_trim} s + {tail_trim} s")
+
+    command = ["ffmpeg", "-y", "-v", "error"]
+    if source.startswith(("http://", "https://")):
+        # Keep reading after a dropped connection instead of writing a truncated WAV
+        command += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "10"]
+    command += [
+        "-ss", str(head_trim),      # Skip the head before decoding
+        "-i", source,
+        "-t", f"{kept:.3f}",        # Stop before the tail
+        "-vn",                      # Ignore the video stream
+        "-ar", str(sample_rate),    # Resample
+        "-ac", "1",                 # Mono
+        *OUTPUT_FORMATS[output_format][1],
+        output_file
+    ]
+    return command
+
+
+def convert_to_wav(source, output_file, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                   output_format=OUTPUT_FORMAT):
+    """
+    Convert a media file or URL to a trimmed mono WAV (or FLAC/Opus file) in a single ffmpeg pass.
+    The audio is written to "<output_file>.<host>-<pid>.part" and renamed once ffmpeg has succeeded,
+    then a sidecar JSON file (see write_sidecar) is written next to it. The part file is unique to
+    the process, so two workers converting the same file (a job whose lease was handed to another
+    worker, see job_queue.py) never write into each other's output.
+    Args:
+        source (str): Path or URL of the media file, e.g. the MP4 URL of a lecture video.
+        output_file (str): Path of the output audio file.
+        head_trim (float): Seconds removed from the start.
+        tail_trim (float): Seconds removed from the end.
+        sample_rate (int): Output sampling rate in Hz.
+        output_format (str): One of OUTPUT_FORMATS.
+    Returns:
+        dict: The sidecar metadata.
+    """
+    duration = probe_duration(source)
+    part_file = f"{output_file}.{socket.gethostname()}-{os.getpid()}.part"
+    command = build_ffmpeg_command(source, part_file, duration, head_trim, tail_trim, sample_rate, output_format)
+
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise RuntimeError(f"ffmpeg failed on {source}: {e.stderr.decode(errors='replace').strip()}") from e
+
+    # ffmpeg can exit successfully on a source it could not fully read, so check what was written
+    written = probe_audio(part_file)["duration"]
+    expected = duration - head_trim - tail_trim
+    if abs(written - expected) > 1.0:
+        os.remove(part_file)
+        raise RuntimeError(f"ffmpeg wrote {written:.2f} s of audio from {source}, expected {expected:.2f} s")
+
+    os.replace(part_file, output_file)
+
+    metadata = {
+        "source": source,
+        "source_duration": duration,
+        "duration": written,
+        "sample_rate": sample_rate,
+        "channels": 1,
+        "format": output_format,
+        "head_trim": head_trim,
+        "tail_trim": tail_trim
+    }
+    # Local sources are recorded by size and mtime so that unchanged files can be skipped next time
+    if os.path.exists(source):
+        metadata["source_size"] = os.path.getsize(source)
+        metadata["source_mtime"] = os.path.getmtime(source)
+    write_sidecar(output_file, metadata)
+    return metadata
+
+
+def decode_audio(audio_filepath, offset=0.0, duration=None):
+    """
+    Decode (part of) an audio file of any format to the bytes of a 16-bit PCM WAV file with ffmpeg.
+    Used for FLAC and Opus files, whose samples cannot be sliced out of the file like WAV frames.
+    Args:
+        audio_filepath (str): Path to the audio file.
+        offset (float): Start in seconds.
+        duration (float): Seconds decoded, None for the rest of the file.
+    Returns:
+        bytes: Content of a WAV file.
+    Raises:
+        ValueError: If the output of ffmpeg is empty or has no data chunk.
+    """
+    command = ["ffmpeg", "-v", "error", "-ss", str(offset), "-i", audio_filepath]
+    if duration is not None:
+        command += ["-t", f"{duration:.3f}"]
+    # Opus always decodes at 48 kHz, resample to the rate the file was encoded from
+    command += ["-ar", str(probe_audio(audio_filepath)["sample_rate"]), "-c:a", "pcm_s16le", "-f", "wav", "-"]
+    try:
+        wav_bytes = subprocess.run(command, check=True, capture_output=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed on {audio_filepath}: {e.stderr.decode(errors='replace').strip()}") from e
+    # A WAV written to a pipe has unset RIFF and data sizes, fill them in so the wave module can read it
+    wav_bytes = bytearray(wav_bytes)
+    position = 12
+    while position + 8 <= len(wav_bytes) and wav_bytes[position:position + 4] != b"data":
+        position += 8 + int.from_bytes(wav_bytes[position + 4:position + 8], "little")
+    if wav_bytes[:4] != b"RIFF" or position + 8 > len(wav_bytes):
+        raise ValueError(f"{audio_filepath}: ffmpeg output is not a WAV with a data chunk")
+    wav_bytes[4:8] = (len(wav_bytes) - 8).to_bytes(4, "little")
+    wav_bytes[position + 4:position + 8] = (len(wav_bytes) - position - 8).to_bytes(4, "little")
+    return bytes(wav_bytes)
+
+
+def read_pcm(audio_filepath, offset=0.0, duration=None):
+    """
+    Read (part of) an audio file as 16-bit samples.
+    The data chunk of a 16-bit PCM WAV is memory-mapped, so only the pages of the range are read
+    from disk and nothing is copied; other files (FLAC, Opus, float WAV) are decoded with decode_audio.
+    Args:
+        audio_filepath (str): Path to the audio file.
+        offset (float): Start in seconds.
+        duration (float): Seconds read, None for the rest of the file.
+    Returns:
+        tuple: Samples (np.ndarray of int16, shape (frames, channels)) and sample rate.
+    """
+    info = probe_audio(audio_filepath)
+    if info["format"] != "wav" or info["bits_per_sample"] != 16:
+        wav_bytes = decode_audio(audio_filepath, offset, duration)
+        info = wav_info(io.BytesIO(wav_bytes), len(wav_bytes))
+        samples = np.frombuffer(wav_bytes, dtype="<i2", count=info["num_samples"] * info["channels"], offset=info["data_offset"])
+        return samples.reshape(-1, info["channels"]), info["sample_rate"]
+
+    rate, channels, total = info["sample_rate"], info["channels"], info["num_samples"]
+    start = min(int(round(offset * rate)), total)
+    count = total - start if duration is None else min(int(round(duration * rate)), total - start)
+    if count == 0:
+        return np.zeros((0, channels), dtype=np.int16), rate
+    data = np.memmap(audio_filepath, dtype="<i2", mode="r", offset=info["data_offset"], shape=(total, channels))
+    return data[start:start + count], rate
+
+
+def sidecar_path(audio_filepath):
+    """Path of the sidecar JSON file of an audio file, e.g. audio_1.wav -> audio_1.json."""
+    return os.path.splitext(audio_filepath)[0] + ".json"
+
+
+def write_sidecar(audio_filepath, metadata):
+    """
+    Write the sidecar JSON file of an audio file (duration, sample rate, trim offsets, source).
+    The size and mtime of the audio file are added so readers can tell whether the sidecar is stale.
+    """
+    metadata = dict(metadata)
+    metadata["output_size"] = os.path.getsize(audio_filepath)
+    metadata["output_mtime"] = os.path.getmtime(audio_filepath)
+    path = sidecar_path(audio_filepath)
+    tmp_path = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_sidecar(audio_filepath):
+    """
+    Read the sidecar JSON file of an audio file.
+    Returns:
+        dict or None: The metadata, or None if there is no sidecar or the audio file changed since it was written.
+    """
+    path = sidecar_path(audio_filepath)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        stat = os.stat(audio_filepath)
+    except (OSError, ValueError):
+        return None
+    if metadata.get("output_size") != stat.st_size or metadata.get("output_mtime") != stat.st_mtime:
+        return None
+    return metadata
+
+
+def is_up_to_date(source, output_file, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                  output_format=OUTPUT_FORMAT):
+    """
+    Check whether output_file was already made from the current version of source with the same settings.
+    Only file sizes and mtimes are compared, neither file is opened.
+    """
+    metadata = read_sidecar(output_file)
+    if metadata is None:
+        return False
+    # Sidecars written before the format option existed are WAVs
+    settings = (metadata.get("head_trim"), metadata.get("tail_trim"), metadata.get("sample_rate"), metadata.get("format", "wav"))
+    if settings != (head_trim, tail_trim, sample_rate, output_format):
+        return False
+    if not os.path.exists(source):
+        return True  # URL source, nothing to compare against
+    stat = os.stat(source)
+    return metadata.get("source_size") == stat.st_size and metadata.get("source_mtime") == stat.st_mtime
+
+
+def output_path(input_file, output_dir, output_format=OUTPUT_FORMAT):
+    """Output audio path of an input file, e.g. videos/video_1.mp4 -> <output_dir>/audio_1.wav (or .flac, .opus)."""
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    if base_name.startswith("video"):
+        base_name = "audio" + base_name[len("video"):]
+    return os.path.join(output_dir, base_name + OUTPUT_FORMATS[output_format][0])
+
+
+def find_audio_files(input_dir, extensions=AUDIO_EXTENSIONS):
+    """List the regular files with one of the given extensions under input_dir, sorted by path."""
+    files = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if name.lower().endswith(extensions) and os.path.isfile(path):
+                files.append(path)
+    return sorted(files)
+
+
+def process_audio(input_file, output_dir, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                  output_format=OUTPUT_FORMAT):
+    """
+    Convert one input file unless its output is already up to date.
+    Returns:
+        dict: input and output paths, status ("done", "skipped" or "failed") and error message if any.
+    """
+    output_file = output_path(input_file, output_dir, output_format)
+    result = {"input": input_file, "output": output_file, "status": "done"}
+
+    with span("audio", input_file) as item:
+        item.bytes_in = file_size(input_file)
+        if is_up_to_date(input_file, output_file, head_trim, tail_trim, sample_rate, output_format):
+            result["status"] = "skipped"
+        else:
+            try:
+                convert_to_wav(input_file, output_file, head_trim, tail_trim, sample_rate, output_format)
+                item.bytes_out = file_size(output_file)
+            except (RuntimeError, ValueError, subprocess.CalledProcessError, OSError) as e:
+                result["status"] = "failed"
+                result["error"] = str(e)
+        item.outcome = result["status"]
+        item.error = result.get("error")
+    return result
+
+
+def preprocess_audio(input_dir, output_dir, num_cpus=4, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                     output_format=OUTPUT_FORMAT):
+    """
+    Convert every .mp4, .wav and .flac file under input_dir to a trimmed mono WAV (or FLAC/Opus file)
+    in output_dir, using a pool of num_cpus processes. Outputs that are up to date are skipped.
+    Args:
+        input_dir (str): Directory containing the videos or audios.
+        output_dir (str): Directory where audio_<n>.wav files and their sidecars are written.
+        num_cpus (int): Number of files converted at once.
+        head_trim (float): Seconds removed from the start.
+        tail_trim (float): Seconds removed from the end.
+        sample_rate (int): Output sampling rate in Hz.
+        output_format (str): One of OUTPUT_FORMATS.
+    Returns:
+        list: One result dict per input file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    input_files = find_audio_files(input_dir)
+    start_time = time.time()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=num_cpus) as executor:
+        futures = [
+            executor.submit(process_audio, input_file, output_dir, head_trim, tail_trim, sample_rate, output_format)
+            for input_file in input_files
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("done", "skipped", "failed")}
+    elapsed_time = time.time() - start_time
+    print(f"Audio preprocessing complete. {counts['done']} converted, {counts['skipped']} up to date, "
+          f"{counts['failed']} failed. Total time: {elapsed_time:.0f} seconds.")
+    return results
+
+
+def stream_audio(video_urls, output_dir, max_workers=4, head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE,
+                 output_format=OUTPUT_FORMAT):
+    """
+    Convert lecture videos straight from their URLs to trimmed mono WAVs, without saving the MP4.
+    Only the audio stream is downloaded and decoded, audio_<n>.wav files that already exist are skipped.
+    Args:
+        video_urls (list): List of (index, video_url) tuples.
+        output_dir (str): Directory where audio_<index>.wav files are written.
+        max_workers (int): Number of ffmpeg processes running at once.
+        head_trim (float): Seconds removed from the start.
+        tail_trim (float): Seconds removed from the end.
+        sample_rate (int): Output sampling rate in Hz.
+        output_format (str): One of OUTPUT_FORMATS.
+    Returns:
+        list: Paths of the audio files that could not be created.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    failed = []
+
+    def run(output_file, video_url):
+        with span("stream_audio", output_file) as item:
+            if is_up_to_date(video_url, output_file, head_trim, tail_trim, sample_rate, output_format):
+                item.outcome = "skipped"
+                return
+            try:
+                convert_to_wav(video_url, output_file, head_trim, tail_trim, sample_rate, output_format)
+                item.bytes_out = file_size(output_file)
+            except (RuntimeError, ValueError, subprocess.CalledProcessError, OSError) as e:
+                item.outcome = "failed"
+                item.error = str(e)
+                failed.append(output_file)
+
+    # Each worker only waits on its ffmpeg process, so threads are enough
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for index, video_url in video_urls:
+            output_file = os.path.join(output_dir, f"audio_{index}{OUTPUT_FORMATS[output_format][0]}")
+            futures[executor.submit(run, output_file, video_url)] = output_file
+        for future in as_completed(futures):
+            # Any other error (e.g. while checking the existing file) fails this file only
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error converting {futures[future]}: {e}")
+                failed.append(futures[future])
+
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert videos/audios to trimmed 16kHz mono WAV (or FLAC/Opus) files.")
+    parser.add_argument("input_dir", help="Directory containing the videos or audios")
+    parser.add_argument("output_dir", help="Directory where the WAV files are written")
+    parser.add_argument("num_cpus", type=int, help="Number of files converted in parallel")
+    parser.add_argument("--head-trim", type=float, default=HEAD_TRIM, help="Seconds removed from the start")
+    parser.add_argument("--tail-trim", type=float, default=TAIL_TRIM, help="Seconds removed from the end")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="Output sampling rate in Hz")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT, help="Output audio format")
+    args = parser.parse_args()
+
+    preprocess_audio(args.input_dir, args.output_dir, args.num_cpus, args.head_trim, args.tail_trim, args.sample_rate, args.format)
@@ -0,0 +1,189 @@
+import os
+import time
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from audio_preprocessor import read_pcm
+from manifest_creator import add_manifest_fields
+from vad_segmenter import THRESHOLD_DB
+
+
+FRAME_SECONDS = 0.03      # Length of the frames whose energy is measured (as in vad_segmenter.py)
+BLOCK_SECONDS = 60.0      # Audio converted to float and processed at once
+CLIP_LEVEL = 32767        # Samples at or beyond this magnitude are clipped
+NOISE_PERCENTILE = 10     # Frame energy taken as the noise floor
+SPEECH_PERCENTILE = 90    # Frame energy taken as the speech level
+MIN_POWER = 1e-10         # Floor of the frame energies (-100 dBFS), digital silence has no finite level
+
+# Entries are flagged when a metric is past these limits
+MAX_CLIPPING_RATIO = 0.001    # More than 0.1% of the samples clipped
+MIN_RMS_DBFS = -35.0          # Quieter than this on average
+MAX_SILENCE_FRACTION = 0.5    # More than half of the frames below THRESHOLD_DB
+MIN_SNR_DB = 15.0             # Speech less than 15 dB above the noise floor
+MAX_RATE_DEVIATION = 3.5      # Speaking rate this many median absolute deviations away from the median
+MIN_RATE_SPREAD = 0.1         # The deviation is taken as at least 10% of the median rate, so near-identical rates flag nothing
+
+QUALITY_FIELDS = ("rms_dbfs", "peak_dbfs", "clipping_ratio", "silence_fraction", "snr_db")
+
+
+def to_db(power):
+    return 10.0 * np.log10(np.maximum(power, MIN_POWER))
+
+
+def quality_metrics(audio_filepath, offset=0.0, duration=None):
+    """
+    Level, clipping, silence and SNR of (part of) an audio file.
+    The samples are read with read_pcm (memory-mapped for WAVs) and processed BLOCK_SECONDS at a
+    time: every block is cut into frames with a reshape and the energy of all its frames is
+    computed at once. The SNR is estimated from the distribution of the frame energies, as the
+    speech level (SPEECH_PERCENTILE) over the noise floor (NOISE_PERCENTILE).
+    Args:
+        audio_filepath (str): Path to the audio file.
+        offset (float): Start in seconds.
+        duration (float): Seconds analysed, None for the rest of the file.
+    Returns:
+        dict: rms_dbfs, peak_dbfs, clipping_ratio, silence_fraction and snr_db (None for empty audio).
+    """
+    samples, sample_rate = read_pcm(audio_filepath, offset, duration)
+    if not len(samples):
+        return dict.fromkeys(QUALITY_FIELDS)
+
+    frame_length = max(int(round(FRAME_SECONDS * sample_rate)), 1)
+    block_length = max(int(BLOCK_SECONDS * sample_rate) // frame_length, 1) * frame_length
+    sum_squares, peak, clipped = 0.0, 0, 0
+    frame_powers = []
+    for start in range(0, len(samples), block_length):
+        block = np.asarray(samples[start:start + block_length], dtype=np.float32)
+        squares = np.square(block / 32768.0)
+        sum_squares += float(squares.sum(dtype=np.float64))
+        magnitudes = np.abs(block)
+        peak = max(peak, float(magnitudes.max()))
+        clipped += int(np.count_nonzero(magnitudes >= CLIP_LEVEL))
+        # The last partial frame of the file only counts in the totals
+        num_frames = len(block) // frame_length
+        if num_frames:
+            frame_powers.append(squares[:num_frames * frame_length].reshape(num_frames, -1).mean(axis=1))
+
+    num_values = samples.size
+    frame_db = to_db(np.concatenate(frame_powers)) if frame_powers else to_db(np.array([sum_squares / num_values]))
+    noise_db, speech_db = np.percentile(frame_db, [NOISE_PERCENTILE, SPEECH_PERCENTILE])
+    return {
+        "rms_dbfs": round(float(to_db(sum_squares / num_values)), 2),
+        "peak_dbfs": round(float(to_db((peak / 32768.0) ** 2)), 2),
+        "clipping_ratio": round(clipped / num_values, 6),
+        "silence_fraction": round(float(np.mean(frame_db < THRESHOLD_DB)), 4),
+        "snr_db": round(float(speech_db - noise_db), 2)
+    }
+
+
+def entry_metrics(entry):
+    """quality_metrics of a manifest entry (its offset range for segmented manifests)."""
+    return quality_metrics(entry["audio_filepath"], entry.get("offset", 0.0), entry["duration"] if "offset" in entry else None)
+
+
+def speaking_rate(entry):
+    """Words of the transcript per second of audio."""
+    return len(entry.get("text", "").split()) / entry["duration"] if entry["duration"] > 0 else 0.0
+
+
+def quality_flags(metrics, rate, rate_median, rate_spread):
+    """
+    Names of the limits an entry is past: clipping, quiet, mostly_silent, low_snr, fast_speech, slow_speech.
+    The speaking rate is compared with the median rate of the manifest and its spread (median
+    absolute deviation, at least MIN_RATE_SPREAD of the median).
+    """
+    flags = []
+    if metrics["rms_dbfs"] is None:
+        return ["empty"]
+    if metrics["clipping_ratio"] > MAX_CLIPPING_RATIO:
+        flags.append("clipping")
+    if metrics["rms_dbfs"] < MIN_RMS_DBFS:
+        flags.append("quiet")
+    if metrics["silence_fraction"] > MAX_SILENCE_FRACTION:
+        flags.append("mostly_silent")
+    if metrics["snr_db"] < MIN_SNR_DB:
+        flags.append("low_snr")
+    if rate_spread > 0 and abs(rate - rate_median) > MAX_RATE_DEVIATION * rate_spread:
+        flags.append("fast_speech" if rate > rate_median else "slow_speech")
+    return flags
+
+
+def analyse_manifest(manifest_path, num_workers=None, force=False):
+    """
+    Add audio quality fields to every entry of a manifest: rms_dbfs, peak_dbfs, clipping_ratio,
+    silence_fraction, snr_db, speaking_rate (words per second) and quality_flags, the list of
+    limits the entry is past (see quality_flags).
+    Files are analysed in parallel by a pool of processes. Entries that already have the fields
+    are not analysed again unless force is set; manifest_creator.py --update drops them from the
+    entries whose audio changed. Speaking-rate flags are recomputed for every entry, as they
+    depend on the whole manifest.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        num_workers (int): Number of worker processes (default: number of CPUs).
+        force (bool): Analyse every entry again.
+    Returns:
+        dict: Number of entries analysed and reused, and number of entries per flag.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    results, rates = [], []
+    analysed, reused = 0, 0
+
+    def collect_next():
+        nonlocal analysed
+        rate, metrics = window.popleft()
+        if not isinstance(metrics, dict):
+            metrics = metrics.result()
+            analysed += 1
+        results.append(metrics)
+        rates.append(rate)
+
+    # Bounded window of entries in flight, collected in manifest order
+    window = deque()
+    manifest = open(manifest_path, "r", encoding="utf-8")
+    with manifest, ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for line in manifest:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not force and all(field in entry for field in QUALITY_FIELDS):
+                window.append((speaking_rate(entry), {field: entry[field] for field in QUALITY_FIELDS}))
+                reused += 1
+            else:
+                window.append((speaking_rate(entry), executor.submit(entry_metrics, entry)))
+            if len(window) > num_workers * 2:
+                collect_next()
+        while window:
+            collect_next()
+
+    rate_array = np.array(rates, dtype=np.float64)
+    rate_median = float(np.median(rate_array)) if len(rate_array) else 0.0
+    rate_mad = float(np.median(np.abs(rate_array - rate_median))) if len(rate_array) else 0.0
+    rate_spread = max(rate_mad, MIN_RATE_SPREAD * rate_median)
+    flag_counts = {}
+    fields = []
+    for metrics, rate in zip(results, rates):
+        flags = quality_flags(metrics, rate, rate_median, rate_spread)
+        for flag in flags:
+            flag_counts[flag] = flag_counts.get(flag, 0) + 1
+        fields.append(dict(metrics, speaking_rate=round(rate, 3), quality_flags=flags))
+    add_manifest_fields(manifest_path, fields)
+
+    print(f"Quality of {len(results)} entries of {manifest_path} ({analysed} analysed, {reused} reused) "
+          f"in {time.perf_counter() - start_time:.1f} s")
+    print(f"Speaking rate: median {rate_median:.2f} words/s, median absolute deviation {rate_mad:.2f}")
+    for flag, count in sorted(flag_counts.items()):
+        print(f"  {flag}: {count} entries")
+    return {"analysed": analysed, "reused": reused, "flags": flag_counts}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add level, clipping, silence, SNR and speaking-rate fields to a manifest.")
+    parser.add_argument("manifest", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="Analyse entries that already have the quality fields again")
+    args = parser.parse_args()
+
+    analyse_manifest(args.manifest, args.workers, args.force)
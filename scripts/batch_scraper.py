@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from selenium.common.exceptions import WebDriverException
+from downloader import DataDownloader
+from catalog import load_catalog, sync_catalog
+
+
+class DriverPool:
+    """
+    A bounded pool of Selenium drivers shared by the courses of a batch.
+    Drivers are started lazily, at most size of them exist at any time. A driver whose user raised
+    a WebDriverException (e.g. its Chrome session crashed) is quit instead of being handed to the
+    next course, and a new one is started in its place when needed.
+    """
+
+    def __init__(self, size: int, driver_factory):
+        self.size = size
+        self.driver_factory = driver_factory
+        self._idle = []
+        self._started = 0
+        self._available = threading.Condition()
+        self._drivers = []
+
+    @contextmanager
+    def acquire(self):
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                self._available.wait()
+            driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                self._started += 1
+
+        if driver is None:
+            try:
+                driver = self.driver_factory()
+            except Exception:
+                with self._available:
+                    self._started -= 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self._drivers.append(driver)
+
+        crashed = False
+        try:
+            yield driver
+        except WebDriverException:
+            crashed = True
+            raise
+        finally:
+            with self._available:
+                if crashed:
+                    self._drivers.remove(driver)
+                    self._started -= 1
+                else:
+                    self._idle.append(driver)
+                self._available.notify()
+            if crashed:
+                self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error closing driver: {e}")
+
+    def close(self):
+        for driver in self._drivers:
+            self._quit(driver)
+        self._drivers = []
+
+
+def course_id(course_url):
+    """Name of the course directory, e.g. "https://nptel.ac.in/courses/106106184" -> "106106184"."""
+    name = course_url.rstrip("/").rsplit("/", 1)[-1]
+    return re.sub(r"[^\w.-]", "_", name) or "course"
+
+
+def read_status(status_path):
+    """Read the status file of a course, None if the course has not been started."""
+    if not os.path.exists(status_path):
+        return None
+    with open(status_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_status(status_path, status):
+    """Write the status file of a course, replacing the old one only once the new one is fully written."""
+    status["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    tmp_path = status_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_path, status_path)
+
+
+def missing_urls(catalog, kinds=("video", "transcript")):
+    """
+    Lectures of a catalog whose URL of a wanted kind could not be scraped.
+    Returns:
+        list: Lecture indexes.
+    """
+    return [lecture["index"] for lecture in catalog["lectures"]
+            if any(not lecture.get(f"{kind}_url") for kind in kinds)]
+
+
+def scrape_course(pool, course_url, course_dir, status, kinds=("video", "transcript")):
+    """
+    Scrape the catalog of one course with a driver from the pool.
+    The scraper logs and skips the lectures it fails on, so a catalog without lectures or with a
+    lecture missing a wanted URL is a failed scrape: the course stays "pending" and is scraped
+    again when the batch is restarted.
+    Raises:
+        RuntimeError: If the scrape found no lectures or missed some URLs.
+    """
+    status_path = os.path.join(course_dir, "status.json")
+    catalog_path = os.path.join(course_dir, "catalog.json")
+
+    with pool.acquire() as driver:
+        print(f"Scraping {course_url}...")
+        catalog = DataDownloader(course_url, driver=driver).scrape_catalog(catalog_path)
+
+    lectures = catalog["lectures"]
+    if not lectures:
+        raise RuntimeError("no lectures found")
+    missing = missing_urls(catalog, kinds)
+    if missing:
+        raise RuntimeError(f"could not scrape the URLs of lecture(s) {missing}")
+
+    status.update({
+        "state": "scraped",
+        "lectures": len(lectures),
+        "videos": sum(1 for lecture in lectures if lecture.get("video_url")),
+        "transcripts": sum(1 for lecture in lectures if lecture.get("transcript_url"))
+    })
+    write_status(status_path, status)
+
+
+def download_course(course_url, course_dir, status, kinds, max_workers, per_host):
+    """Fetch the files listed in the catalog of one course, no browser is needed."""
+    status_path = os.path.join(course_dir, "status.json")
+    catalog_path = os.path.join(course_dir, "catalog.json")
+
+    print(f"Downloading files of {course_url}...")
+    results = sync_catalog(
+        catalog_path,
+        os.path.join(course_dir, "videos"),
+        os.path.join(course_dir, "transcripts"),
+        max_workers=max_workers,
+        per_host=per_host,
+        kinds=kinds
+    )
+    failed = [result["path"] for result in results if result["status"] in ("failed", "incomplete")]
+
+    status.update({
+        "state": "scraped" if failed else "done",
+        "fetched": len(results) - len(failed),
+        "failed": failed
+    })
+    write_status(status_path, status)
+
+
+def run_batch(course_urls, output_dir, num_drivers=2, num_downloaders=2, max_workers=4, per_host=2,
+              kinds=("video", "transcript"), driver_factory=None):
+    """
+    Scrape and download a batch of courses.
+    Scraping runs on a bounded pool of browser drivers, downloading runs on separate threads
+    so that a driver is free for the next course as soon as its catalog has been scraped.
+    Every course has a status file in <output_dir>/<course id>/status.json; courses already
+    "done" are skipped and scraped courses are not scraped again, so a crashed batch can be restarted.
+    A course whose scrape failed or was incomplete (see scrape_course) stays "pending" and is
+    scraped again on the next run.
+    Args:
+        course_urls (list): URLs of the NPTEL courses.
+        output_dir (str): Directory holding one sub-directory per course.
+        num_drivers (int): Maximum number of browser drivers running at once.
+        num_downloaders (int): Maximum number of courses being downloaded at once.
+        max_workers (int): Maximum number of concurrent downloads within a course.
+        per_host (int): Maximum number of concurrent downloads per host within a course.
+        kinds (tuple): Which files to download, "video" and/or "transcript".
+        driver_factory (callable): Starts a driver (default: DataDownloader.setup_selenium).
+    Returns:
+        dict: Final status of every course, keyed by course URL.
+    """
+    if driver_factory is None:
+        driver_factory = lambda: DataDownloader(None).setup_selenium()
+    pool = DriverPool(num_drivers, driver_factory)
+    statuses = {}
+
+    scrape_executor = ThreadPoolExecutor(max_workers=num_drivers)
+    download_executor = ThreadPoolExecutor(max_workers=num_downloaders)
+    futures = []
+
+    def download(course_url, course_dir, status):
+        try:
+            download_course(course_url, course_dir, status, kinds, max_workers, per_host)
+        except Exception as e:
+            status["error"] = str(e)
+            write_status(os.path.join(course_dir, "status.json"), status)
+            print(f"Error downloading {course_url}: {e}")
+
+    def scrape_then_download(course_url, course_dir, status):
+        try:
+            scrape_course(pool, course_url, course_dir, status, kinds)
+        except Exception as e:
+            status["state"] = "pending"
+            status["error"] = str(e)
+            write_status(os.path.join(course_dir, "status.json"), status)
+            print(f"Error scraping {course_url}: {e}")
+            return
+        futures.append(download_executor.submit(download, course_url, course_dir, status))
+
+    try:
+        for course_url in course_urls:
+            course_dir = os.path.join(output_dir, course_id(course_url))
+            os.makedirs(course_dir, exist_ok=True)
+            status_path = os.path.join(course_dir, "status.json")
+
+            status = read_status(status_path) or {"course_url": course_url, "state": "pending"}
+            statuses[course_url] = status
+
+            if status["state"] == "done":
+                print(f"Skipping {course_url}, already done.")
+                continue
+
+            status.pop("error", None)
+            write_status(status_path, status)
+
+            if status["state"] == "scraped" and load_catalog(os.path.join(course_dir, "catalog.json")) is not None:
+                futures.append(download_executor.submit(download, course_url, course_dir, status))
+            else:
+                futures.append(scrape_executor.submit(scrape_then_download, course_url, course_dir, status))
+
+        # Scrape tasks add download tasks, so wait until no task is left running
+        while True:
+            pending = [future for future in futures if not future.done()]
+            if not pending:
+                break
+            wait(pending)
+
+    finally:
+        scrape_executor.shutdown(wait=True)
+        download_executor.shutdown(wait=True)
+        pool.close()
+
+    done = sum(1 for status in statuses.values() if status["state"] == "done")
+    print(f"{done} of {len(statuses)} courses are done.")
+    return statuses
+
+
+def read_course_list(path):
+    """Read course URLs from a text file, one per line, ignoring blank lines and # comments."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape and download a batch of NPTEL courses.")
+    parser.add_argument("courses", help="Text file with one course URL per line")
+    parser.add_argument("--output", default="./courses", help="Directory holding one sub-directory per course")
+    parser.add_argument("--drivers", type=int, default=2, help="Number of browser drivers")
+    parser.add_argument("--downloaders", type=int, default=2, help="Number of courses downloaded at once")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent downloads per course")
+    parser.add_argument("--per-host", type=int, default=2, help="Number of concurrent downloads per host")
+    parser.add_argument("--transcripts-only", action="store_true", help="Do not download the videos")
+    args = parser.parse_args()
+
+    kinds = ("transcript",) if args.transcripts_only else ("video", "transcript")
+    run_batch(read_course_list(args.courses), args.output, num_drivers=args.drivers, num_downloaders=args.downloaders,
+              max_workers=args.workers, per_host=args.per_host, kinds=kinds)
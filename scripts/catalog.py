@@ -0,0 +1,163 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from fetcher import create_session, fetch_files
+
+
+def drive_download_url(url):
+    """
+    Turn a Google Drive file page URL into a direct download URL.
+    Args:
+        url (str): URL such as "https://drive.google.com/file/d/<id>/view".
+    Returns:
+        str: "https://drive.google.com/uc?export=download&id=<id>", or url unchanged if no file id is found.
+    """
+    match = re.search(r"/file/d/([\w-]+)", url) or re.search(r"[?&]id=([\w-]+)", url)
+    if not match:
+        return url
+    return f"https://drive.google.com/uc?export=download&id={match.group(1)}"
+
+
+def load_catalog(catalog_path):
+    """
+    Load a course catalog file.
+    Args:
+        catalog_path (str): Path to the catalog JSON file.
+    Returns:
+        dict or None: The catalog, or None if the file does not exist.
+    """
+    if not os.path.exists(catalog_path):
+        return None
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_catalog(catalog, catalog_path):
+    """
+    Save a course catalog file, replacing the old one only once the new one is fully written.
+    Args:
+        catalog (dict): Catalog with course_url, scraped_at and lectures.
+        catalog_path (str): Path to the catalog JSON file.
+    """
+    os.makedirs(os.path.dirname(catalog_path) or ".", exist_ok=True)
+    tmp_path = catalog_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp_path, catalog_path)
+
+
+def catalog_files(catalog, videos_dir, transcripts_dir):
+    """
+    List the files described by a catalog.
+    Returns:
+        list: (lecture, kind, url, local_path) tuples, kind is "video" or "transcript".
+    """
+    files = []
+    for lecture in catalog["lectures"]:
+        index = lecture["index"]
+        if lecture.get("video_url"):
+            files.append((lecture, "video", lecture["video_url"], os.path.join(videos_dir, f"video_{index}.mp4")))
+        if lecture.get("transcript_url"):
+            files.append((lecture, "transcript", lecture["transcript_url"], os.path.join(transcripts_dir, f"lec{index}.pdf")))
+    return files
+
+
+def remote_state(session, url):
+    """
+    Read the size and validators (ETag, Last-Modified) of a remote file with a HEAD request.
+    Returns:
+        dict or None: size, etag and last_modified, or None if the request failed.
+    """
+    try:
+        response = session.head(url, allow_redirects=True, timeout=30)
+    except requests.RequestException:
+        return None
+    if not response.ok:
+        return None
+    size = response.headers.get("Content-Length")
+    return {
+        "size": int(size) if size and size.isdigit() else None,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    }
+
+
+def is_up_to_date(local_path, saved, remote):
+    """
+    Decide whether a local file still matches the remote one.
+    Args:
+        local_path (str): Path of the downloaded file.
+        saved (dict): State recorded in the catalog when the file was last fetched (or None).
+        remote (dict): State returned by remote_state (or None if the server could not be reached).
+    Returns:
+        bool: True if the file does not need to be fetched again.
+    """
+    if not os.path.exists(local_path) or saved is None:
+        return False
+    if os.path.getsize(local_path) != saved.get("size"):
+        return False
+
+    # Without a server answer the last fetched state is trusted
+    if remote is None:
+        return True
+    if remote["size"] is not None and remote["size"] != saved.get("size"):
+        return False
+    for validator in ("etag", "last_modified"):
+        if remote[validator] and remote[validator] != saved.get(validator):
+            return False
+    return True
+
+
+def sync_catalog(catalog_path, videos_dir, transcripts_dir, max_workers=4, per_host=2, kinds=("video", "transcript")):
+    """
+    Fetch only the catalog entries that are missing on disk or changed on the server.
+    Args:
+        catalog_path (str): Path to the catalog JSON file.
+        videos_dir (str): Directory holding video_<n>.mp4 files.
+        transcripts_dir (str): Directory holding lec<n>.pdf files.
+        max_workers (int): Maximum number of concurrent requests.
+        per_host (int): Maximum number of concurrent requests to a single host.
+        kinds (tuple): Which files to sync, "video" and/or "transcript".
+    Returns:
+        list: Fetch results of the files that were downloaded.
+    """
+    catalog = load_catalog(catalog_path)
+    files = [f for f in catalog_files(catalog, videos_dir, transcripts_dir) if f[1] in kinds]
+    session = create_session(pool_size=max_workers)
+
+    # Check every file against the server concurrently, HEAD requests are cheap
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        remotes = list(executor.map(lambda f: remote_state(session, f[2]), files))
+
+    jobs, pending = [], []
+    for (lecture, kind, url, local_path), remote in zip(files, remotes):
+        saved = lecture.get("remote", {}).get(kind)
+        if is_up_to_date(local_path, saved, remote):
+            continue
+
+        # Content changed on the server: a partial download of the old version cannot be resumed
+        if saved is not None and remote is not None:
+            for path in (local_path, local_path + ".part"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        jobs.append((url, local_path))
+        pending.append((lecture, kind, remote))
+
+    print(f"{len(files) - len(jobs)} of {len(files)} files are up to date, fetching {len(jobs)}.")
+    if not jobs:
+        return []
+
+    results = fetch_files(jobs, max_workers=max_workers, per_host=per_host, session=session)
+
+    # Record what was fetched so the next sync can skip it
+    for (lecture, kind, remote), result in zip(pending, results):
+        if result["status"] in ("done", "resumed", "skipped"):
+            state = dict(remote or {})
+            state["size"] = os.path.getsize(result["path"])
+            lecture.setdefault("remote", {})[kind] = state
+    save_catalog(catalog, catalog_path)
+
+    return results
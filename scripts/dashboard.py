@@ -1,60 +1,110 @@
-import json
-import pandas as pd
+import argparse
 import dash
 from dash import dcc
 from dash import html
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
-import re
-
-# Function to read JSONL data into a DataFrame
-def read_jsonl(file_path):
-    data = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            data.append(json.loads(line))
-    return pd.DataFrame(data)
-
-# Function to calculate the required statistics
-def calculate_statistics(df):
+from dash.dependencies import Input, Output
+from manifest_stats import QUALITY_ARRAYS, LiveStats, load_stats
+
+# Histograms shown on the dashboard: (array name, title, x axis title, color)
+HISTOGRAMS = [
+    ('duration', "Duration per File (sec)", "duration", "#4CAF50"),
+    ('num_words', "Number of Words per File", "num_words", "#2196F3"),
+    ('num_chars', "Number of Characters per File", "num_chars", "#FF9800"),
+    ('rms_dbfs', "RMS Level per File (dBFS)", "rms_dbfs", "#9C27B0"),
+    ('snr_db', "Estimated SNR per File (dB)", "snr_db", "#009688"),
+    ('silence_fraction', "Fraction of Silence per File", "silence_fraction", "#607D8B"),
+    ('clipping_ratio', "Fraction of Clipped Samples per File", "clipping_ratio", "#F44336"),
+    ('speaking_rate', "Speaking Rate per File (words/sec)", "speaking_rate", "#795548"),
+]
+
+# Rows of the outlier table (entries flagged by audio_quality.py)
+MAX_OUTLIERS = 100
+
+# Function to calculate the required statistics (streamed over the manifest, cached next to it)
+def calculate_statistics(file_path, num_workers=None):
+    stats = load_stats(file_path, num_workers)
+
     # Total hours
-    total_hours = df['duration'].sum() / 3600    # Convert seconds to hours
-    
+    total_hours = stats.total_hours
+
     # Total utterances
-    total_utterances = len(df)
-    
+    total_utterances = stats.num_entries
+
     # Vocabulary size (unique words across all utterances)
-    vocabulary = set()
-    for text in df['text']:
-        words = text.split()
-        vocabulary.update(words)
-    vocabulary_size = len(vocabulary)
-    
-    # Alphabet size (unique characters across all utterances)
-    alphabet = set()
-    for text in df['text']:
-        alphabet.update(set(re.sub(r'[^a-zA-Z ]', '', text).lower()))  # Extract letters and space only
+    vocabulary_size = len(stats.vocabulary)
+
+    # Alphabet size (unique characters across all utterances, letters and space only)
+    alphabet = stats.alphabet
     alphabet_size = len(alphabet)
 
-    return total_hours, total_utterances, vocabulary_size, alphabet_size, alphabet
+    # Per-file numbers for the histograms, the transcripts themselves are not kept
+    arrays = {
+        'duration': np.asarray(stats.duration, dtype=np.float64),
+        'num_words': np.asarray(stats.num_words, dtype=np.int64),
+        'num_chars': np.asarray(stats.num_chars, dtype=np.int64),
+        # Quality fields of audio_quality.py, NaN for entries without them
+        **{name: np.asarray(getattr(stats, name), dtype=np.float64) for name in QUALITY_ARRAYS}
+    }
+
+    return total_hours, total_utterances, vocabulary_size, alphabet_size, alphabet, arrays, stats.flagged
+
+# Function to draw a histogram from bin counts computed here, only the counts are sent to the browser
+def histogram_figure(values, bins, log_scale, title, x_title, color):
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    return bar_figure(counts, edges, log_scale, title, x_title, color)
+
+# Function to draw bin counts as bars
+def bar_figure(counts, edges, log_scale, title, x_title, color):
+    figure = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.stack([edges[:-1], edges[1:]], axis=-1),
+        hovertemplate="%{customdata[0]:.4g} - %{customdata[1]:.4g}: %{y}<extra></extra>",
+        marker_color=color
+    ))
+    figure.update_layout(title=title, xaxis_title=x_title, yaxis_title="count", bargap=0,
+                         yaxis_type="log" if log_scale else "linear")
+    return figure
 
 # Function to plot histograms
-def plot_histograms(df):
-    # Duration per file
-    duration_hist = px.histogram(df, x='duration', nbins=20, title="Duration per File (sec)", color_discrete_sequence=["#4CAF50"])
-    
-    # Number of words per file
-    df['num_words'] = df['text'].apply(lambda x: len(x.split()))
-    words_hist = px.histogram(df, x='num_words', nbins=20, title="Number of Words per File", color_discrete_sequence=["#2196F3"])
-    
-    # Number of characters per file
-    df['num_chars'] = df['text'].apply(lambda x: len(x))
-    chars_hist = px.histogram(df, x='num_chars', nbins=20, title="Number of Characters per File", color_discrete_sequence=["#FF9800"])
-    
-    return duration_hist, words_hist, chars_hist
+def plot_histograms(arrays, bins=20, log_scale=False):
+    # Duration, number of words, number of characters and quality fields per file, in HISTOGRAMS order
+    return [
+        histogram_figure(arrays[name], bins, log_scale, title, x_title, color)
+        for name, title, x_title, color in HISTOGRAMS
+    ]
+
+# Function to plot the fixed-width histograms of the live mode
+def plot_live_histograms(histograms, log_scale=False):
+    return [
+        bar_figure(histograms[name].counts, histograms[name].edges, log_scale, title, x_title, color)
+        for name, title, x_title, color in HISTOGRAMS
+    ]
+
+# Function to list the flagged entries, most flags first
+def outlier_table(flagged, limit=MAX_OUTLIERS):
+    columns = ["audio_filepath", "offset", "quality_flags"] + list(QUALITY_ARRAYS)
+    rows = sorted(flagged, key=lambda entry: len(entry["quality_flags"]), reverse=True)[:limit]
+
+    def cell(entry, column):
+        value = entry.get(column, "")
+        if column == "quality_flags":
+            return ", ".join(value)
+        return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+    return html.Table(
+        [html.Tr([html.Th(column) for column in columns])] +
+        [html.Tr([html.Td(cell(entry, column)) for column in columns]) for entry in rows],
+        style={'margin': '0 auto', 'fontSize': '14px'}
+    )
 
 # Function to create the Dash app
-def create_dashboard(df, total_hours, total_utterances, vocabulary_size, alphabet_size, duration_hist, words_hist, chars_hist, alphabet):
+def create_dashboard(arrays, total_hours, total_utterances, vocabulary_size, alphabet_size, histograms, alphabet, flagged,
+                     live=None, interval=2.0):
     app = dash.Dash(__name__)
     
     # Dashboard layout 
@@ -65,57 +115,119 @@ def create_dashboard(df, total_hours, total_utterances, vocabulary_size, alphabe
         html.Div([
             html.Div([
                 html.H3("Total number of hours", style={'color': '#4CAF50'}),
-                html.P(f"{total_hours:.2f} hours", style={'fontSize': '24px', 'fontWeight': 'bold'})
+                html.P(f"{total_hours:.2f} hours", id='total-hours', style={'fontSize': '24px', 'fontWeight': 'bold'})
             ], className="stat-card"),
             html.Div([
                 html.H3("Total number of utterances", style={'color': '#2196F3'}),
-                html.P(f"{total_utterances}", style={'fontSize': '24px', 'fontWeight': 'bold'})
+                html.P(f"{total_utterances}", id='total-utterances', style={'fontSize': '24px', 'fontWeight': 'bold'})
             ], className="stat-card"),
             html.Div([
                 html.H3("Vocabulary Size", style={'color': '#FF9800'}),
-                html.P(f"{vocabulary_size} words", style={'fontSize': '24px', 'fontWeight': 'bold'})
+                html.P(f"{vocabulary_size} words", id='vocabulary-size', style={'fontSize': '24px', 'fontWeight': 'bold'})
             ], className="stat-card"),
             html.Div([
                 html.H3("Alphabet Size", style={'color': '#E91E63'}),
-                html.P(f"{alphabet_size} chars", style={'fontSize': '24px', 'fontWeight': 'bold'})
+                html.P(f"{alphabet_size} chars", id='alphabet-size', style={'fontSize': '24px', 'fontWeight': 'bold'})
             ], className="stat-card"),
         ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap', 'marginBottom': '30px'}),
 
+        # Live Section, only shown while following a manifest being written
+        html.Div([
+            html.P("", id='ingestion-rate', style={'fontSize': '18px', 'textAlign': 'center', 'color': '#757575'}),
+            dcc.Interval(id='interval', interval=interval * 1000)
+        ], style={} if live else {'display': 'none'}),
+
         # Alphabet Section
         html.Div([
             html.H2("Complete Alphabet", style={'textAlign': 'center', 'color': '#3F51B5'}),
-            html.P(f"Alphabet: {', '.join(sorted(list(alphabet)))}", style={'fontSize': '18px', 'color': '#757575', 'textAlign': 'center'})
+            html.P(f"Alphabet: {', '.join(sorted(list(alphabet)))}", id='alphabet', style={'fontSize': '18px', 'color': '#757575', 'textAlign': 'center'})
         ], style={'marginBottom': '40px'}),
         
+        # Histogram Controls Section (live histograms have fixed-width bins)
+        html.Div([
+            html.Div([
+                html.Label("Number of bins", style={'fontWeight': 'bold'}),
+                dcc.Slider(id='bins', min=5, max=200, step=5, value=20, marks={n: str(n) for n in (5, 20, 50, 100, 200)})
+            ], style={'display': 'none'} if live else {}),
+            dcc.Checklist(id='log-scale', options=[{'label': ' Log scale', 'value': 'log'}], value=[])
+        ], style={'maxWidth': '600px', 'margin': '0 auto'}),
+
         # Histograms Section
         html.Div([
-            dcc.Graph(figure=duration_hist),
-            dcc.Graph(figure=words_hist),
-            dcc.Graph(figure=chars_hist)
+            dcc.Graph(id=f'{name}-hist', figure=figure)
+            for (name, _, _, _), figure in zip(HISTOGRAMS, histograms)
+        ], style={'marginTop': '20px'}),
+
+        # Outliers Section
+        html.Div([
+            html.H2("Quality Outliers", style={'textAlign': 'center', 'color': '#3F51B5'}),
+            html.P(f"{len(flagged)} flagged entries", id='outlier-count', style={'textAlign': 'center', 'color': '#757575'}),
+            html.Div(outlier_table(flagged), id='outliers')
         ], style={'marginTop': '20px'})
     ], style={'backgroundColor': '#FAFAFA', 'padding': '20px'})
+
+    histogram_outputs = [Output(f'{name}-hist', 'figure') for name, _, _, _ in HISTOGRAMS]
+
+    if live is None:
+        # Rebin the arrays already in memory, the manifest is not read again
+        @app.callback(histogram_outputs, [Input('bins', 'value'), Input('log-scale', 'value')], prevent_initial_call=True)
+        def update_histograms(bins, log_scale):
+            return plot_histograms(arrays, bins, 'log' in log_scale)
+    else:
+        # Fold the lines added to the manifest since the last tick into the running statistics
+        @app.callback(
+            [Output('total-hours', 'children'), Output('total-utterances', 'children'), Output('vocabulary-size', 'children'),
+             Output('alphabet-size', 'children'), Output('alphabet', 'children'), Output('ingestion-rate', 'children'),
+             Output('outlier-count', 'children'), Output('outliers', 'children')] + histogram_outputs,
+            [Input('interval', 'n_intervals'), Input('log-scale', 'value')]
+        )
+        def update_live(n_intervals, log_scale):
+            live.update()
+            records_per_second, hours_per_minute = live.rates()
+            stats, alphabet = live.stats, live.stats.alphabet
+            return (
+                f"{stats.total_hours:.2f} hours", f"{stats.num_entries}", f"{len(stats.vocabulary)} words",
+                f"{len(alphabet)} chars", f"Alphabet: {', '.join(sorted(alphabet))}",
+                f"Ingesting {records_per_second:.1f} records/s, {hours_per_minute:.2f} hours of audio per minute",
+                f"{len(stats.flagged)} flagged entries", outlier_table(stats.flagged),
+                *plot_live_histograms(live.histograms, 'log' in log_scale)
+            )
     
     return app
 
 # Main function to execute the entire process
-def main(file_path):
-    # Step 1: Read the data from the JSONL file
-    df = read_jsonl(file_path)
-    
-    # Step 2: Calculate the statistics
-    total_hours, total_utterances, vocabulary_size, alphabet_size, alphabet = calculate_statistics(df)
+def main(file_path, live=False, interval=2.0, debug=False):
+    if live:
+        # Follow the manifest while it is written: statistics come from the new lines only
+        live_stats = LiveStats(file_path)
+        live_stats.update()
+        stats = live_stats.stats
+        histograms = plot_live_histograms(live_stats.histograms)
+        app = create_dashboard(None, stats.total_hours, stats.num_entries, len(stats.vocabulary), len(stats.alphabet),
+                               histograms, stats.alphabet, stats.flagged, live=live_stats, interval=interval)
+        # The reloader of debug mode would restart the server and lose the read offset
+        app.run_server(debug=False)
+        return
+
+    # Step 1 and 2: Stream the JSONL file and calculate the statistics (or read them from the cache)
+    total_hours, total_utterances, vocabulary_size, alphabet_size, alphabet, arrays, flagged = calculate_statistics(file_path)
     
     # Step 3: Plot the histograms
-    duration_hist, words_hist, chars_hist = plot_histograms(df)
+    histograms = plot_histograms(arrays)
     
     # Step 4: Create the Dash dashboard
-    app = create_dashboard(df, total_hours, total_utterances, vocabulary_size, alphabet_size, duration_hist, words_hist, chars_hist, alphabet)
+    app = create_dashboard(arrays, total_hours, total_utterances, vocabulary_size, alphabet_size, histograms, alphabet, flagged)
     
     # Step 5: Run the app
-    app.run_server(debug=True)
+    app.run_server(debug=debug)
 
 # Run the code with your JSONL file path
 if __name__ == "__main__":
-    file_path = "./train_manifest.jsonl"  
-    main(file_path)
+    parser = argparse.ArgumentParser(description="Dashboard of the statistics of a JSONL manifest.")
+    parser.add_argument("file_path", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--live", action="store_true", help="Follow the manifest while it is being written")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between two reads of the manifest in live mode")
+    parser.add_argument("--debug", action="store_true", help="Run the Dash server in debug mode (with the reloader)")
+    args = parser.parse_args()
 
+    main(args.file_path, args.live, args.interval, args.debug)
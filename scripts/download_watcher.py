@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+
+# watchdog is optional, without it the download directory is polled
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# Suffixes used by browsers for files that are still being written
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".tmp")
+
+
+class _WakeUpHandler(FileSystemEventHandler):
+    """Wakes up the waiting thread on any change in the watched directory."""
+
+    def __init__(self, event: threading.Event):
+        super().__init__()
+        self.event = event
+
+    def on_any_event(self, event):
+        self.event.set()
+
+
+class DownloadWatcher:
+    """
+    Detects when a browser download has finished in a directory.
+    A download is finished once no partial (.crdownload) file is left for it
+    and the final file has kept the same size for settle_time seconds.
+    Filesystem events (watchdog) wake the check up immediately, polling every
+    poll_interval seconds is used as a fallback.
+    """
+
+    def __init__(self, download_dir: str, poll_interval: float = 0.5, settle_time: float = 0.3):
+        self.download_dir = download_dir
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self._changed = threading.Event()
+        self._observer = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        os.makedirs(self.download_dir, exist_ok=True)
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_WakeUpHandler(self._changed), self.download_dir, recursive=False)
+            self._observer.start()
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def snapshot(self):
+        """Return the set of file names currently in the download directory."""
+        return set(os.listdir(self.download_dir))
+
+    def wait_for_new_file(self, known_files, suffix: str = ".pdf", timeout: float = 120):
+        """
+        Wait for a new completed download to appear.
+        Args:
+            known_files (set): File names present before the download was started.
+            suffix (str): Extension of the expected file.
+            timeout (float): Maximum number of seconds to wait.
+        Returns:
+            str or None: Path to the completed file, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        sizes = {}  # file name -> (size, time the size was first seen)
+
+        while True:
+            now = time.monotonic()
+            names = self.snapshot()
+            partial = {name for name in names if name.endswith(PARTIAL_SUFFIXES)}
+
+            for name in names - known_files - partial:
+                if not name.endswith(suffix) or any(p.startswith(name) for p in partial):
+                    continue
+                try:
+                    size = os.path.getsize(os.path.join(self.download_dir, name))
+                except OSError:
+                    continue  # renamed or removed between listdir and stat
+
+                last_size, since = sizes.get(name, (None, now))
+                if size != last_size:
+                    sizes[name] = (size, now)
+                elif size > 0 and now - since >= self.settle_time:
+                    return os.path.join(self.download_dir, name)
+
+            if now >= deadline:
+                return None
+
+            # Sleep until something changes, but come back in time to confirm a settled size
+            wait_time = self.settle_time if sizes else self.poll_interval
+            self._changed.wait(min(wait_time, max(deadline - now, 0)))
+            self._changed.clear()
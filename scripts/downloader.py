@@ -1,7 +1,6 @@
 import os
 import time
-import requests
-import subprocess
+import argparse
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -12,12 +11,51 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
 import shutil
+from fetcher import fetch_files
+from metrics import span, file_size
+from download_watcher import DownloadWatcher
+from catalog import drive_download_url, load_catalog, save_catalog, sync_catalog
+from audio_preprocessor import HEAD_TRIM, TAIL_TRIM, SAMPLE_RATE, OUTPUT_FORMATS, OUTPUT_FORMAT, stream_audio
+
+# Returns, for each transcript element passed in, every attribute value in its row that looks like a
+# Google Drive or PDF link, together with the text of the element holding it (e.g. the language name)
+HARVEST_TRANSCRIPT_LINKS_JS = """
+return Array.from(arguments[0], (parent) => {
+    const links = [];
+    // Use the enclosing row unless it is shared with other transcripts, then only the element and its sibling
+    let scopes = [parent.parentElement];
+    if (!scopes[0] || scopes[0].querySelectorAll("div.c-language").length > 1) {
+        scopes = [parent, parent.nextElementSibling].filter(Boolean);
+    }
+    for (const scope of scopes) {
+        for (const element of [scope, ...scope.querySelectorAll("*")]) {
+            for (const attribute of element.attributes) {
+                if (/drive\\.google\\.com|\\.pdf(\\?|$)/i.test(attribute.value)) {
+                    links.push({text: element.textContent.trim(), url: attribute.value});
+                }
+            }
+        }
+    }
+    return links;
+});
+"""
+
+
+def pick_transcript_link(links, language="English-Verified"):
+    """Choose the link of the preferred language among the links harvested for one transcript."""
+    for link in links:
+        if language.lower() in link["text"].lower():
+            return link["url"]
+    return links[0]["url"] if links else None
+
 
 class DataDownloader:
-    def __init__(self, course_url: str):
+    def __init__(self, course_url: str, driver=None):
         self.course_url = course_url
+        # A driver passed in is shared (e.g. by a batch of courses): it is reused and never quit here
+        self.driver = driver
 
-    def setup_selenium(self):
+    def setup_selenium(self, download_dir: str = "downloads"):
         """Setup the Selenium WebDriver for Chrome."""
         chrome_options = Options()
         chrome_options.add_argument("--disable-gpu")              # Disable GPU acceleration
@@ -27,7 +65,7 @@ class DataDownloader:
 
         # Configure Chrome to suppress "Show downloads when they're done" notification
         prefs = {
-            "download.default_directory": os.path.abspath("downloads"),      # Default download directory
+            "download.default_directory": os.path.abspath(download_dir),     # Default download directory
             "plugins.always_open_pdf_externally": True,                      # Bypass PDF viewer to directly download
             "download.prompt_for_download": False,                           # Disable download prompts
             "profile.default_content_setting_values.automatic_downloads": 1  # Suppress download notifications
@@ -36,26 +74,130 @@ class DataDownloader:
 
         return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
 
-    def download_transcripts(self, downloads_folder: str, transcripts_folder: str):
-        """Download lecture transcripts (PDFs) from the course page."""
-        driver = self.setup_selenium()
-        driver.get(self.course_url)
-        wait = WebDriverWait(driver, 30)
+    def get_driver(self, download_dir: str = "downloads"):
+        """Return the shared driver if there is one, otherwise start a new one."""
+        if self.driver is None:
+            return self.setup_selenium(download_dir)
 
+        # The download directory of a running Chrome can only be changed through DevTools
         try:
-            # Open the "Download" pane
-            print("Opening Download pane...")
-            download_pane = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//span[contains(@class, 'tab') and contains(text(), 'downloads')]"))
-            )
-            download_pane.click()
+            self.driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": os.path.abspath(download_dir)})
+        except Exception as e:
+            print(f"Could not set download directory: {e}")
+        return self.driver
+
+    def release_driver(self, driver):
+        """Quit a driver started by get_driver, or leave a shared driver with only its main tab open."""
+        if driver is not self.driver:
+            driver.quit()
+            return
 
-            # Open "Transcripts" dropdown
-            print("Opening Transcripts dropdown...")
-            transcripts_dropdown = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'type')]/h3[text()='Transcripts']"))
+        try:
+            for handle in driver.window_handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+        except Exception as e:
+            print(f"Could not reset shared driver: {e}")
+
+    def open_downloads_section(self, driver, wait, section: str):
+        """Open the "downloads" pane and expand the given section ("Videos" or "Transcripts")."""
+        # Open the "Download" pane
+        print("Opening Download pane...")
+        download_pane = wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//span[contains(@class, 'tab') and contains(text(), 'downloads')]"))
+        )
+        download_pane.click()
+
+        # Open the section dropdown
+        print(f"Opening {section} dropdown...")
+        section_dropdown = wait.until(
+            EC.element_to_be_clickable((By.XPATH, f"//div[contains(@class, 'type')]/h3[text()='{section}']"))
+        )
+        section_dropdown.click()
+
+    def open_transcript_tab(self, driver, wait, parent, i: int):
+        """Select the English-Verified transcript of one lecture and switch to the Google Drive tab it opens."""
+        # Define the dropdown element
+        dropdown = parent.find_element(By.XPATH, ".//div[contains(@class, 'pseudo-input')]")
+
+        # Scroll to the dropdown and click it
+        driver.execute_script("arguments[0].scrollIntoView(true);", dropdown)
+
+        dropdown.click()
+
+        # Select "English-Verified" option
+        print("Selecting language: English-Verified...")
+        english_verified_option = wait.until(
+            EC.element_to_be_clickable(
+                (By.XPATH, "//ul[@class='pseudo-options show']")
             )
-            transcripts_dropdown.click()
+        )
+        english_verified_option.click()
+
+        # Find the sibling element containing the "Transcripts" button
+        print("Finding sibling containing the 'Transcripts' button...")
+        sibling = parent.find_element(
+            By.XPATH, ".//following-sibling::div[descendant::button[contains(text(), 'Transcripts')]]"
+        )
+
+        # Define the "Transcripts" button with href link, it is enabled once a language is selected
+        button = wait.until(
+            lambda _: sibling.find_element(By.XPATH, ".//button[@class='download-btn' and not(@disabled)]")
+        )
+
+        # Wait for the button to be clickable and make sure it's not obstructed by other elements
+        print(f"Waiting for the button to be clickable for transcript {i}...")
+        wait.until(EC.element_to_be_clickable(button))
+        driver.execute_script("arguments[0].scrollIntoView(true);", button)
+
+        # Use JavaScript to click the button if normal clicking fails due to obstructions
+        num_windows = len(driver.window_handles)
+        try:
+            print(f"Opening transcript {i} in a new tab...")
+            button.click()
+        except Exception as e:
+            print(f"Normal click failed, using JavaScript click: {e}")
+            driver.execute_script("arguments[0].click();", button)
+
+        # Switch to the new tab once it has opened
+        wait.until(EC.number_of_windows_to_be(num_windows + 1))
+        driver.switch_to.window(driver.window_handles[-1])
+
+    def download_transcripts(self, downloads_folder: str, transcripts_folder: str, max_workers: int = 4, per_host: int = 2):
+        """Download lecture transcripts (PDFs) over HTTP with a pool of workers sharing one session.
+        Transcripts whose link could not be found or fetched are downloaded through the browser."""
+        transcript_urls = self.get_transcript_urls()
+
+        # Create output directory if it doesn't exist
+        os.makedirs(transcripts_folder, exist_ok=True)
+
+        jobs = [(url, os.path.join(transcripts_folder, f"lec{i}.pdf")) for i, url in transcript_urls if url]
+        print(f"Downloading {len(jobs)} transcripts using {max_workers} workers ({per_host} per host)...")
+        results = fetch_files(jobs, max_workers=max_workers, per_host=per_host)
+
+        fetched = {result["url"] for result in results if result["status"] in ("done", "resumed", "skipped")}
+        missing = [i for i, url in transcript_urls if url not in fetched]
+        if missing:
+            print(f"Downloading {len(missing)} transcripts through the browser...")
+            self.download_transcripts_with_browser(downloads_folder, transcripts_folder, indices=missing)
+
+        print("All transcripts have been processed.")
+        return results
+
+    def download_transcripts_with_browser(self, downloads_folder: str, transcripts_folder: str, indices=None):
+        """Download lecture transcripts (PDFs) by clicking through the course page and Google Drive.
+        Each PDF is moved to transcripts_folder as soon as Chrome has finished writing it.
+        Only the transcripts listed in indices (1-based) are downloaded, all of them if indices is None."""
+        driver = self.get_driver(downloads_folder)
+        driver.get(self.course_url)
+        wait = WebDriverWait(driver, 30)
+        watcher = DownloadWatcher(downloads_folder)
+        watcher.start()
+        latencies = []
+
+        try:
+            self.open_downloads_section(driver, wait, "Transcripts")
 
             # Locate all parent elements with "Select Language" and "Transcripts" button
             print("Locating parent elements with 'Select Language' and 'Transcripts' button...")
@@ -69,78 +211,39 @@ class DataDownloader:
 
             # Process each parent element
             for i, parent in enumerate(parents, start=1):
-                print(f"Processing parent element {i}...")
-
-                # Define the dropdown element
-                dropdown = parent.find_element(By.XPATH, ".//div[contains(@class, 'pseudo-input')]")
-
-                # Scroll to the dropdown and click it
-                driver.execute_script("arguments[0].scrollIntoView(true);", dropdown)
-                
-                dropdown.click()
-                
-                time.sleep(3)
-
-                # Select "English-Verified" option
-                print("Selecting language: English-Verified...")
-                english_verified_option = wait.until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, "//ul[@class='pseudo-options show']")
+                if indices is not None and i not in indices:
+                    continue
+                with span("browser_transcript", i) as item:
+                    self.open_transcript_tab(driver, wait, parent, i)
+
+                    # Interact with the download button in the Google Drive interface
+                    download_button = wait.until(
+                        EC.element_to_be_clickable((By.XPATH, "//div[contains(@aria-label, 'Download') and @role='button']"))
                     )
-                )
-                english_verified_option.click()
-
-                # Find the sibling element containing the "Transcripts" button
-                print("Finding sibling containing the 'Transcripts' button...")
-                sibling = parent.find_element(
-                    By.XPATH, ".//following-sibling::div[descendant::button[contains(text(), 'Transcripts')]]"
-                )
-                
-                time.sleep(3)
-                
-                # Define the "Transcripts" button with href link
-                button = sibling.find_element(
-                    By.XPATH, ".//button[@class='download-btn' and not(@disabled)]"
-                )
-
-                # Wait for the button to be clickable and make sure it's not obstructed by other elements
-                print(f"Waiting for the button to be clickable for transcript {i}...")
-                wait.until(EC.element_to_be_clickable(button))
-                driver.execute_script("arguments[0].scrollIntoView(true);", button)
-
-                # Use JavaScript to click the button if normal clicking fails due to obstructions
-                try:
-                    print(f"Opening transcript {i} in a new tab...")
-                    button.click()
-                except Exception as e:
-                    print(f"Normal click failed, using JavaScript click: {e}")
-                    driver.execute_script("arguments[0].click();", button)
-
-                time.sleep(3)
-
-                # Switch to the new tab
-                driver.switch_to.window(driver.window_handles[-1])
-
-                # Interact with the download button in the Google Drive interface
-                print("Clicking the download button...")
-                download_button = wait.until(
-                    EC.element_to_be_clickable((By.XPATH, "//div[contains(@aria-label, 'Download') and @role='button']"))
-                )
-                download_button.click()
-
-                # Wait 15 seconds for the file to download and stabilize
-                # this time of 15 seconds should be changed depending on size of files
-                print(f"Waiting for transcript {i} to be downloaded...")
-                time.sleep(15)  
+                    known_files = watcher.snapshot()
+                    start_time = time.monotonic()
+                    download_button.click()
+
+                    # Wait until Chrome has renamed the .crdownload file and its size is stable
+                    pdf_path = watcher.wait_for_new_file(known_files, suffix=".pdf", timeout=120)
+                    if pdf_path is None:
+                        item.outcome = "timeout"
+                        item.error = "not downloaded within 120 seconds"
+                    else:
+                        latencies.append(time.monotonic() - start_time)
+                        item.bytes_in = file_size(pdf_path)
+                        shutil.move(pdf_path, os.path.join(transcripts_folder, os.path.basename(pdf_path)))
 
                 # Close the current tab and return to the main tab
                 driver.close()
                 driver.switch_to.window(driver.window_handles[0])
 
-            print("All transcripts have been successfully downloaded.")
+            num_requested = len(parents) if indices is None else len(indices)
+            print(f"{len(latencies)} of {num_requested} transcripts have been downloaded.")
+            if latencies:
+                print(f"Download latency: mean {sum(latencies) / len(latencies):.2f} s, max {max(latencies):.2f} s")
 
-            # Move all downloaded files from the "downloads" folder to the "transcripts" folder
-            print("Moving downloaded files to the transcripts folder...")
+            # Move any late downloads from the "downloads" folder to the "transcripts" folder
             for file in os.listdir(downloads_folder):
                 if file.endswith(".pdf"):
                     src_path = os.path.join(downloads_folder, file)
@@ -153,99 +256,179 @@ class DataDownloader:
         except Exception as e:
             print(f"Error downloading transcripts: {e}")
         finally:
-            driver.quit()
+            watcher.stop()
+            self.release_driver(driver)
 
+        return latencies
 
-    def download_videos(self, output_dir: str):
-        """Download lecture videos (MP4) using Selenium and ffmpeg."""
-        driver = self.setup_selenium()
+    def get_transcript_urls(self):
+        """Collect the download URL of every lecture transcript from the course page.
+        All links present in the page are read in a single pass, lectures without a link in the page
+        fall back to opening their Google Drive tab.
+        Returns a list of (index, transcript_url) tuples, transcript_url is None when it could not be found."""
+        driver = self.get_driver()
         driver.get(self.course_url)
-        wait = WebDriverWait(driver, 20)
+        wait = WebDriverWait(driver, 30)
+        transcript_urls = []
 
         try:
-            # Click on the "Download" pane
-            print("Opening Download pane...")
-            download_pane = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//span[contains(@class, 'tab') and contains(text(), 'downloads')]"))
-            )
-            download_pane.click()
-            time.sleep(2)
+            self.open_downloads_section(driver, wait, "Transcripts")
 
-            # Open "Videos" dropdown
-            print("Opening Videos dropdown...")
-            videos_dropdown = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'type')]/h3[text()='Videos']"))
+            parents = wait.until(
+                EC.presence_of_all_elements_located((By.XPATH, "//div[contains(@class, 'c-language')]"))
             )
-            videos_dropdown.click()
-            time.sleep(2)
+            print(f"Found {len(parents)} transcripts.")
 
-            # Locate all download buttons
-            print("Locating download buttons...")
-            download_buttons = wait.until(
-                EC.presence_of_all_elements_located(
-                    (By.XPATH, "//div[contains(@class, 'type') and .//h3[text()='Videos']]//div[contains(@class, 'd-data')]//button[contains(@class, 'download-btn') and text()='Download']")
-                )
-            )
-            print(f"Found {len(download_buttons)} videos.")
+            # Read every transcript link from the DOM with one script call
+            harvested = driver.execute_script(HARVEST_TRANSCRIPT_LINKS_JS, parents)
+            print(f"Found links of {sum(1 for links in harvested if links)} transcripts in the page.")
 
-            # Create output directory if it doesn't exist
-            os.makedirs(output_dir, exist_ok=True)
+            for i, (parent, links) in enumerate(zip(parents, harvested), start=1):
+                transcript_url = pick_transcript_link(links)
+                if transcript_url:
+                    transcript_urls.append((i, drive_download_url(transcript_url)))
+                    continue
 
-            for i, button in enumerate(download_buttons, start=1):
-                try:
-                    print(f"Processing video {i}...")
+                with span("transcript_url", i) as item:
+                    try:
+                        self.open_transcript_tab(driver, wait, parent, i)
+                        transcript_url = drive_download_url(driver.current_url)
 
-                    # Scroll to the button and click it
-                    driver.execute_script("arguments[0].scrollIntoView(true);", button)
-                    time.sleep(2)
-                    button.click()
+                        # Close the current tab and return to the main tab
+                        driver.close()
+                        driver.switch_to.window(driver.window_handles[0])
 
-                    # Switch to the new tab
-                    time.sleep(3)
-                    driver.switch_to.window(driver.window_handles[-1])
+                    except Exception as e:
+                        item.outcome = "failed"
+                        item.error = str(e)
 
-                    # Extract video URL from the new tab
-                    print("Extracting video source URL...")
-                    video_source = wait.until(
-                        EC.presence_of_element_located((By.XPATH, "//video/source[contains(@src, '.mp4')]"))
-                    )
-                    video_url = video_source.get_attribute("src")
+                transcript_urls.append((i, transcript_url))
 
-                    if video_url:
-                        print(f"Downloading video {i} from {video_url} using ffmpeg...")
+        except Exception as e:
+            print(f"Error collecting transcript URLs: {e}")
 
-                        # Define output file path
-                        output_file = os.path.join(output_dir, f"video_{i}.mp4")
+        finally:
+            self.release_driver(driver)
 
-                        # Run ffmpeg command
-                        command = [
-                            "ffmpeg",
-                            "-i", video_url,   # Input URL
-                            "-c", "copy",      # Direct copy without re-encoding
-                            output_file        # Output file path
-                        ]
-                        try:
-                            subprocess.run(command, check=True)
-                            print(f"Video {i} saved to {output_file}")
-                        except subprocess.CalledProcessError as e:
-                            print(f"Failed to download video {i}: {e}")
-                    else:
-                        print(f"Video {i} URL not found.")
+        return transcript_urls
 
-                    # Close the current tab and switch back to the main tab
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
+    def get_video_urls(self):
+        """Collect the title and MP4 source URL of every lecture video from the course page.
+        Returns a list of dicts with index, title and video_url, video_url is None when it could not be found."""
+        driver = self.get_driver()
+        driver.get(self.course_url)
+        wait = WebDriverWait(driver, 20)
+        videos = []
 
-                except Exception as e:
-                    print(f"Error processing video {i}: {e}")
+        try:
+            self.open_downloads_section(driver, wait, "Videos")
 
-            print("All videos have been processed.")
+            # Locate all download buttons
+            print("Locating download buttons...")
+            download_buttons = wait.until(
+                EC.presence_of_all_elements_located(
+                    (By.XPATH, "//div[contains(@class, 'type') and .//h3[text()='Videos']]//div[contains(@class, 'd-data')]//button[contains(@class, 'download-btn') and text()='Download']")
+                )
+            )
+            print(f"Found {len(download_buttons)} videos.")
+
+            for i, button in enumerate(download_buttons, start=1):
+                video = {"index": i, "title": None, "video_url": None}
+                with span("video_url", i) as item:
+                    try:
+                        # The lecture title is the text of the row holding the button
+                        row = button.find_element(By.XPATH, "./ancestor::div[contains(@class, 'd-data')][1]")
+                        video["title"] = row.text.replace("Download", "").strip() or None
+
+                        # Scroll to the button and click it
+                        driver.execute_script("arguments[0].scrollIntoView(true);", button)
+                        num_windows = len(driver.window_handles)
+                        wait.until(EC.element_to_be_clickable(button))
+                        button.click()
+
+                        # Switch to the new tab
+                        wait.until(EC.number_of_windows_to_be(num_windows + 1))
+                        driver.switch_to.window(driver.window_handles[-1])
+
+                        # Extract video URL from the new tab
+                        video_source = wait.until(
+                            EC.presence_of_element_located((By.XPATH, "//video/source[contains(@src, '.mp4')]"))
+                        )
+                        video["video_url"] = video_source.get_attribute("src") or None
+
+                        if not video["video_url"]:
+                            item.outcome = "not_found"
+
+                        # Close the current tab and switch back to the main tab
+                        driver.close()
+                        driver.switch_to.window(driver.window_handles[0])
+
+                    except Exception as e:
+                        item.outcome = "failed"
+                        item.error = str(e)
+
+                videos.append(video)
 
         except Exception as e:
-            print(f"Error downloading videos: {e}")
+            print(f"Error collecting video URLs: {e}")
 
         finally:
-            driver.quit()
+            self.release_driver(driver)
+
+        return videos
+
+    def download_videos(self, output_dir: str, max_workers: int = 4, per_host: int = 2):
+        """Download lecture videos (MP4) over HTTP with a pool of workers.
+        Interrupted downloads are resumed with Range requests on the next run."""
+        videos = self.get_video_urls()
+
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+
+        jobs = [
+            (video["video_url"], os.path.join(output_dir, f"video_{video['index']}.mp4"))
+            for video in videos if video["video_url"]
+        ]
+        print(f"Downloading {len(jobs)} videos using {max_workers} workers ({per_host} per host)...")
+        results = fetch_files(jobs, max_workers=max_workers, per_host=per_host)
+
+        failed = [result for result in results if result["status"] in ("failed", "incomplete")]
+        print(f"All videos have been processed. {len(failed)} failed.")
+        return results
+
+    def download_audio(self, output_dir: str, max_workers: int = 4, head_trim: float = HEAD_TRIM,
+                       tail_trim: float = TAIL_TRIM, sample_rate: int = SAMPLE_RATE, output_format: str = OUTPUT_FORMAT):
+        """Convert lecture videos straight from their URLs to trimmed 16kHz mono WAVs (or FLAC/Opus files), skipping the MP4 files."""
+        videos = self.get_video_urls()
+        video_urls = [(video["index"], video["video_url"]) for video in videos if video["video_url"]]
+        print(f"Converting {len(video_urls)} videos to audio using {max_workers} workers...")
+        failed = stream_audio(video_urls, output_dir, max_workers, head_trim, tail_trim, sample_rate, output_format)
+        print(f"All audios have been processed. {len(failed)} failed.")
+        return failed
+
+    def scrape_catalog(self, catalog_path: str):
+        """Scrape the list of lectures (index, title, video URL, transcript URL) and save it as a catalog file."""
+        videos = self.get_video_urls()
+        transcript_urls = dict(self.get_transcript_urls())
+
+        lectures = []
+        for index in sorted(set(transcript_urls) | {video["index"] for video in videos}):
+            video = next((video for video in videos if video["index"] == index), {})
+            lectures.append({
+                "index": index,
+                "title": video.get("title"),
+                "video_url": video.get("video_url"),
+                "transcript_url": transcript_urls.get(index)
+            })
+
+        catalog = {
+            "course_url": self.course_url,
+            "scraped_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "lectures": lectures
+        }
+        save_catalog(catalog, catalog_path)
+        print(f"Catalog with {len(lectures)} lectures saved to {catalog_path}")
+        return catalog
         
 
     '''
@@ -344,20 +527,48 @@ class DataDownloader:
 
 
 if __name__ == "__main__":
-    course_url = "https://nptel.ac.in/courses/106106184"  
-
-    downloader = DataDownloader(course_url)
+    parser = argparse.ArgumentParser(description="Download NPTEL lecture videos and transcripts.")
+    parser.add_argument("mode", nargs="?", default="full", choices=["full", "scrape", "sync", "audio"],
+                        help="full: scrape and download everything with the browser, "
+                             "scrape: only save the course catalog, "
+                             "sync: fetch new or changed files listed in the catalog, "
+                             "audio: convert the videos in the catalog straight to trimmed WAVs without saving the MP4s")
+    parser.add_argument("--course-url", default="https://nptel.ac.in/courses/106106184")
+    parser.add_argument("--catalog", default="./catalog.json", help="Path to the course catalog file")
+    parser.add_argument("--rescrape", action="store_true", help="In sync mode, scrape the catalog again first")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent downloads")
+    parser.add_argument("--per-host", type=int, default=2, help="Number of concurrent downloads per host")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio", help="Output directory of the audio mode")
+    parser.add_argument("--head-trim", type=float, default=HEAD_TRIM, help="Seconds removed from the start in audio mode")
+    parser.add_argument("--tail-trim", type=float, default=TAIL_TRIM, help="Seconds removed from the end in audio mode")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="Output sampling rate in audio mode")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT, help="Output audio format in audio mode")
+    args = parser.parse_args()
+
+    downloader = DataDownloader(args.course_url)
 
     downloads_path = "./downloads"           
     transcripts_path = "./transcripts_trial"      
     videos_path = "./videos"
 
-    # Download transcripts
-    downloader.download_transcripts(downloads_path, transcripts_path)
+    if args.mode == "full":
+        # Download transcripts
+        downloader.download_transcripts(downloads_path, transcripts_path, max_workers=args.workers, per_host=args.per_host)
 
-    # Download videos
-    downloader.download_videos(videos_path)
-    
+        # Download videos
+        downloader.download_videos(videos_path, max_workers=args.workers, per_host=args.per_host)
 
+    elif args.mode == "scrape":
+        downloader.scrape_catalog(args.catalog)
 
+    else:
+        # Selenium is only started when there is no catalog yet (or a rescrape is requested)
+        catalog = load_catalog(args.catalog)
+        if catalog is None or args.rescrape or catalog.get("course_url") != args.course_url:
+            catalog = downloader.scrape_catalog(args.catalog)
 
+        if args.mode == "sync":
+            sync_catalog(args.catalog, videos_path, transcripts_path, max_workers=args.workers, per_host=args.per_host)
+        else:
+            video_urls = [(lecture["index"], lecture["video_url"]) for lecture in catalog["lectures"] if lecture.get("video_url")]
+            stream_audio(video_urls, args.audio_dir, args.workers, args.head_trim, args.tail_trim, args.sample_rate, args.format)
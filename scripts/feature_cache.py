@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from audio_preprocessor import SAMPLE_RATE, read_pcm
+from manifest_creator import file_state, add_manifest_fields
+
+
+FEATURES_VERSION = 1     # Bump when compute_features changes, to rebuild every cached entry
+N_MELS = 80              # Mel bands per frame
+WIN_SECONDS = 0.025      # Analysis window (400 samples at 16 kHz)
+HOP_SECONDS = 0.010      # Frame step (160 samples at 16 kHz), 100 frames per second
+N_FFT = 512              # FFT size, the window is zero-padded to it
+BLOCK_FRAMES = 6000      # Frames computed at once (60 s), bounds the memory of the FFT
+FEATURE_DTYPE = np.float16  # Half the size of float32, log-mel values need no more precision
+
+
+def default_paths(manifest_path):
+    """Feature file and offset table of a manifest, e.g. train_manifest.jsonl -> train_manifest.jsonl.features.f16, .features.npz."""
+    return manifest_path + ".features.f16", manifest_path + ".features.npz"
+
+
+def mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    """
+    Triangular filters on the HTK mel scale between 0 Hz and the Nyquist frequency.
+    Returns:
+        np.ndarray: Weights of shape (n_fft // 2 + 1, n_mels), so that power @ weights gives mel energies.
+    """
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    fft_freqs = np.linspace(0, sample_rate / 2, n_fft // 2 + 1)
+    mel_points = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2))
+    lower, center, upper = mel_points[:-2, None], mel_points[1:-1, None], mel_points[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).T.astype(np.float32)
+
+
+def num_frames_of(num_samples, sample_rate=SAMPLE_RATE):
+    """Number of frames computed from num_samples samples (frames are not padded past either end)."""
+    win, hop = int(round(WIN_SECONDS * sample_rate)), int(round(HOP_SECONDS * sample_rate))
+    return 0 if num_samples < win else 1 + (num_samples - win) // hop
+
+
+def log_mel(samples, sample_rate=SAMPLE_RATE, filterbank=None):
+    """
+    Log-mel features of mono samples, computed BLOCK_FRAMES frames at a time: the frames of a block
+    are a strided view of the samples, windowed and transformed with one batched rfft. Only one
+    block of int16 samples is converted to float at a time, so a memory-mapped WAV is never copied whole.
+    Args:
+        samples (np.ndarray): Mono samples, int16 or float in [-1, 1].
+        sample_rate (int): Sample rate of the samples.
+        filterbank (np.ndarray): Output of mel_filterbank (computed if None).
+    Returns:
+        np.ndarray: float32 array of shape (num_frames, N_MELS).
+    """
+    win, hop = int(round(WIN_SECONDS * sample_rate)), int(round(HOP_SECONDS * sample_rate))
+    filterbank = mel_filterbank(sample_rate) if filterbank is None else filterbank
+    window = np.hanning(win).astype(np.float32)
+    if samples.dtype == np.int16:
+        window /= 32768.0  # Scales the samples to [-1, 1] along with the windowing
+    num_frames = num_frames_of(len(samples), sample_rate)
+    features = np.empty((num_frames, filterbank.shape[1]), dtype=np.float32)
+
+    for start in range(0, num_frames, BLOCK_FRAMES):
+        end = min(start + BLOCK_FRAMES, num_frames)
+        block = np.asarray(samples[start * hop:(end - 1) * hop + win], dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(block, win)[::hop]
+        power = np.abs(np.fft.rfft(frames * window, n=N_FFT)) ** 2
+        features[start:end] = np.log(np.maximum(power @ filterbank, 1e-10))
+    return features
+
+
+def compute_features(entry):
+    """Log-mel features of a manifest entry (its offset range for segmented manifests), as FEATURE_DTYPE."""
+    samples, sample_rate = read_pcm(entry["audio_filepath"], entry.get("offset", 0.0),
+                                    entry["duration"] if "offset" in entry else None)
+    mono = samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1, dtype=np.float32) / 32768.0
+    return log_mel(mono, sample_rate).astype(FEATURE_DTYPE)
+
+
+def entry_key(entry):
+    """Identifies the audio of an entry in the offset table: path, and offset and duration for segments."""
+    if "offset" in entry:
+        return f"{entry['audio_filepath']}|{entry['offset']}|{entry['duration']}"
+    return entry["audio_filepath"]
+
+
+def load_table(features_path, table_path):
+    """
+    Load the offset table of a feature file.
+    Returns:
+        dict: key -> (audio file state, first row, number of frames), empty if the cache is missing,
+        was computed with other settings or does not match its feature file.
+    """
+    if not (os.path.exists(features_path) and os.path.exists(table_path)):
+        return {}
+    with np.load(table_path) as data:
+        table = {name: data[name] for name in data.files}
+    settings = (int(table["version"]), int(table["n_mels"]), float(table["win_seconds"]), float(table["hop_seconds"]))
+    if settings != (FEATURES_VERSION, N_MELS, WIN_SECONDS, HOP_SECONDS):
+        return {}
+    if int(table["features_size"]) != os.path.getsize(features_path):
+        return {}
+    return {key: (states.tolist(), int(offset), int(frames))
+            for key, states, offset, frames in zip(table["keys"], table["audio_states"], table["offsets"], table["num_frames"])}
+
+
+def build_features(manifest_path, features_path=None, table_path=None, num_workers=None):
+    """
+    Compute the log-mel features of every entry of a manifest into a single feature file, and add
+    feature_offset (first row) and num_frames to every manifest entry, so that a loader reads the
+    features of an entry as rows [feature_offset, feature_offset + num_frames) of the memory-mapped
+    file (see FeatureReader).
+    Entries whose audio file has the same size and mtime as when the cache was built are copied from
+    the old feature file, only the others are computed, by a pool of processes.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        features_path (str): Feature file (default: <manifest>.features.f16).
+        table_path (str): Offset table (default: <manifest>.features.npz).
+        num_workers (int): Number of worker processes (default: number of CPUs).
+    Returns:
+        dict: Numbers of entries computed and reused, and of frames written.
+    """
+    default_features, default_table = default_paths(manifest_path)
+    features_path, table_path = features_path or default_features, table_path or default_table
+    num_workers = num_workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+
+    old_table = load_table(features_path, table_path)
+    # An empty file cannot be memory-mapped
+    old_features = (np.memmap(features_path, dtype=FEATURE_DTYPE, mode="r").reshape(-1, N_MELS)
+                    if old_table and os.path.getsize(features_path) else np.zeros((0, N_MELS), dtype=FEATURE_DTYPE))
+
+    keys, states, offsets, frame_counts = [], [], [], []
+    computed, reused, row = 0, 0, 0
+
+    def write_next(f):
+        nonlocal computed, reused, row
+        key, state, old, future = window.popleft()
+        if future is None:
+            features = old_features[old[1]:old[1] + old[2]]
+            reused += 1
+        else:
+            features = future.result()
+            computed += 1
+        # Copied or written in 60 s blocks, the whole feature file is never in memory
+        for start in range(0, len(features), BLOCK_FRAMES):
+            f.write(np.ascontiguousarray(features[start:start + BLOCK_FRAMES]).tobytes())
+        keys.append(key)
+        states.append(state)
+        offsets.append(row)
+        frame_counts.append(len(features))
+        row += len(features)
+
+    # Bounded window of entries in flight, written in manifest order as they complete
+    window = deque()
+    manifest = open(manifest_path, "r", encoding="utf-8")
+    with manifest, ProcessPoolExecutor(max_workers=num_workers) as executor, open(features_path + ".tmp", "wb") as f:
+        for line in manifest:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key, state = entry_key(entry), file_state(entry["audio_filepath"])
+            old = old_table.get(key)
+            if old is not None and old[0] == state:
+                window.append((key, state, old, None))
+            else:
+                window.append((key, state, None, executor.submit(compute_features, entry)))
+            if len(window) > num_workers * 2:
+                write_next(f)
+        while window:
+            write_next(f)
+    del old_features  # Close the memory map before the file is replaced
+    os.replace(features_path + ".tmp", features_path)
+
+    table = {
+        "version": np.array(FEATURES_VERSION),
+        "n_mels": np.array(N_MELS),
+        "win_seconds": np.array(WIN_SECONDS),
+        "hop_seconds": np.array(HOP_SECONDS),
+        "dtype": np.array(np.dtype(FEATURE_DTYPE).name),
+        "features_size": np.array(os.path.getsize(features_path), dtype=np.int64),
+        "keys": np.array(keys, dtype=str),
+        "audio_states": np.array(states, dtype=np.int64).reshape(-1, 2),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "num_frames": np.array(frame_counts, dtype=np.int64)
+    }
+    with open(table_path + ".tmp", "wb") as f:
+        np.savez(f, **table)
+    os.replace(table_path + ".tmp", table_path)
+
+    add_manifest_fields(manifest_path, ({"feature_offset": offset, "num_frames": frames}
+                                        for offset, frames in zip(offsets, frame_counts)))
+    print(f"Features of {len(keys)} entries written to {features_path} ({row} frames, {computed} computed, "
+          f"{reused} reused) in {time.perf_counter() - start_time:.1f} s")
+    return {"computed": computed, "reused": reused, "frames": row}
+
+
+class FeatureReader:
+    """
+    Zero-copy access to the cached features of manifest entries: the feature file is memory-mapped
+    and the features of an entry are a view of its rows, read from disk only when used.
+    """
+
+    def __init__(self, manifest_path: str, features_path: str = None):
+        self.features_path = features_path or default_paths(manifest_path)[0]
+        self.features = np.memmap(self.features_path, dtype=FEATURE_DTYPE, mode="r").reshape(-1, N_MELS)
+
+    def __len__(self):
+        return len(self.features)
+
+    def __call__(self, entry):
+        """Features of a manifest entry with feature_offset and num_frames, shape (num_frames, N_MELS)."""
+        if "feature_offset" not in entry:
+            raise KeyError(f"{entry['audio_filepath']} has no cached features, run feature_cache.py on the manifest")
+        offset = entry["feature_offset"]
+        return self.features[offset:offset + entry["num_frames"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the log-mel features of a manifest into a memory-mapped cache.")
+    parser.add_argument("manifest", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--features", default=None, help="Feature file (default: <manifest>.features.f16)")
+    parser.add_argument("--table", default=None, help="Offset table (default: <manifest>.features.npz)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    build_features(args.manifest, args.features, args.table, args.workers)
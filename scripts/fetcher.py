@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import span, file_size
+
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB per write
+
+
+def create_session(pool_size=10, retries=5, backoff_factor=1.0):
+    """
+    Create a requests.Session that keeps pool_size connections open per host and
+    retries failed connections and 429/5xx answers with exponential backoff.
+    Args:
+        pool_size (int): Number of connections kept open per host.
+        retries (int): Maximum number of retries per request.
+        backoff_factor (float): Sleep backoff_factor * 2 ** (retry - 1) seconds between retries.
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("HEAD", "GET"),
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter:
+    """Caps the number of simultaneous connections made to each host."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def get(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def parse_total_size(response, resume_from):
+    """
+    Work out the full size of the remote file from a GET response.
+    Args:
+        response (requests.Response): Response to a (possibly ranged) GET request.
+        resume_from (int): Number of bytes requested to be skipped.
+    Returns:
+        int or None: Total size in bytes, or None if the server did not say.
+    """
+    content_range = response.headers.get("Content-Range")
+    if response.status_code == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        offset = resume_from if response.status_code == 206 else 0
+        return offset + int(content_length)
+
+    return None
+
+
+def read_validator(part_file):
+    """ETag and Last-Modified of the response a part file was started from, None if unknown."""
+    try:
+        with open(part_file + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_validator(part_file, response):
+    """Record the ETag or Last-Modified of the response a part file is started from."""
+    validator = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    with open(part_file + ".json", "w", encoding="utf-8") as f:
+        json.dump(validator, f)
+
+
+def if_range(validator):
+    """If-Range value of a validator: a strong ETag, else the Last-Modified date, else None."""
+    if validator is None:
+        return None
+    etag = validator.get("etag")
+    if etag and not etag.startswith("W/"):  # Weak ETags are not allowed in If-Range
+        return etag
+    return validator.get("last_modified")
+
+
+def fetch_file(url, output_file, session=None, timeout=60):
+    """
+    Download a file over HTTP, resuming an interrupted download with a Range request.
+    The data is written to "<output_file>.part" and only renamed to output_file once
+    the number of bytes on disk matches the size reported by the server.
+    The ETag (or Last-Modified date) of the first response is kept in "<output_file>.part.json"
+    and sent as If-Range when resuming, so a file replaced on the server in the meantime is
+    downloaded again from the start (the server answers 200 instead of 206). A part file
+    without a validator is not resumed, and a finished file whose size differs from the
+    server's is downloaded again in full.
+    Args:
+        url (str): URL of the file.
+        output_file (str): Path where the file is saved.
+        session (requests.Session): Session to reuse connections from (optional).
+        timeout (int): Socket timeout in seconds.
+    Returns:
+        dict: Result with the url, path, number of bytes fetched and final status.
+    """
+    session = session or requests
+    part_file = output_file + ".part"
+    result = {"url": url, "path": output_file, "bytes": 0, "status": "done"}
+
+    # A finished file is only skipped when the server agrees on its size
+    if os.path.exists(output_file):
+        head = session.head(url, allow_redirects=True, timeout=timeout)
+        remote_size = head.headers.get("Content-Length")
+        if head.ok and remote_size and int(remote_size) == os.path.getsize(output_file):
+            result["status"] = "skipped"
+            return result
+        # The file changed on the server (or its size is unknown): its bytes cannot be reused
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+    validator = if_range(read_validator(part_file))
+    resume_from = os.path.getsize(part_file) if os.path.exists(part_file) and validator else 0
+    headers = {"Range": f"bytes={resume_from}-", "If-Range": validator} if resume_from else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # Requested range starts at or past the end: the part file may already be complete
+            total_size = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+            total_size = int(total_size) if total_size.isdigit() else None
+            if total_size != resume_from:
+                os.remove(part_file)
+                os.remove(part_file + ".json")
+                return fetch_file(url, output_file, session=session, timeout=timeout)
+        else:
+            response.raise_for_status()
+            total_size = parse_total_size(response, resume_from)
+
+            # Server ignored the Range header, or the file changed since the part was started (If-Range),
+            # so start over from the beginning
+            mode = "ab" if response.status_code == 206 else "wb"
+            if mode == "wb":
+                resume_from = 0
+                write_validator(part_file, response)
+
+            with open(part_file, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    result["bytes"] += len(chunk)
+
+    size_on_disk = os.path.getsize(part_file)
+    if total_size is not None and size_on_disk != total_size:
+        result["status"] = "incomplete"
+        result["error"] = f"expected {total_size} bytes, got {size_on_disk}"
+        return result
+
+    os.replace(part_file, output_file)
+    if os.path.exists(part_file + ".json"):
+        os.remove(part_file + ".json")
+    if resume_from:
+        result["status"] = "resumed"
+    return result
+
+
+def fetch_with_retries(url, output_file, session, limiter, attempts=3, backoff_factor=1.0):
+    """
+    Download one file with fetch_file, retrying (and resuming) a download that breaks off mid-transfer.
+    Args:
+        url (str): URL of the file.
+        output_file (str): Path where the file is saved.
+        session (requests.Session): Session to reuse connections from.
+        limiter (HostLimiter): Caps the connections made to the host of url.
+        attempts (int): Number of times the download is tried.
+        backoff_factor (float): Sleep backoff_factor * 2 ** (attempt - 1) seconds between attempts.
+    Returns:
+        dict: Result of the last attempt, with the bytes fetched over all attempts.
+    """
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    fetched = 0
+    with span("download", output_file) as item:
+        for attempt in range(1, attempts + 1):
+            with limiter.get(url):
+                try:
+                    result = fetch_file(url, output_file, session=session)
+                except (requests.RequestException, OSError) as e:
+                    result = {"url": url, "path": output_file, "bytes": 0, "status": "failed", "error": str(e)}
+            fetched += result["bytes"]
+            if result["status"] not in ("failed", "incomplete"):
+                break
+            if attempt < attempts:
+                time.sleep(backoff_factor * 2 ** (attempt - 1))
+        result["bytes"] = fetched
+        item.bytes_in = fetched
+        item.bytes_out = file_size(output_file)
+        item.outcome = result["status"]
+        item.error = result.get("error")
+    return result
+
+
+def fetch_files(jobs, max_workers=4, per_host=2, session=None, attempts=3, backoff_factor=1.0):
+    """
+    Download many files concurrently with a bounded pool of worker threads.
+    A download that breaks off mid-transfer is retried, resuming from the bytes already on disk.
+    Args:
+        jobs (list): List of (url, output_file) tuples.
+        max_workers (int): Maximum number of downloads running at once.
+        per_host (int): Maximum number of downloads running at once against a single host.
+        session (requests.Session): Session shared by all workers (default: create_session()).
+        attempts (int): Number of times each download is tried.
+        backoff_factor (float): Sleep backoff_factor * 2 ** (attempt - 1) seconds between attempts.
+    Returns:
+        list: One result dict per job, in the same order as jobs.
+    """
+    session = session or create_session(pool_size=max_workers)
+    limiter = HostLimiter(per_host)
+    results = [None] * len(jobs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_with_retries, url, output_file, session, limiter, attempts, backoff_factor): i for i, (url, output_file) in enumerate(jobs)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return results
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from audio_preprocessor import HEAD_TRIM, TAIL_TRIM, SAMPLE_RATE, OUTPUT_FORMATS, OUTPUT_FORMAT, find_audio_files, output_path, process_audio
+from text_preprocessor import process_pdf, rules_versions
+import metrics
+
+
+LEASE_SECONDS = 120   # A claimed job goes back to the queue if its worker is silent for this long
+MAX_ATTEMPTS = 3      # A job failing this many times is marked failed
+REPORT_ATTEMPTS = 5   # Tries to record the result of a job while the database is locked
+REPORT_BACKOFF = 1.0  # Seconds before the second try, doubled after every try
+
+
+class JobQueue:
+    """
+    Lease-based job queue in a SQLite file on storage shared by every node.
+    A worker claims a job for LEASE_SECONDS and renews the lease with heartbeats while it works.
+    Jobs whose lease ran out (the worker died or lost the storage) are handed out again, up to
+    max_attempts times. Claims run in an IMMEDIATE transaction, so two workers never get the same job.
+    The database uses the rollback journal, not WAL, because WAL needs shared memory that network
+    filesystems do not provide; the filesystem must support POSIX locks (e.g. NFSv4). Lease times
+    come from the clocks of the nodes, which should be kept in sync (NTP).
+    """
+
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                error TEXT,
+                updated_at REAL,
+                UNIQUE (kind, key)
+            )
+        """)
+
+    def _transaction(self, function):
+        """Run function(cursor) in a write transaction taken before any read."""
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = function(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def add(self, kind, key, payload, max_attempts=MAX_ATTEMPTS):
+        """
+        Add a job unless a job of the same kind and key exists.
+        Returns:
+            bool: True if the job was added.
+        """
+        def insert(cursor):
+            cursor.execute(
+                "INSERT OR IGNORE INTO jobs (kind, key, payload, max_attempts, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, json.dumps(payload), max_attempts, time.time())
+            )
+            return cursor.rowcount == 1
+        return self._transaction(insert)
+
+    def _reclaim(self, cursor, now):
+        cursor.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+            "error = 'lease expired (worker ' || worker || ')', worker = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE state = 'leased' AND lease_expires < ?",
+            (now, now)
+        )
+        return cursor.rowcount
+
+    def reclaim_expired(self):
+        """Put the jobs whose lease ran out back in the queue. Returns the number of jobs reclaimed."""
+        return self._transaction(lambda cursor: self._reclaim(cursor, time.time()))
+
+    def claim(self, worker, kinds=None):
+        """
+        Lease the oldest pending job.
+        Args:
+            worker (str): Name of the worker, e.g. "<host>-<pid>".
+            kinds (list): Only claim jobs of these kinds (default: any).
+        Returns:
+            dict or None: id, kind, key, payload and attempts of the job, None if no job is pending.
+        """
+        def take(cursor):
+            now = time.time()
+            self._reclaim(cursor, now)
+            query = "SELECT id, kind, key, payload, attempts FROM jobs WHERE state = 'pending'"
+            parameters = []
+            if kinds:
+                query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+                parameters += list(kinds)
+            row = cursor.execute(query + " ORDER BY id LIMIT 1", parameters).fetchone()
+            if row is None:
+                return None
+            cursor.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row[0])
+            )
+            return {"id": row[0], "kind": row[1], "key": row[2], "payload": json.loads(row[3]), "attempts": row[4] + 1}
+        return self._transaction(take)
+
+    def heartbeat(self, job_id, worker):
+        """
+        Extend the lease of a job.
+        Returns:
+            bool: False if the worker no longer holds the lease (it expired and the job was reclaimed).
+        """
+        def extend(cursor):
+            now = time.time()
+            cursor.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (now + self.lease_seconds, now, job_id, worker)
+            )
+            return cursor.rowcount == 1
+        return self._transaction(extend)
+
+    def complete(self, job_id, worker):
+        """Mark a job done. Returns False if the worker no longer held its lease."""
+        def finish(cursor):
+            cursor.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                (time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+        return self._transaction(finish)
+
+    def fail(self, job_id, worker, error):
+        """Give a job back after an error; it is retried until it reaches max_attempts."""
+        def release(cursor):
+            cursor.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL, lease_expires = NULL, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (error, time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+        return self._transaction(release)
+
+    def counts(self):
+        """Number of jobs per kind and state, e.g. {"audio": {"done": 10, "pending": 2}}."""
+        with self._lock:
+            rows = self._db.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state").fetchall()
+        counts = {}
+        for kind, state, count in rows:
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def close(self):
+        self._db.close()
+
+
+def enqueue_course(job_queue, videos_dir=None, audio_dir=None, transcripts_dir=None, text_dir=None,
+                   head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE, output_format=OUTPUT_FORMAT):
+    """
+    Add one audio job per video and one text job per transcript PDF. Paths are stored as
+    absolute paths, they must be the same on every node (a shared mount).
+    Returns:
+        int: Number of jobs added (jobs already in the queue are not added again).
+    """
+    added = 0
+    if videos_dir and audio_dir:
+        audio_dir = os.path.abspath(audio_dir)
+        for input_file in find_audio_files(os.path.abspath(videos_dir)):
+            payload = {"input_file": input_file, "output_dir": audio_dir,
+                       "head_trim": head_trim, "tail_trim": tail_trim, "sample_rate": sample_rate, "format": output_format}
+            added += job_queue.add("audio", output_path(input_file, audio_dir, output_format), payload)
+    if transcripts_dir and text_dir:
+        transcripts_dir, text_dir = os.path.abspath(transcripts_dir), os.path.abspath(text_dir)
+        for file_name in sorted(f for f in os.listdir(transcripts_dir) if f.endswith(".pdf")):
+            output_file = os.path.join(text_dir, f"{os.path.splitext(file_name)[0]}.txt")
+            payload = {"pdf_path": os.path.join(transcripts_dir, file_name), "output_path": output_file,
+                       "cache_dir": os.path.join(text_dir, ".cache")}
+            added += job_queue.add("text", output_file, payload)
+    return added
+
+
+def run_job(job):
+    """Run the work of one job. Raises RuntimeError if it failed."""
+    payload = job["payload"]
+    if job["kind"] == "audio":
+        os.makedirs(payload["output_dir"], exist_ok=True)
+        result = process_audio(payload["input_file"], payload["output_dir"],
+                               payload["head_trim"], payload["tail_trim"], payload["sample_rate"],
+                               payload.get("format", OUTPUT_FORMAT))
+    elif job["kind"] == "text":
+        os.makedirs(payload["cache_dir"], exist_ok=True)
+        raw_version, clean_version = rules_versions()
+        result = process_pdf(payload["pdf_path"], payload["output_path"], payload["cache_dir"], raw_version, clean_version)
+    else:
+        raise RuntimeError(f"unknown job kind {job['kind']}")
+    if result["status"] == "failed":
+        raise RuntimeError(result["error"])
+    return result
+
+
+def report_result(call, *args):
+    """
+    Record the result of a job with job_queue.complete or job_queue.fail, retrying with an
+    exponential backoff while the database is busy ("database is locked").
+    Returns:
+        bool or None: The return value of call, None if every try failed. The job then stays
+                      leased and is handed out again when its lease runs out.
+    """
+    delay = REPORT_BACKOFF
+    for attempt in range(1, REPORT_ATTEMPTS + 1):
+        try:
+            return call(*args)
+        except sqlite3.OperationalError as e:
+            if attempt == REPORT_ATTEMPTS:
+                print(f"Could not record the result of job {args[0]} after {attempt} tries, it will be retried: {e}")
+                return None
+            print(f"Recording the result of job {args[0]} failed, retrying in {delay:.0f} s: {e}")
+            time.sleep(delay)
+            delay *= 2
+
+
+def run_worker(queue_path, worker=None, kinds=None, lease_seconds=LEASE_SECONDS, wait=False, poll_interval=5.0):
+    """
+    Claim and run jobs until the queue has nothing left to claim.
+    While a job runs, a background thread renews its lease every lease_seconds / 4 seconds. A
+    heartbeat that fails on a busy or unreachable database ("database is locked") is retried at
+    the next tick, and recording the result is retried with a backoff (see report_result). If the
+    lease was lost anyway (the job was handed to another worker), the result is not reported; both
+    workers may then run the same job, which is safe because the stage functions write to part
+    files unique to the host and process and rename them into place.
+    Args:
+        queue_path (str): Path to the SQLite queue on the shared storage.
+        worker (str): Name of the worker (default: <host>-<pid>).
+        kinds (list): Only run jobs of these kinds (default: any).
+        lease_seconds (float): Lease length.
+        wait (bool): Keep polling for new jobs instead of stopping when none is pending.
+        poll_interval (float): Seconds between two polls when the queue is empty.
+    Returns:
+        dict: Number of jobs done and failed by this worker.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    job_queue = JobQueue(queue_path, lease_seconds)
+    counts = {"done": 0, "failed": 0}
+
+    while True:
+        job = job_queue.claim(worker, kinds)
+        if job is None:
+            # Leased jobs of dead workers come back once their lease runs out
+            remaining = sum(state_counts.get("leased", 0) for state_counts in job_queue.counts().values())
+            if not wait and remaining == 0:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        stop_heartbeat = threading.Event()
+
+        def keep_alive():
+            while not stop_heartbeat.wait(lease_seconds / 4):
+                try:
+                    if not job_queue.heartbeat(job["id"], worker):
+                        print(f"[{worker}] lost the lease of {job['kind']} job {job['key']}, its result will not be reported")
+                        return
+                except sqlite3.OperationalError as e:
+                    print(f"[{worker}] heartbeat of {job['kind']} job {job['key']} failed, retrying: {e}")
+
+        heartbeat_thread = threading.Thread(target=keep_alive, daemon=True)
+        heartbeat_thread.start()
+        start_time = time.time()
+        # The stage functions run by the job record their own spans, this one covers the whole job
+        with metrics.span(f"job_{job['kind']}", job["key"], report=False) as item:
+            try:
+                run_job(job)
+                error = None
+            except Exception as e:
+                error = str(e)
+                item.outcome = "failed"
+                item.error = error
+            finally:
+                stop_heartbeat.set()
+                heartbeat_thread.join()
+
+        if error is None and report_result(job_queue.complete, job["id"], worker):
+            counts["done"] += 1
+            print(f"[{worker}] {job['kind']} {job['key']} done in {time.time() - start_time:.1f} s (attempt {job['attempts']})")
+        elif error is not None and report_result(job_queue.fail, job["id"], worker, error):
+            counts["failed"] += 1
+            print(f"[{worker}] {job['kind']} {job['key']} failed (attempt {job['attempts']}): {error}")
+
+    job_queue.close()
+    print(f"[{worker}] no jobs left: {counts['done']} done, {counts['failed']} failed")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share audio and text jobs between machines through a queue on shared storage.")
+    parser.add_argument("command", choices=["enqueue", "work", "status"],
+                        help="enqueue: add the jobs of a course, work: run jobs until none is left, status: count jobs per state")
+    parser.add_argument("--queue", default="./jobs.db", help="SQLite queue file on the shared storage")
+    parser.add_argument("--videos-dir", default=None, help="enqueue: directory of the videos to convert")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio", help="enqueue: output directory of the audio jobs")
+    parser.add_argument("--transcripts-dir", default=None, help="enqueue: directory of the transcript PDFs")
+    parser.add_argument("--text-dir", default="./preprocessed_text", help="enqueue: output directory of the text jobs")
+    parser.add_argument("--head-trim", type=float, default=HEAD_TRIM, help="enqueue: seconds removed from the start")
+    parser.add_argument("--tail-trim", type=float, default=TAIL_TRIM, help="enqueue: seconds removed from the end")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="enqueue: output sampling rate in Hz")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT, help="enqueue: output audio format")
+    parser.add_argument("--kinds", nargs="+", choices=["audio", "text"], default=None, help="work: only run these kinds of jobs")
+    parser.add_argument("--worker-id", default=None, help="work: name of the worker (default: <host>-<pid>)")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="work: lease length in seconds")
+    parser.add_argument("--wait", action="store_true", help="work: keep waiting for new jobs")
+    parser.add_argument("--metrics-dir", default=None, help="work: record a span per job and file in <dir>/metrics-<host>-<pid>.jsonl and metrics.prom")
+    parser.add_argument("--profile-top", type=int, default=0, help="work: with --metrics-dir, keep cProfile dumps of the N slowest jobs")
+    args = parser.parse_args()
+
+    if args.metrics_dir:
+        metrics.enable(args.metrics_dir, args.profile_top)
+
+    if args.command == "enqueue":
+        added = enqueue_course(JobQueue(args.queue), args.videos_dir, args.audio_dir, args.transcripts_dir, args.text_dir,
+                               args.head_trim, args.tail_trim, args.sample_rate, args.format)
+        print(f"{added} jobs added to {args.queue}")
+    elif args.command == "work":
+        run_worker(args.queue, args.worker_id, args.kinds, args.lease, args.wait)
+
+    print(json.dumps(JobQueue(args.queue).counts(), indent=2))
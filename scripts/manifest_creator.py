@@ -1,52 +1,66 @@
 import os
+import re
 import json
-import wave
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from audio_preprocessor import OUTPUT_FORMATS, read_sidecar, decode_audio
+from audio_headers import probe_audio, pcm_size
+from metrics import span, file_size
+from shards import SHARD_SIZE, DEV_FRACTION, SEED, export_shards
+
+
+AUDIO_FILE_PATTERN = re.compile(r"audio_(\d+)\.(?:wav|flac|opus)")
+AUDIO_OUTPUT_EXTENSIONS = tuple(extension for extension, _ in OUTPUT_FORMATS.values())
 
 
 def get_audio_duration(audio_filepath):
     """
     Get the duration of an audio file in seconds.
+    The duration is read from the sidecar JSON written by audio_preprocessor.py when it is
+    up to date, otherwise from the container headers (WAV, FLAC or Ogg, see probe_audio).
     Args:
         audio_filepath (str): Path to the audio file.
     Returns:
         float: Duration of the audio file in seconds.
     """
-    with wave.open(audio_filepath, 'r') as audio:
-        frames = audio.getnframes()
-        rate = audio.getframerate()
-        duration = frames / float(rate)
-    return duration
+    metadata = read_sidecar(audio_filepath)
+    if metadata is not None and "duration" in metadata:
+        return metadata["duration"]
+
+    return probe_audio(audio_filepath)["duration"]
 
 
-def create_training_manifest(audio_dir, text_dir, output_file):
+def lecture_number(audio_file):
     """
-    Create a training manifest file for speech-to-text training.
+    Get the lecture number from an audio file name, e.g. "audio_12.wav" or "audio_12.flac" -> 12.
     Args:
-        audio_dir (str): Directory containing audio files.
-        text_dir (str): Directory containing corresponding text files.
-        output_file (str): Path to the output JSONL manifest file.
+        audio_file (str): Audio file name.
+    Returns:
+        int or None: The lecture number, or None if the name is not shaped like audio_<n>.wav (.flac, .opus).
     """
-    manifest = []
+    match = AUDIO_FILE_PATTERN.fullmatch(audio_file)
+    return int(match.group(1)) if match else None
 
-    # List and sort audio files numerically by extracting the number from filenames
-    audio_files = [f for f in os.listdir(audio_dir) if f.endswith(".wav")]
-    audio_files = sorted(audio_files, key=lambda x: int(x.split('_')[1].split('.')[0]))
 
-    for audio_file in audio_files:
-        audio_number = audio_file.split('_')[1].split('.')[0]
-        text_file = f"lec{audio_number}.txt"
+def file_state(path):
+    """Size and modification time (ns) of a file, used to detect changes without reading it."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
 
-        audio_filepath = os.path.join(audio_dir, audio_file)
-        text_filepath = os.path.join(text_dir, text_file)
-        
-        # Replace backslashes with forward slashes for JSON consistency
-        audio_filepath = audio_filepath.replace("\\", "/")
-        text_filepath = text_filepath.replace("\\", "/")
-
-        if not os.path.exists(text_filepath):
-            print(f"Warning: Text file for {audio_file} not found. Skipping.")
-            continue
 
+def build_entry(audio_filepath, text_filepath):
+    """
+    Build the manifest line of one lecture.
+    Args:
+        audio_filepath (str): Path to the audio file.
+        text_filepath (str): Path to the text file.
+    Returns:
+        bytes: The JSON line (with newline) of the entry.
+    """
+    # One line per entry would flood the console, so entries are only recorded
+    with span("manifest", audio_filepath, report=False) as item:
         with open(text_filepath, "r", encoding="utf-8") as f:
             text = f.read().strip()
 
@@ -58,20 +72,261 @@ def create_training_manifest(audio_dir, text_dir, output_file):
             "duration": duration,
             "text": text
         }
-        manifest.append(entry)
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        item.bytes_in = file_size(text_filepath)
+        item.bytes_out = len(line)
+    return line
+
+
+def load_manifest_state(output_file):
+    """
+    Load the state file written next to a manifest by create_training_manifest.
+    Returns:
+        dict: audio_filepath -> {"audio", "text": [size, mtime_ns], "offset", "length"} of its line in the manifest.
+    """
+    state_file = output_file + ".state.json"
+    if not (os.path.exists(output_file) and os.path.exists(state_file)):
+        return {}
+    with open(state_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    # A manifest edited by hand no longer matches the recorded offsets
+    if state.get("manifest_size") != os.path.getsize(output_file):
+        return {}
+    return state["entries"]
+
+
+def add_manifest_fields(output_file, fields):
+    """
+    Rewrite a manifest with extra fields in its entries, e.g. the output of feature_cache.py or
+    audio_quality.py. The state file of create_training_manifest is updated with the new line
+    positions, so that --update still reuses the unchanged entries (with their extra fields).
+    Args:
+        output_file (str): Path to the JSONL manifest.
+        fields (iterable): One dict of fields per entry, in file order.
+    Raises:
+        ValueError: If there are fewer or more dicts than entries; the manifest is then left unchanged.
+    """
+    state = load_manifest_state(output_file)
+    position, count = 0, 0
+    fields = iter(fields)
+    try:
+        with open(output_file, "r", encoding="utf-8") as manifest, open(output_file + ".tmp", "wb") as f:
+            entries = (json.loads(line) for line in manifest if line.strip())
+            for entry in entries:
+                new_fields = next(fields, None)
+                if new_fields is None:
+                    raise ValueError(f"{output_file}: fields given for {count} entries, the manifest has more")
+                entry.update(new_fields)
+                line = (json.dumps(entry) + "\n").encode("utf-8")
+                f.write(line)
+                if entry["audio_filepath"] in state:
+                    state[entry["audio_filepath"]].update(offset=position, length=len(line))
+                position += len(line)
+                count += 1
+            if next(fields, None) is not None:
+                raise ValueError(f"{output_file}: more fields given than the {count} entries of the manifest")
+    except BaseException:
+        os.remove(output_file + ".tmp")
+        raise
+    os.replace(output_file + ".tmp", output_file)
+
+    if state:
+        with open(output_file + ".state.json", "w", encoding="utf-8") as f:
+            json.dump({"manifest_size": position, "entries": state}, f)
+
+
+def kept_prefix(items, old_state):
+    """
+    Number of entries of the old manifest kept as they are at its start, when the update only adds
+    entries after them (their files unchanged and in the same order, none removed), 0 otherwise.
+    """
+    position = 0
+    for _, _, _, reusable in items[:len(old_state)]:
+        if reusable is None or reusable["offset"] != position:
+            return 0
+        position += reusable["length"]
+    return len(old_state) if len(items) >= len(old_state) else 0
+
+
+def create_training_manifest(audio_dir, text_dir, output_file, num_workers=8, update=False):
+    """
+    Create a training manifest file for speech-to-text training.
+    Entries are written in lecture order as soon as they are ready, the audio headers and text files
+    are read by a pool of threads. A state file (<output_file>.state.json) records the size and
+    mtime of the audio and text of each entry; with update=True, entries whose files did not change
+    are copied from the existing manifest without opening their files. When the update only adds
+    lectures after the existing entries, they are appended to the manifest in place, so that readers
+    following it (dashboard.py --live) only read the new lines; otherwise the manifest is written to
+    <output_file>.tmp and renamed, and followers read it again from the start.
+    Args:
+        audio_dir (str): Directory containing audio files.
+        text_dir (str): Directory containing corresponding text files.
+        output_file (str): Path to the output JSONL manifest file.
+        num_workers (int): Number of threads reading audio and text files.
+        update (bool): Reuse unchanged entries of the existing manifest.
+    """
+    old_state = load_manifest_state(output_file) if update else {}
+    new_state = {}
+
+    # List and sort audio files numerically by the number in their names
+    lecture_files = {}
+    for audio_file in os.listdir(audio_dir):
+        number = lecture_number(audio_file)
+        if number is None:
+            if audio_file.endswith(AUDIO_OUTPUT_EXTENSIONS):
+                print(f"Warning: {audio_file} is not named audio_<n>{audio_file[audio_file.rfind('.'):]}. Skipping.")
+            continue
+        if number in lecture_files:
+            # Converted again in another format: keep the newest file
+            newest = max((lecture_files[number], audio_file), key=lambda f: os.path.getmtime(os.path.join(audio_dir, f)))
+            print(f"Warning: audio of lecture {number} exists in several formats, using {newest}.")
+            audio_file = newest
+        lecture_files[number] = audio_file
+    audio_files = sorted(lecture_files.items())
+
+    # Work items in manifest order: (audio path, text path, file states, reusable old entry or None)
+    items = []
+    for number, audio_file in audio_files:
+        text_file = f"lec{number}.txt"
+
+        # Replace backslashes with forward slashes for JSON consistency
+        audio_filepath = os.path.join(audio_dir, audio_file).replace("\\", "/")
+        text_filepath = os.path.join(text_dir, text_file).replace("\\", "/")
+
+        if not os.path.exists(text_filepath):
+            print(f"Warning: Text file for {audio_file} not found. Skipping.")
+            continue
+
+        states = {"audio": file_state(audio_filepath), "text": file_state(text_filepath)}
+        old = old_state.get(audio_filepath)
+        reusable = old if old and old["audio"] == states["audio"] and old["text"] == states["text"] else None
+        items.append((audio_filepath, text_filepath, states, reusable))
+
+    tmp_file = output_file + ".tmp"
+    offset, reused = 0, 0
+
+    num_kept = kept_prefix(items, old_state)
+    if num_kept:
+        for audio_filepath, _, states, reusable in items[:num_kept]:
+            new_state[audio_filepath] = dict(states, offset=reusable["offset"], length=reusable["length"])
+            offset += reusable["length"]
+        reused = num_kept
+        items = items[num_kept:]
+        # A build interrupted while appending leaves a manifest that no longer matches its state
+        # file, so the next update rewrites it
+        write_path, mode = output_file, "ab"
+    else:
+        write_path, mode = tmp_file, "wb"
+
+    old_manifest = open(output_file, "rb") if old_state and not num_kept else None
+
+    def write_next(f):
+        nonlocal offset, reused
+        (audio_filepath, _, states, reusable), future = window.popleft()
+        if future is None:
+            # Unchanged files: copy the old line as is, without parsing it
+            old_manifest.seek(reusable["offset"])
+            line = old_manifest.read(reusable["length"])
+            reused += 1
+        else:
+            try:
+                line = future.result()
+            except (OSError, ValueError) as e:
+                # Unreadable audio header (e.g. a file still being written or cut short), or text file
+                # missing, unreadable or not UTF-8 (UnicodeDecodeError is a ValueError)
+                print(f"Warning: entry of {audio_filepath} skipped ({e}).")
+                return
+        f.write(line)
+        new_state[audio_filepath] = dict(states, offset=offset, length=len(line))
+        offset += len(line)
+
+    # Keep a bounded window of entries in flight and write them in order as they complete
+    window = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor, open(write_path, mode) as f:
+            for item in items:
+                audio_filepath, text_filepath, _, reusable = item
+                future = executor.submit(build_entry, audio_filepath, text_filepath) if reusable is None else None
+                window.append((item, future))
+                if len(window) > num_workers * 4:
+                    write_next(f)
+            while window:
+                write_next(f)
+    finally:
+        if old_manifest is not None:
+            old_manifest.close()
+
+    if write_path == tmp_file:
+        os.replace(tmp_file, output_file)
+    with open(output_file + ".state.json", "w", encoding="utf-8") as f:
+        json.dump({"manifest_size": offset, "entries": new_state}, f)
+
+    print(f"Training manifest file created at: {output_file} ({len(new_state)} entries, {reused} reused)")
+
+
+def storage_report(manifest_path, decode_sample=3):
+    """
+    Report the storage used by the audio of a manifest per format, and the bytes saved compared to
+    16-bit PCM WAV. Only the container headers are read (see probe_audio). The decode cost of the
+    compressed formats is measured by decoding up to decode_sample files of each with ffmpeg.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        decode_sample (int): Number of files decoded per compressed format (0 to skip).
+    Returns:
+        dict: format -> files, hours, bytes, pcm_bytes and decode_seconds_per_hour (compressed formats only).
+    """
+    audio_files = {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            audio_filepath = json.loads(line)["audio_filepath"]
+            if audio_filepath not in audio_files:
+                audio_files[audio_filepath] = probe_audio(audio_filepath)
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        for item in manifest:
-            f.write(json.dumps(item) + "\n")
+    report = {}
+    for audio_filepath, info in audio_files.items():
+        totals = report.setdefault(info["format"], {"files": 0, "hours": 0.0, "bytes": 0, "pcm_bytes": 0, "sample": []})
+        totals["files"] += 1
+        totals["hours"] += info["duration"] / 3600
+        totals["bytes"] += os.path.getsize(audio_filepath)
+        totals["pcm_bytes"] += pcm_size(info)
+        if len(totals["sample"]) < decode_sample:
+            totals["sample"].append((audio_filepath, info["duration"]))
 
-    print(f"Training manifest file created at: {output_file}")
+    print(f"{'format':<8}{'files':>8}{'hours':>10}{'MB':>12}{'MB as WAV':>12}{'saved':>8}{'decode s/hour':>16}")
+    for audio_format, totals in sorted(report.items()):
+        sample = totals.pop("sample")
+        decode = ""
+        if audio_format != "wav" and sample:
+            start_time = time.perf_counter()
+            for audio_filepath, _ in sample:
+                decode_audio(audio_filepath)
+            totals["decode_seconds_per_hour"] = (time.perf_counter() - start_time) / (sum(d for _, d in sample) / 3600)
+            decode = f"{totals['decode_seconds_per_hour']:.1f}"
+        saved = 1 - totals["bytes"] / totals["pcm_bytes"]
+        print(f"{audio_format:<8}{totals['files']:>8}{totals['hours']:>10.2f}{totals['bytes'] / 1e6:>12.1f}"
+              f"{totals['pcm_bytes'] / 1e6:>12.1f}{saved:>8.0%}{decode:>16}")
+    return report
 
 
 if __name__ == "__main__":
-    audio_dir = "./preprocessed_audio"
-    text_dir = "./preprocessed_text"
-    output_file = "train_manifest.jsonl"
+    parser = argparse.ArgumentParser(description="Create the JSONL training manifest from audio and text files.")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio", help="Directory containing audio_<n>.wav (.flac, .opus) files")
+    parser.add_argument("--text-dir", default="./preprocessed_text", help="Directory containing lec<n>.txt files")
+    parser.add_argument("--output", default="train_manifest.jsonl", help="Output JSONL manifest file")
+    parser.add_argument("--workers", type=int, default=8, help="Number of threads reading audio and text files")
+    parser.add_argument("--update", action="store_true", help="Reuse entries of the existing manifest whose files did not change")
+    parser.add_argument("--export-shards", default=None, help="Also pack the manifest into tar shards in this directory")
+    parser.add_argument("--shard-size", type=float, default=SHARD_SIZE / 1024 ** 2, help="Maximum shard size in MB")
+    parser.add_argument("--dev-fraction", type=float, default=DEV_FRACTION, help="Fraction of the samples put in the dev split")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the shuffle before sharding")
+    parser.add_argument("--report", action="store_true", help="Print the audio storage per format and the decode cost")
+    parser.add_argument("--decode-sample", type=int, default=3, help="Files decoded per compressed format to measure the decode cost")
+    args = parser.parse_args()
 
-    create_training_manifest(audio_dir, text_dir, output_file)
+    create_training_manifest(args.audio_dir, args.text_dir, args.output, args.workers, args.update)
 
+    if args.report:
+        storage_report(args.output, args.decode_sample)
 
+    if args.export_shards:
+        export_shards(args.output, args.export_shards, int(args.shard_size * 1024 ** 2), args.dev_fraction, args.seed)
@@ -0,0 +1,195 @@
+import io
+import wave
+import argparse
+import numpy as np
+from manifest_index import ManifestReader
+from audio_preprocessor import decode_audio
+from feature_cache import FeatureReader
+
+
+MAX_BATCH_SECONDS = 600.0  # Padded seconds of audio in a batch (batch size x longest entry)
+NUM_BUCKETS = 10           # Entries are grouped into this many buckets of similar duration
+
+
+def load_audio(entry):
+    """
+    Read the samples of a manifest entry as float32 values in [-1, 1].
+    Entries with an offset (segmented manifests) only read their part of the WAV.
+    FLAC and Opus files are decoded with ffmpeg (only the part of the entry).
+    """
+    source = entry["audio_filepath"]
+    if not source.lower().endswith(".wav"):
+        source = io.BytesIO(decode_audio(source, entry.get("offset", 0.0), entry["duration"] if "offset" in entry else None))
+        entry = {"duration": entry["duration"]}
+    with wave.open(source, "rb") as audio:
+        rate = audio.getframerate()
+        if "offset" in entry:
+            audio.setpos(min(int(round(entry["offset"] * rate)), audio.getnframes()))
+            data = audio.readframes(int(round(entry["duration"] * rate)))
+        else:
+            data = audio.readframes(audio.getnframes())
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class ManifestDataset:
+    """
+    Entries of a JSONL manifest by position, read through the manifest index.
+    Items are the manifest entries (dicts), with their samples under "audio" when load_audio=True
+    and their cached log-mel features under "features" when load_features=True (the manifest must
+    have been processed by feature_cache.py; the features are a view of the memory-mapped file).
+    """
+
+    def __init__(self, manifest_path: str, load_audio: bool = False, load_features: bool = False):
+        self.reader = ManifestReader(manifest_path)
+        self.durations = self.reader.duration
+        self.load_audio = load_audio
+        self.features = FeatureReader(manifest_path) if load_features else None
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, i):
+        entry = self.reader[i]
+        if self.load_audio:
+            entry["audio"] = load_audio(entry)
+        if self.features is not None:
+            entry["features"] = self.features(entry)
+        return entry
+
+    def batch(self, indices):
+        """Read the entries of a batch of positions, e.g. one produced by DurationBucketSampler."""
+        return [self[int(i)] for i in indices]
+
+
+def pack_batches(indices, durations, max_batch_seconds):
+    """
+    Cut a sequence of positions into consecutive batches whose padded length, the number of
+    entries times the longest of them, stays within max_batch_seconds. An entry longer than
+    max_batch_seconds gets a batch of its own.
+    Returns:
+        list: Arrays of positions.
+    """
+    batches, current, longest = [], [], 0.0
+    for i in indices:
+        duration = durations[i]
+        if current and (len(current) + 1) * max(longest, duration) > max_batch_seconds:
+            batches.append(np.array(current))
+            current, longest = [], 0.0
+        current.append(i)
+        longest = max(longest, duration)
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+def naive_batches(durations, max_batch_seconds=MAX_BATCH_SECONDS):
+    """Batches in file order with the same padded-seconds cap, the baseline of the stats report."""
+    return pack_batches(range(len(durations)), durations, max_batch_seconds)
+
+
+class DurationBucketSampler:
+    """
+    Batches of manifest positions grouped by duration.
+    Entries are sorted by duration and split into num_buckets buckets with the same number of
+    entries. Every epoch, entries are shuffled within their bucket, each bucket is cut into
+    batches capped by max_batch_seconds of padded audio, and the order of the batches is shuffled.
+    Batches are dealt round-robin to world_size x num_workers shards; every shard gets the same
+    number of batches (the few batches left over are dropped), so ranks stay in step. A ValueError
+    is raised when there are fewer batches than shards, as every shard would then be empty.
+    """
+
+    def __init__(self, durations, max_batch_seconds: float = MAX_BATCH_SECONDS, num_buckets: int = NUM_BUCKETS,
+                 shuffle: bool = True, seed: int = 0, rank: int = 0, world_size: int = 1,
+                 worker_id: int = 0, num_workers: int = 1):
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.max_batch_seconds = max_batch_seconds
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_shards = world_size * num_workers
+        self.shard = rank * num_workers + worker_id
+        self.epoch = 0
+
+        order = np.argsort(self.durations, kind="stable")
+        self.buckets = [bucket for bucket in np.array_split(order, max(min(num_buckets, len(order)), 1)) if len(bucket)]
+        # (epoch, number of batches before sharding), the count changes a little with the shuffle
+        self._num_batches = None
+        self._check(self.num_batches())
+
+    def set_epoch(self, epoch):
+        """Use a different shuffle for every epoch (the same on every rank)."""
+        self.epoch = epoch
+
+    def all_batches(self):
+        """Batches of the current epoch before sharding."""
+        rng = np.random.default_rng(self.seed + self.epoch)
+        batches = []
+        for bucket in self.buckets:
+            bucket = rng.permutation(bucket) if self.shuffle else bucket
+            batches += pack_batches(bucket, self.durations, self.max_batch_seconds)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def num_batches(self):
+        """Number of batches of the current epoch before sharding, computed once per epoch."""
+        if self._num_batches is None or self._num_batches[0] != self.epoch:
+            self._num_batches = (self.epoch, len(self.all_batches()))
+        return self._num_batches[1]
+
+    def _check(self, num_batches):
+        if num_batches < self.num_shards:
+            raise ValueError(f"{num_batches} batches for {self.num_shards} shards (world_size x num_workers), "
+                             f"every shard would be empty: lower max_batch_seconds or the number of shards")
+
+    def __iter__(self):
+        batches = self.all_batches()
+        self._num_batches = (self.epoch, len(batches))
+        self._check(len(batches))
+        usable = len(batches) - len(batches) % self.num_shards
+        return iter(batches[self.shard:usable:self.num_shards])
+
+    def __len__(self):
+        return self.num_batches() // self.num_shards
+
+
+def batch_stats(batches, durations):
+    """
+    Padding efficiency of a list of batches.
+    Returns:
+        dict: num_batches, mean_batch_size, audio_seconds (real audio), padded_seconds (batch size x
+              longest entry, summed) and efficiency (audio_seconds / padded_seconds).
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    audio_seconds = sum(float(durations[batch].sum()) for batch in batches)
+    padded_seconds = sum(float(durations[batch].max()) * len(batch) for batch in batches)
+    return {
+        "num_batches": len(batches),
+        "mean_batch_size": sum(len(batch) for batch in batches) / max(len(batches), 1),
+        "audio_seconds": audio_seconds,
+        "padded_seconds": padded_seconds,
+        "efficiency": audio_seconds / padded_seconds if padded_seconds else 1.0
+    }
+
+
+def padding_report(manifest_path, max_batch_seconds=MAX_BATCH_SECONDS, num_buckets=NUM_BUCKETS, seed=0):
+    """Print the padding efficiency of naive file-order batching and of duration-bucketed batching."""
+    durations = ManifestReader(manifest_path).duration
+    sampler = DurationBucketSampler(durations, max_batch_seconds, num_buckets, seed=seed)
+
+    print(f"{len(durations)} entries, {durations.sum() / 3600:.2f} hours, batches of at most {max_batch_seconds:.0f} padded seconds")
+    print(f"{'batching':<10}{'batches':>10}{'mean size':>12}{'padded hours':>15}{'efficiency':>12}")
+    for name, batches in (("naive", naive_batches(durations, max_batch_seconds)), ("bucketed", sampler.all_batches())):
+        stats = batch_stats(batches, durations)
+        print(f"{name:<10}{stats['num_batches']:>10}{stats['mean_batch_size']:>12.2f}"
+              f"{stats['padded_seconds'] / 3600:>15.2f}{stats['efficiency']:>12.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the padding efficiency of naive and duration-bucketed batches.")
+    parser.add_argument("manifest", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--max-batch-seconds", type=float, default=MAX_BATCH_SECONDS, help="Padded seconds of audio in a batch")
+    parser.add_argument("--buckets", type=int, default=NUM_BUCKETS, help="Number of duration buckets")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the shuffle")
+    args = parser.parse_args()
+
+    padding_report(args.manifest, args.max_batch_seconds, args.buckets, args.seed)
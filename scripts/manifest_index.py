@@ -0,0 +1,169 @@
+import os
+import json
+import mmap
+import time
+import argparse
+import numpy as np
+
+
+INDEX_VERSION = 1  # Bump when the fields of the index change
+
+
+def default_index_path(manifest_path):
+    """Path of the index of a manifest, e.g. train_manifest.jsonl -> train_manifest.jsonl.idx.npz."""
+    return manifest_path + ".idx.npz"
+
+
+def build_index(manifest_path, index_path=None):
+    """
+    Build the binary index of a JSONL manifest in one pass.
+    For every entry it stores the byte offset and length of its line, its duration and the number
+    of words and characters of its text, as NumPy arrays in an .npz file. The size and mtime of the
+    manifest are stored too, so a stale index can be detected.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        index_path (str): Path of the index (default: <manifest_path>.idx.npz).
+    Returns:
+        dict: The arrays of the index.
+    """
+    index_path = index_path or default_index_path(manifest_path)
+    start_time = time.perf_counter()
+    stat = os.stat(manifest_path)
+
+    offsets, lengths, duration, num_words, num_chars = [], [], [], [], []
+    with open(manifest_path, "rb") as f:
+        position = 0
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                text = entry.get("text", "")
+                offsets.append(position)
+                lengths.append(len(line))
+                duration.append(entry["duration"])
+                num_words.append(len(text.split()))
+                num_chars.append(len(text))
+            position += len(line)
+
+    index = {
+        "version": np.array(INDEX_VERSION),
+        "manifest_size": np.array(stat.st_size, dtype=np.int64),
+        "manifest_mtime_ns": np.array(stat.st_mtime_ns, dtype=np.int64),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "lengths": np.array(lengths, dtype=np.int64),
+        "duration": np.array(duration, dtype=np.float64),
+        "num_words": np.array(num_words, dtype=np.int64),
+        "num_chars": np.array(num_chars, dtype=np.int64)
+    }
+
+    # Written through a file object so that numpy does not add its own extension to the .tmp path
+    with open(index_path + ".tmp", "wb") as f:
+        np.savez(f, **index)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"Indexed {len(offsets)} entries of {manifest_path} in {time.perf_counter() - start_time:.2f} s, written to {index_path}")
+    return index
+
+
+def load_index(manifest_path, index_path=None):
+    """
+    Load the index of a manifest, building it first if it is missing or older than the manifest.
+    Returns:
+        dict: The arrays of the index.
+    """
+    index_path = index_path or default_index_path(manifest_path)
+    if os.path.exists(index_path):
+        with np.load(index_path) as data:
+            index = {name: data[name] for name in data.files}
+        stat = os.stat(manifest_path)
+        if (int(index["version"]) == INDEX_VERSION and int(index["manifest_size"]) == stat.st_size
+                and int(index["manifest_mtime_ns"]) == stat.st_mtime_ns):
+            return index
+    return build_index(manifest_path, index_path)
+
+
+class ManifestReader:
+    """
+    Random access to the entries of a JSONL manifest.
+    The manifest is memory-mapped and the index gives the position of every line, so reading
+    entry i only parses that line. duration, num_words and num_chars are NumPy arrays that can
+    be filtered without reading the manifest at all.
+    """
+
+    def __init__(self, manifest_path: str, index_path: str = None):
+        self.manifest_path = manifest_path
+        index = load_index(manifest_path, index_path)
+        self.offsets = index["offsets"]
+        self.lengths = index["lengths"]
+        self.duration = index["duration"]
+        self.num_words = index["num_words"]
+        self.num_chars = index["num_chars"]
+
+        self._file = open(manifest_path, "rb")
+        # An empty file cannot be memory-mapped
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.offsets) else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read_line(self, i):
+        """Raw bytes of the line of entry i (with its newline)."""
+        offset = int(self.offsets[i])
+        return self._mmap[offset:offset + int(self.lengths[i])]
+
+    def __getitem__(self, key):
+        """
+        Read entries by position.
+        Args:
+            key: An int, a slice, or an array of positions or a boolean mask (e.g. from filter).
+        Returns:
+            dict for an int, list of dicts otherwise.
+        """
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(f"entry {key} out of range for {len(self)} entries")
+            return json.loads(self.read_line(key))
+        if isinstance(key, slice):
+            key = range(*key.indices(len(self)))
+        else:
+            key = np.asarray(key)
+            if key.dtype == bool:
+                key = np.flatnonzero(key)
+        return [self[int(i)] for i in key]
+
+    def filter(self, min_duration=None, max_duration=None):
+        """
+        Positions of the entries whose duration is within [min_duration, max_duration].
+        Returns:
+            np.ndarray: Positions, to be passed to __getitem__.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_duration is not None:
+            mask &= self.duration >= min_duration
+        if max_duration is not None:
+            mask &= self.duration <= max_duration
+        return np.flatnonzero(mask)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the byte-offset index of a JSONL manifest.")
+    parser.add_argument("manifest", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--index", default=None, help="Index file (default: <manifest>.idx.npz)")
+    args = parser.parse_args()
+
+    index = build_index(args.manifest, args.index)
+    print(f"{len(index['offsets'])} entries, {index['duration'].sum() / 3600:.2f} hours, "
+          f"{index['num_words'].sum()} words, {index['num_chars'].sum()} characters")
@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import string
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+STATS_VERSION = 2  # Bump when the statistics or the cache layout change
+
+# Per-entry fields written by audio_quality.py (NaN for entries without them), speaking_rate is
+# computed from the text and duration when the field is missing
+QUALITY_ARRAYS = ("rms_dbfs", "snr_db", "silence_fraction", "clipping_ratio", "speaking_rate")
+
+# Bin widths of the live histograms
+BIN_WIDTHS = {"duration": 30.0, "num_words": 100, "num_chars": 500, "rms_dbfs": 3.0, "snr_db": 3.0,
+              "silence_fraction": 0.05, "clipping_ratio": 0.001, "speaking_rate": 0.25}
+RATE_WINDOW = 60.0  # Seconds over which the ingestion rate is measured
+
+# Characters counted in the alphabet, the dashboard keeps letters and space and lowercases them
+ALPHABET_CHARACTERS = set(string.ascii_letters + " ")
+
+
+class RunningStats:
+    """
+    Statistics of manifest entries, updated one entry at a time and mergeable across chunks.
+    Holds the entry count, total duration, vocabulary, the set of characters seen, the
+    duration, number of words, number of characters and quality fields (QUALITY_ARRAYS) of every
+    entry, and the entries flagged by audio_quality.py.
+    """
+
+    def __init__(self):
+        self.num_entries = 0
+        self.total_duration = 0.0
+        self.vocabulary = set()
+        self.characters = set()
+        self.duration = []
+        self.num_words = []
+        self.num_chars = []
+        for name in QUALITY_ARRAYS:
+            setattr(self, name, [])
+        self.flagged = []
+
+    def add(self, entry):
+        text = entry.get("text", "")
+        words = text.split()
+        self.num_entries += 1
+        self.total_duration += entry["duration"]
+        self.vocabulary.update(words)
+        self.characters.update(text)
+        self.duration.append(entry["duration"])
+        self.num_words.append(len(words))
+        self.num_chars.append(len(text))
+        if "speaking_rate" not in entry:
+            entry = dict(entry, speaking_rate=len(words) / entry["duration"] if entry["duration"] > 0 else 0.0)
+        for name in QUALITY_ARRAYS:
+            value = entry.get(name)
+            getattr(self, name).append(np.nan if value is None else value)
+        if entry.get("quality_flags"):
+            self.flagged.append({key: entry[key] for key in ("audio_filepath", "offset", "duration", "quality_flags") + QUALITY_ARRAYS
+                                 if key in entry})
+
+    def merge(self, other):
+        """Add the statistics of the entries that come after ours (e.g. the next chunk)."""
+        self.num_entries += other.num_entries
+        self.total_duration += other.total_duration
+        self.vocabulary |= other.vocabulary
+        self.characters |= other.characters
+        self.duration += other.duration
+        self.num_words += other.num_words
+        self.num_chars += other.num_chars
+        for name in QUALITY_ARRAYS:
+            getattr(self, name).extend(getattr(other, name))
+        self.flagged += other.flagged
+
+    @property
+    def alphabet(self):
+        """Lowercased letters and space, same as re.sub(r'[^a-zA-Z ]', '', text).lower() over every text."""
+        return {c.lower() for c in self.characters if c in ALPHABET_CHARACTERS}
+
+    @property
+    def total_hours(self):
+        return self.total_duration / 3600
+
+
+def chunk_ranges(manifest_path, num_chunks):
+    """
+    Split a manifest into byte ranges of about the same size that start at line starts.
+    Returns:
+        list: (start, end) byte offsets.
+    """
+    size = os.path.getsize(manifest_path)
+    bounds = [0]
+    with open(manifest_path, "rb") as f:
+        for i in range(1, num_chunks):
+            f.seek(max(size * i // num_chunks, bounds[-1]))
+            # Move to the start of the next line
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def stats_for_range(manifest_path, start, end):
+    """Statistics of the lines of a manifest between two line-aligned byte offsets."""
+    stats = RunningStats()
+    with open(manifest_path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if line.strip():
+                stats.add(json.loads(line))
+    return stats
+
+
+def compute_stats(manifest_path, num_workers=None):
+    """
+    Compute the statistics of a manifest in one streaming pass.
+    The file is split into line-aligned byte ranges processed by a pool of processes, each worker
+    only holds the sets and per-entry numbers of its chunk, never the transcripts.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        num_workers (int): Number of worker processes (default: number of CPUs, 1 for small files).
+    Returns:
+        RunningStats: Statistics of the whole manifest, entries in file order.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    # Starting processes is not worth it for a few MB
+    if os.path.getsize(manifest_path) < 16 * 1024 * 1024:
+        num_workers = 1
+    ranges = chunk_ranges(manifest_path, num_workers * 4)
+
+    stats = RunningStats()
+    if num_workers == 1:
+        for start, end in ranges:
+            stats.merge(stats_for_range(manifest_path, start, end))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(stats_for_range, manifest_path, start, end) for start, end in ranges]
+        for future in futures:
+            stats.merge(future.result())
+    return stats
+
+
+def default_cache_path(manifest_path):
+    """Path of the statistics cache of a manifest, e.g. train_manifest.jsonl -> train_manifest.jsonl.stats.npz."""
+    return manifest_path + ".stats.npz"
+
+
+def save_stats(stats, manifest_path, cache_path):
+    """Save statistics with the size and mtime of the manifest they were computed from."""
+    stat = os.stat(manifest_path)
+    with open(cache_path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            version=np.array(STATS_VERSION),
+            manifest_size=np.array(stat.st_size, dtype=np.int64),
+            manifest_mtime_ns=np.array(stat.st_mtime_ns, dtype=np.int64),
+            total_duration=np.array(stats.total_duration),
+            vocabulary=np.array(sorted(stats.vocabulary), dtype=str),
+            characters=np.array(sorted(stats.characters), dtype=str),
+            duration=np.array(stats.duration, dtype=np.float64),
+            num_words=np.array(stats.num_words, dtype=np.int64),
+            num_chars=np.array(stats.num_chars, dtype=np.int64),
+            flagged=np.array([json.dumps(entry) for entry in stats.flagged], dtype=str),
+            **{name: np.array(getattr(stats, name), dtype=np.float64) for name in QUALITY_ARRAYS}
+        )
+    os.replace(cache_path + ".tmp", cache_path)
+
+
+def read_cached_stats(manifest_path, cache_path, stat=None):
+    """
+    Read the cached statistics of a manifest, None if there are none or the manifest changed.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        cache_path (str): Path of the cache.
+        stat (os.stat_result): Size and mtime the cache is checked against (default: os.stat(manifest_path)).
+    """
+    if not os.path.exists(cache_path):
+        return None
+    stat = stat or os.stat(manifest_path)
+    with np.load(cache_path) as data:
+        if (int(data["version"]) != STATS_VERSION or int(data["manifest_size"]) != stat.st_size
+                or int(data["manifest_mtime_ns"]) != stat.st_mtime_ns):
+            return None
+        stats = RunningStats()
+        stats.total_duration = float(data["total_duration"])
+        stats.vocabulary = set(data["vocabulary"].tolist())
+        stats.characters = set(data["characters"].tolist())
+        stats.duration = data["duration"].tolist()
+        stats.num_words = data["num_words"].tolist()
+        stats.num_chars = data["num_chars"].tolist()
+        for name in QUALITY_ARRAYS:
+            setattr(stats, name, data[name].tolist())
+        stats.flagged = [json.loads(entry) for entry in data["flagged"].tolist()]
+        stats.num_entries = len(stats.duration)
+    return stats
+
+
+def load_stats(manifest_path, num_workers=None, cache_path=None):
+    """
+    Statistics of a manifest, from the cache when the manifest has the same size and mtime as
+    when they were computed, otherwise computed with compute_stats and cached.
+    Args:
+        manifest_path (str): Path to the JSONL manifest.
+        num_workers (int): Number of worker processes for compute_stats.
+        cache_path (str): Path of the cache (default: <manifest_path>.stats.npz).
+    Returns:
+        RunningStats: Statistics of the manifest.
+    """
+    cache_path = cache_path or default_cache_path(manifest_path)
+    stats = read_cached_stats(manifest_path, cache_path)
+    if stats is not None:
+        return stats
+
+    start_time = time.perf_counter()
+    stats = compute_stats(manifest_path, num_workers)
+    save_stats(stats, manifest_path, cache_path)
+    print(f"Statistics of {stats.num_entries} entries computed in {time.perf_counter() - start_time:.2f} s, cached in {cache_path}")
+    return stats
+
+
+class FixedHistogram:
+    """
+    Counts of values in bins of a fixed width aligned on multiples of the width. Adding values
+    only touches the new values, bins are added as smaller or larger values arrive. NaN values
+    (entries without the field) are not counted.
+    """
+
+    def __init__(self, bin_width: float):
+        self.bin_width = bin_width
+        self.first_bin = 0  # Index of the bin of counts[0], negative for negative values (e.g. dBFS)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        bins = np.floor(values / self.bin_width).astype(np.int64)
+        if not len(self.counts):
+            self.first_bin = int(bins.min())
+        elif bins.min() < self.first_bin:
+            self.counts = np.pad(self.counts, (self.first_bin - int(bins.min()), 0))
+            self.first_bin = int(bins.min())
+        counts = np.bincount(bins - self.first_bin)
+        if len(counts) > len(self.counts):
+            self.counts = np.pad(self.counts, (0, len(counts) - len(self.counts)))
+        self.counts[:len(counts)] += counts
+
+    @property
+    def edges(self):
+        return (self.first_bin + np.arange(len(self.counts) + 1)) * self.bin_width
+
+
+class ManifestTail:
+    """
+    Reads the entries appended to a manifest since the last call.
+    Appends in place (create_training_manifest --update adding lectures) are read incrementally.
+    When the path is replaced by a new file (a manifest rebuilt in a .tmp file and renamed), the
+    new file is read again from its start.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.offset = 0
+        self._file = None
+
+    def _replaced(self):
+        """True if the path now names another file than the one open (e.g. a rebuilt manifest)."""
+        try:
+            return os.stat(self.manifest_path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def open(self):
+        """
+        Open the manifest, reading will start from its first line.
+        Returns:
+            os.stat_result: Size and mtime of the file opened.
+        """
+        self._file = open(self.manifest_path, "rb")
+        self.offset = 0
+        return os.fstat(self._file.fileno())
+
+    def read_new(self):
+        """
+        Returns:
+            tuple: (new entries, reset) where reset is True if the file was replaced or truncated
+                   and the entries start again from the first line.
+        """
+        reset = False
+        if self._file is not None and (self._replaced() or os.fstat(self._file.fileno()).st_size < self.offset):
+            self._file.close()
+            self._file = None
+            reset = True
+        if self._file is None:
+            if not os.path.exists(self.manifest_path):
+                return [], reset
+            self.open()
+
+        self._file.seek(self.offset)
+        data = self._file.read()
+        # A line still being written is left for the next call
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()], reset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LiveStats:
+    """
+    Statistics of a manifest that is still being written, updated from the new lines only.
+    Starts from the statistics cache when it matches the manifest, then every update() reads the
+    bytes added since the last one and folds the new entries into the running statistics and
+    fixed-width histograms. The ingestion rate is measured over the last RATE_WINDOW seconds.
+    """
+
+    def __init__(self, manifest_path: str, bin_widths: dict = None, cache_path: str = None):
+        self.manifest_path = manifest_path
+        self.bin_widths = dict(BIN_WIDTHS, **(bin_widths or {}))
+        self.tail = ManifestTail(manifest_path)
+        self._lock = threading.Lock()
+        self._reset()
+
+        # Skip the part of the manifest already covered by the cache
+        cache_path = cache_path or default_cache_path(manifest_path)
+        if os.path.exists(manifest_path):
+            stat = self.tail.open()
+            cached = read_cached_stats(manifest_path, cache_path, stat)
+            if cached is not None:
+                # The cache matched this size of the open file, which is also where the new lines start
+                self.tail.offset = stat.st_size
+                self._fold(cached)
+
+    def _reset(self):
+        self.stats = RunningStats()
+        self.histograms = {name: FixedHistogram(width) for name, width in self.bin_widths.items()}
+        self.samples = deque()
+
+    def _fold(self, stats):
+        for name, histogram in self.histograms.items():
+            histogram.add(getattr(stats, name))
+        self.stats.merge(stats)
+
+    def update(self):
+        """
+        Read and add the entries appended since the last update.
+        Returns:
+            int: Number of new entries.
+        """
+        with self._lock:
+            entries, reset = self.tail.read_new()
+            if reset:
+                self._reset()
+            new = RunningStats()
+            for entry in entries:
+                new.add(entry)
+            self._fold(new)
+
+            now = time.monotonic()
+            self.samples.append((now, self.stats.num_entries, self.stats.total_duration))
+            while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+                self.samples.popleft()
+            return len(entries)
+
+    def rates(self):
+        """
+        Returns:
+            tuple: (records per second, hours of audio per minute) over the last RATE_WINDOW seconds.
+        """
+        with self._lock:
+            if len(self.samples) < 2:
+                return 0.0, 0.0
+            (start, entries_start, duration_start), (end, entries_end, duration_end) = self.samples[0], self.samples[-1]
+            elapsed = max(end - start, 1e-9)
+            return (entries_end - entries_start) / elapsed, (duration_end - duration_start) / 3600 / (elapsed / 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute (or read from the cache) the statistics of a JSONL manifest.")
+    parser.add_argument("manifest", nargs="?", default="./train_manifest.jsonl", help="JSONL manifest file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    stats = load_stats(args.manifest, args.workers)
+    print(f"Total number of hours: {stats.total_hours:.2f}")
+    print(f"Total number of utterances: {stats.num_entries}")
+    print(f"Vocabulary size: {len(stats.vocabulary)} words")
+    print(f"Alphabet size: {len(stats.alphabet)} chars")
@@ -0,0 +1,254 @@
+import os
+import glob
+import json
+import time
+import heapq
+import atexit
+import socket
+import cProfile
+import argparse
+import threading
+from contextlib import contextmanager
+
+
+# Settings are read from the environment so that worker processes started by a pool inherit them
+METRICS_DIR_ENV = "NPTEL_METRICS_DIR"    # Directory of the metrics-*.jsonl files and metrics.prom, unset to disable
+PROFILE_TOP_ENV = "NPTEL_PROFILE_TOP"    # Keep cProfile dumps of the N slowest items of each process, 0 to disable
+
+# Outcomes not printed on the console (they are still recorded)
+QUIET_OUTCOMES = ("skipped", "hit")
+
+_lock = threading.Lock()
+_local = threading.local()
+_slowest = []  # Heap of (seconds, profile path) of the profiles kept by this process
+
+
+class Span:
+    """Measurements of one item of a stage, filled in by the code inside the span."""
+
+    def __init__(self, stage, item):
+        self.stage = stage
+        self.item = item
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.outcome = "ok"
+        self.error = None
+        self.seconds = 0.0
+
+
+def metrics_dir():
+    return os.environ.get(METRICS_DIR_ENV)
+
+
+def enable(directory, profile_top=0):
+    """
+    Record spans of this process and of the processes it starts to <directory>/metrics-<host>-<pid>.jsonl
+    (see spans_file), and write the Prometheus summary <directory>/metrics.prom when this process exits.
+    Args:
+        directory (str): Metrics directory.
+        profile_top (int): Keep cProfile dumps of the slowest N items per process in <directory>/profiles.
+    """
+    os.makedirs(directory, exist_ok=True)
+    os.environ[METRICS_DIR_ENV] = os.path.abspath(directory)
+    os.environ[PROFILE_TOP_ENV] = str(profile_top)
+    atexit.register(write_prometheus, directory, os.path.join(directory, "metrics.prom"))
+
+
+def spans_file(directory):
+    """
+    JSONL file the spans of this process are appended to. Every process (of every host sharing the
+    directory) has its own file: appends of several hosts to one file on a network file system can
+    interleave and tear lines.
+    """
+    return os.path.join(directory, f"metrics-{socket.gethostname()}-{os.getpid()}.jsonl")
+
+
+def _record(span):
+    directory = metrics_dir()
+    if directory is None:
+        return
+    record = {
+        "time": time.time(),
+        "stage": span.stage,
+        "item": None if span.item is None else str(span.item),
+        "seconds": round(span.seconds, 6),
+        "bytes_in": int(span.bytes_in),
+        "bytes_out": int(span.bytes_out),
+        "outcome": span.outcome,
+        "host": socket.gethostname(),
+        "pid": os.getpid()
+    }
+    if span.error:
+        record["error"] = span.error
+    os.makedirs(directory, exist_ok=True)
+    # One write per line, so the lines of the threads of this process do not interleave
+    with _lock, open(spans_file(directory), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def _keep_profile(span, profiler):
+    """Dump the profile of a span if it is among the slowest of this process, dropping the one it replaces."""
+    top = int(os.environ.get(PROFILE_TOP_ENV, "0") or 0)
+    profile_dir = os.path.join(metrics_dir(), "profiles")
+    with _lock:
+        if len(_slowest) >= top and span.seconds <= _slowest[0][0]:
+            return
+        os.makedirs(profile_dir, exist_ok=True)
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in f"{span.stage}-{os.path.basename(str(span.item))}")
+        path = os.path.join(profile_dir, f"{name}-{os.getpid()}-{int(span.seconds * 1000)}ms.prof")
+        profiler.dump_stats(path)
+        heapq.heappush(_slowest, (span.seconds, path))
+        if len(_slowest) > top:
+            _, dropped = heapq.heappop(_slowest)
+            if os.path.exists(dropped):
+                os.remove(dropped)
+
+
+@contextmanager
+def span(stage, item=None, report=True):
+    """
+    Measure one item of a stage: wall time, bytes in and out and outcome.
+    The code inside sets span.bytes_in, span.bytes_out and span.outcome ("ok" by default, "error"
+    if an exception escapes). When metrics are enabled the span is appended to spans_file and,
+    with profiling on, the item is run under cProfile. A line is printed for the item unless its
+    outcome is in QUIET_OUTCOMES or report is False.
+    Args:
+        stage (str): Name of the stage, e.g. "audio".
+        item: Name of the item, e.g. a file path (None for a span covering a whole stage).
+        report (bool): Print the span on the console.
+    """
+    current = Span(stage, item)
+    profiler = None
+    if (metrics_dir() and item is not None and int(os.environ.get(PROFILE_TOP_ENV, "0") or 0) > 0
+            and not getattr(_local, "profiling", False)):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _local.profiling = True
+        except ValueError:
+            # Python 3.12+ allows a single active profiler per process, items of other threads go unprofiled
+            profiler = None
+
+    start_time = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = "error"
+        current.error = current.error or str(e)
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start_time
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            _keep_profile(current, profiler)
+        _record(current)
+        if report and current.outcome not in QUIET_OUTCOMES:
+            print(format_span(current))
+
+
+def format_span(current):
+    """One console line for a span, e.g. "[audio] video_1.mp4: ok in 12.3 s (45.1 MB -> 3.2 MB)"."""
+    message = f"[{current.stage}]"
+    if current.item is not None:
+        message += f" {current.item}:"
+    message += f" {current.outcome} in {current.seconds:.2f} s"
+    if current.bytes_in or current.bytes_out:
+        message += f" ({current.bytes_in / 1e6:.2f} MB -> {current.bytes_out / 1e6:.2f} MB)"
+    if current.error:
+        message += f" - {current.error}"
+    return message
+
+
+def file_size(path):
+    """Size of a file, 0 if it does not exist (or is a URL)."""
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def read_spans(path):
+    """
+    Read the spans recorded in a metrics directory, merging the files of all processes (and the
+    metrics.jsonl of older runs), or in a single JSONL file.
+    Lines that cannot be decoded, e.g. the last line of a process killed while writing it, are skipped.
+    Args:
+        path (str): Metrics directory or JSONL file.
+    Returns:
+        list: Span records.
+    """
+    paths = sorted(glob.glob(os.path.join(path, "metrics*.jsonl"))) if os.path.isdir(path) else [path]
+    spans, skipped = [], 0
+    for jsonl_path in paths:
+        with open(jsonl_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    skipped += 1
+    if skipped:
+        print(f"Warning: skipped {skipped} undecodable lines in {path}.")
+    return spans
+
+
+def write_prometheus(path, prom_path):
+    """
+    Summarise the spans of a metrics directory (or JSONL file) in the Prometheus text format, per
+    stage and outcome: nptel_span_seconds (summary: _sum, _count), nptel_span_seconds_max,
+    nptel_bytes_in_total and nptel_bytes_out_total.
+    """
+    if not os.path.exists(path):
+        return
+    totals = {}
+    for record in read_spans(path):
+        key = (record["stage"], record["outcome"])
+        total = totals.setdefault(key, {"count": 0, "seconds": 0.0, "max": 0.0, "bytes_in": 0, "bytes_out": 0})
+        total["count"] += 1
+        total["seconds"] += record["seconds"]
+        total["max"] = max(total["max"], record["seconds"])
+        total["bytes_in"] += record["bytes_in"]
+        total["bytes_out"] += record["bytes_out"]
+
+    lines = []
+    metrics = [
+        ("nptel_span_seconds", "summary", "Wall time of the items of each stage.", None),
+        ("nptel_span_seconds_max", "gauge", "Longest item of each stage in seconds.", "max"),
+        ("nptel_bytes_in_total", "counter", "Bytes read by the items of each stage.", "bytes_in"),
+        ("nptel_bytes_out_total", "counter", "Bytes written by the items of each stage.", "bytes_out"),
+    ]
+    for name, kind, help_text, field in metrics:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (stage, outcome), total in sorted(totals.items()):
+            labels = f'{{stage="{stage}",outcome="{outcome}"}}'
+            if field is None:
+                lines += [f"{name}_sum{labels} {total['seconds']:.6f}", f"{name}_count{labels} {total['count']}"]
+            else:
+                lines.append(f"{name}{labels} {total[field]}")
+
+    tmp_path = prom_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, prom_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the spans recorded in a metrics directory.")
+    parser.add_argument("metrics_dir", help="Directory given in --metrics-dir or NPTEL_METRICS_DIR")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of slowest items listed")
+    args = parser.parse_args()
+
+    write_prometheus(args.metrics_dir, os.path.join(args.metrics_dir, "metrics.prom"))
+    spans = read_spans(args.metrics_dir)
+
+    print(f"{'stage':<24}{'outcome':<12}{'items':>8}{'seconds':>12}{'max s':>10}{'MB in':>10}{'MB out':>10}")
+    groups = {}
+    for record in spans:
+        groups.setdefault((record["stage"], record["outcome"]), []).append(record)
+    for (stage, outcome), records in sorted(groups.items()):
+        seconds = [r["seconds"] for r in records]
+        print(f"{stage:<24}{outcome:<12}{len(records):>8}{sum(seconds):>12.2f}{max(seconds):>10.2f}"
+              f"{sum(r['bytes_in'] for r in records) / 1e6:>10.2f}{sum(r['bytes_out'] for r in records) / 1e6:>10.2f}")
+
+    print(f"\nSlowest {args.slowest} items:")
+    for record in sorted(spans, key=lambda r: r["seconds"], reverse=True)[:args.slowest]:
+        print(f"  {record['seconds']:>10.2f} s  [{record['stage']}] {record['item']} ({record['outcome']})")
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+from fetcher import HostLimiter, create_session, fetch_with_retries
+from catalog import load_catalog
+from downloader import DataDownloader
+from audio_preprocessor import HEAD_TRIM, TAIL_TRIM, SAMPLE_RATE, OUTPUT_FORMATS, OUTPUT_FORMAT, process_audio, output_path
+from concurrent.futures import ProcessPoolExecutor
+from text_preprocessor import process_pdf, rules_versions
+from manifest_creator import create_training_manifest
+import metrics
+
+
+STAGES = ("download", "audio", "text", "manifest")
+
+
+class PipelineState:
+    """
+    Status of every step of every lecture ("done" or "failed"), saved to a JSON file after each change
+    so that a restarted pipeline skips the steps already done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.lectures = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.lectures = json.load(f)["lectures"]
+
+    def status(self, index, step):
+        with self._lock:
+            return self.lectures.get(str(index), {}).get(step)
+
+    def mark(self, index, step, status, error=None):
+        with self._lock:
+            lecture = self.lectures.setdefault(str(index), {})
+            lecture[step] = status
+            if error:
+                lecture[f"{step}_error"] = error
+            else:
+                lecture.pop(f"{step}_error", None)
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "lectures": self.lectures}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class Stage:
+    """
+    One step of the pipeline: a bounded input queue and a fixed number of worker threads.
+    A worker takes a lecture, runs the step unless the state says it is done and its outputs exist,
+    and passes the lecture to the next stage. A full queue blocks the stage before it, so no stage
+    runs more than queue_size lectures ahead of the next one. A lecture whose step fails stops there.
+    With batch=True a worker takes every lecture waiting in the queue at once and runs the step
+    on the whole list.
+    """
+
+    def __init__(self, name: str, run, outputs, state: PipelineState, workers: int = 1, queue_size: int = 4, batch: bool = False):
+        self.name = name
+        self.run = run
+        self.outputs = outputs
+        self.state = state
+        self.workers = workers
+        self.batch = batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.counts = {"done": 0, "skipped": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def is_done(self, lecture):
+        return (self.state.status(lecture["index"], self.name) == "done"
+                and all(os.path.exists(path) for path in self.outputs(lecture)))
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def finish(self):
+        """Wait until every lecture put in the queue so far has been processed."""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _count(self, status, number=1):
+        with self._lock:
+            self.counts[status] += number
+
+    def _work(self):
+        while True:
+            lecture = self.queue.get()
+            if lecture is None:
+                return
+            lectures = [lecture]
+            stop = False
+            if self.batch:
+                # Take what else is waiting, the step runs once for all of it
+                while True:
+                    try:
+                        lecture = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if lecture is None:
+                        stop = True
+                        break
+                    lectures.append(lecture)
+
+            pending = [lecture for lecture in lectures if not self.is_done(lecture)]
+            self._count("skipped", len(lectures) - len(pending))
+            failed = set()
+            if pending:
+                # The step functions report their own files, this span covers the step of the lecture(s)
+                item = ",".join(str(lecture["index"]) for lecture in pending)
+                with metrics.span(f"pipeline_{self.name}", item, report=False) as step:
+                    try:
+                        self.run(pending if self.batch else pending[0])
+                        for lecture in pending:
+                            self.state.mark(lecture["index"], self.name, "done")
+                        self._count("done", len(pending))
+                    except Exception as e:
+                        for lecture in pending:
+                            self.state.mark(lecture["index"], self.name, "failed", str(e))
+                            failed.add(lecture["index"])
+                        self._count("failed", len(pending))
+                        step.outcome = "failed"
+                        step.error = str(e)
+                        print(f"{self.name} failed for lecture(s) {sorted(failed)}: {e}")
+
+            if self.next_stage is not None:
+                for lecture in lectures:
+                    if lecture["index"] not in failed:
+                        self.next_stage.queue.put(lecture)
+            if stop:
+                return
+
+
+def run_pipeline(catalog_path, videos_dir="./videos", transcripts_dir="./transcripts", audio_dir="./preprocessed_audio",
+                 text_dir="./preprocessed_text", manifest_path="train_manifest.jsonl", state_path="pipeline_state.json",
+                 download_workers=4, per_host=2, audio_workers=4, text_workers=2, queue_size=4,
+                 head_trim=HEAD_TRIM, tail_trim=TAIL_TRIM, sample_rate=SAMPLE_RATE, output_format=OUTPUT_FORMAT):
+    """
+    Run every lecture of a course catalog through the download, audio, text and manifest stages.
+    Lectures flow from stage to stage through bounded queues, so the audio of lecture 1 is converted
+    while lecture 2 is downloaded. The manifest stage updates the manifest for the lectures that
+    reached it (create_training_manifest with update=True, unchanged entries are reused).
+    Steps already done in the state file are skipped.
+    PDFs are processed in a pool of text_workers processes: PyMuPDF does not support being used
+    from several threads at once, so the threads of the text stage only hand PDFs to the pool.
+    Args:
+        catalog_path (str): Path to the course catalog (see downloader.py scrape).
+        videos_dir, transcripts_dir, audio_dir, text_dir (str): Directories of every stage's files.
+        manifest_path (str): Path of the JSONL manifest.
+        state_path (str): Path of the state file.
+        download_workers (int): Number of lectures downloaded at once.
+        per_host (int): Maximum number of concurrent downloads per host.
+        audio_workers (int): Number of ffmpeg conversions running at once.
+        text_workers (int): Number of PDFs processed at once.
+        queue_size (int): Number of lectures waiting between two stages.
+        head_trim, tail_trim (float): Seconds removed from the start and end of the audio.
+        sample_rate (int): Output sampling rate in Hz.
+        output_format (str): Audio format, "wav", "flac" or "opus".
+    Returns:
+        dict: done, skipped and failed counts of every stage.
+    """
+    catalog = load_catalog(catalog_path)
+    state = PipelineState(state_path)
+    session = create_session(pool_size=download_workers * 2)
+    limiter = HostLimiter(per_host)
+    cache_dir = os.path.join(text_dir, ".cache")
+    raw_version, clean_version = rules_versions()
+    for directory in (videos_dir, transcripts_dir, audio_dir, text_dir, cache_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    def video_path(lecture):
+        return os.path.join(videos_dir, f"video_{lecture['index']}.mp4")
+
+    def pdf_path(lecture):
+        return os.path.join(transcripts_dir, f"lec{lecture['index']}.pdf")
+
+    def text_path(lecture):
+        return os.path.join(text_dir, f"lec{lecture['index']}.txt")
+
+    def download(lecture):
+        for url, path in ((lecture.get("video_url"), video_path(lecture)), (lecture.get("transcript_url"), pdf_path(lecture))):
+            if not url:
+                raise ValueError(f"no URL for {os.path.basename(path)} in the catalog")
+            result = fetch_with_retries(url, path, session, limiter)
+            if result["status"] in ("failed", "incomplete"):
+                raise RuntimeError(f"{path}: {result.get('error', result['status'])}")
+
+    def audio(lecture):
+        result = process_audio(video_path(lecture), audio_dir, head_trim, tail_trim, sample_rate, output_format)
+        if result["status"] == "failed":
+            raise RuntimeError(result["error"])
+
+    def text(lecture):
+        result = text_pool.submit(process_pdf, pdf_path(lecture), text_path(lecture), cache_dir, raw_version, clean_version).result()
+        if result["status"] == "failed":
+            raise RuntimeError(result["error"])
+
+    def manifest(lectures):
+        create_training_manifest(audio_dir, text_dir, manifest_path, update=True)
+
+    stages = [
+        Stage("download", download, lambda lecture: [video_path(lecture), pdf_path(lecture)], state, download_workers, queue_size),
+        Stage("audio", audio, lambda lecture: [output_path(video_path(lecture), audio_dir, output_format)], state, audio_workers, queue_size),
+        Stage("text", text, lambda lecture: [text_path(lecture)], state, text_workers, queue_size),
+        Stage("manifest", manifest, lambda lecture: [manifest_path], state, 1, len(catalog["lectures"]) + 1, batch=True)
+    ]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next_stage = next_stage
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=text_workers) as text_pool:
+        for stage in stages:
+            stage.start()
+        for lecture in catalog["lectures"]:
+            stages[0].queue.put(lecture)
+        # A stage is finished only once the one before it has passed on all its lectures
+        for stage in stages:
+            stage.finish()
+
+    print(f"Pipeline finished in {time.time() - start_time:.0f} seconds.")
+    for stage in stages:
+        print(f"  {stage.name}: {stage.counts['done']} done, {stage.counts['skipped']} already done, {stage.counts['failed']} failed")
+    return {stage.name: stage.counts for stage in stages}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the lectures of a course through download, audio, text and manifest stages.")
+    parser.add_argument("--course-url", default="https://nptel.ac.in/courses/106106184", help="Course scraped when the catalog does not exist")
+    parser.add_argument("--catalog", default="./catalog.json", help="Path to the course catalog file")
+    parser.add_argument("--videos-dir", default="./videos")
+    parser.add_argument("--transcripts-dir", default="./transcripts")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio")
+    parser.add_argument("--text-dir", default="./preprocessed_text")
+    parser.add_argument("--manifest", default="train_manifest.jsonl")
+    parser.add_argument("--state", default="pipeline_state.json", help="State file recording the steps done")
+    parser.add_argument("--download-workers", type=int, default=4, help="Number of lectures downloaded at once")
+    parser.add_argument("--per-host", type=int, default=2, help="Number of concurrent downloads per host")
+    parser.add_argument("--audio-workers", type=int, default=4, help="Number of audio conversions running at once")
+    parser.add_argument("--text-workers", type=int, default=2, help="Number of PDFs processed at once (in separate processes)")
+    parser.add_argument("--queue-size", type=int, default=4, help="Number of lectures waiting between two stages")
+    parser.add_argument("--head-trim", type=float, default=HEAD_TRIM, help="Seconds removed from the start")
+    parser.add_argument("--tail-trim", type=float, default=TAIL_TRIM, help="Seconds removed from the end")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="Output sampling rate in Hz")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT, help="Output audio format")
+    parser.add_argument("--metrics-dir", default=None, help="Record a span per file and stage in <dir>/metrics-<host>-<pid>.jsonl and metrics.prom")
+    parser.add_argument("--profile-top", type=int, default=0, help="With --metrics-dir, keep cProfile dumps of the N slowest files per process")
+    args = parser.parse_args()
+
+    if args.metrics_dir:
+        metrics.enable(args.metrics_dir, args.profile_top)
+
+    if load_catalog(args.catalog) is None:
+        DataDownloader(args.course_url).scrape_catalog(args.catalog)
+
+    run_pipeline(args.catalog, args.videos_dir, args.transcripts_dir, args.audio_dir, args.text_dir, args.manifest, args.state,
+                 args.download_workers, args.per_host, args.audio_workers, args.text_workers, args.queue_size,
+                 args.head_trim, args.tail_trim, args.sample_rate, args.format)
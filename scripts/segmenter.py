@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import wave
+import argparse
+from text_preprocessor import clean_text, load_raw_text
+from manifest_creator import get_audio_duration, lecture_number
+from audio_preprocessor import HEAD_TRIM, read_sidecar, decode_audio
+from metrics import span, file_size
+
+
+# "(Refer Slide Time: mm:ss)", "(Refer Time: mm:ss)" and the same with hh:mm:ss
+MARKER_PATTERN = re.compile(r"\(Refer (?:Slide )?Time: (?:(\d{1,2}):)?(\d{1,2}):(\d{2})\)")
+
+
+def split_on_markers(raw_text):
+    """
+    Split the raw transcript text on its "Refer Slide Time" markers.
+    Args:
+        raw_text (str): Raw text as returned by extract_text (markers not removed).
+    Returns:
+        list: (time in seconds of the lecture video, text) tuples. The text before the first
+              marker gets time 0.
+    """
+    chunks = []
+    position, time_seconds = 0, 0
+    for match in MARKER_PATTERN.finditer(raw_text):
+        chunks.append((time_seconds, raw_text[position:match.start()]))
+        hours, minutes, seconds = match.groups()
+        time_seconds = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+        position = match.end()
+    chunks.append((time_seconds, raw_text[position:]))
+    return chunks
+
+
+def build_segments(raw_text, audio_duration, head_trim=HEAD_TRIM, min_duration=1.0, max_duration=None):
+    """
+    Turn a raw transcript into time-bounded utterances of the trimmed audio.
+    Each "Refer Slide Time" marker starts a new segment at (marker time - head_trim) seconds of the
+    audio, a segment ends where the next one starts (the last one at the end of the audio).
+    Markers that go back in time are ignored, segments shorter than min_duration are merged into
+    the next one and segments longer than max_duration are dropped.
+    Args:
+        raw_text (str): Raw text as returned by extract_text.
+        audio_duration (float): Duration of the trimmed audio in seconds.
+        head_trim (float): Seconds removed from the start of the video in the audio stage.
+        min_duration (float): Minimum segment duration in seconds.
+        max_duration (float): Maximum segment duration in seconds (None for no limit).
+    Returns:
+        list: Dicts with offset, duration and cleaned text.
+    """
+    # Convert the marker times to audio offsets, skipping markers that are not increasing
+    anchors = []
+    for time_seconds, text in split_on_markers(raw_text):
+        offset = min(max(float(time_seconds - head_trim), 0.0), audio_duration)
+        if anchors and offset <= anchors[-1][0]:
+            anchors[-1] = (anchors[-1][0], anchors[-1][1] + " " + text)
+        else:
+            anchors.append((offset, text))
+
+    segments = []
+    pending_text, pending_start = "", None
+    for i, (offset, text) in enumerate(anchors):
+        end = anchors[i + 1][0] if i + 1 < len(anchors) else audio_duration
+        start = offset if pending_start is None else pending_start
+        text = (pending_text + " " + text).strip()
+
+        # Too short: carry the text over to the next segment
+        if end - start < min_duration and i + 1 < len(anchors):
+            pending_text, pending_start = text, start
+            continue
+        pending_text, pending_start = "", None
+
+        cleaned = clean_text(text).strip()
+        if not cleaned or end <= start:
+            continue
+        if max_duration is not None and end - start > max_duration:
+            continue
+        segments.append({"offset": round(start, 3), "duration": round(end - start, 3), "text": cleaned})
+
+    return segments
+
+
+def cut_wav(audio_filepath, output_file, offset, duration):
+    """
+    Copy a time range of a WAV file into a new WAV file, without decoding (PCM frames are copied).
+    A FLAC or Opus source is decoded (only the time range) and written as WAV.
+    Args:
+        audio_filepath (str): Path to the source audio.
+        output_file (str): Path of the chunk written.
+        offset (float): Start of the chunk in seconds.
+        duration (float): Duration of the chunk in seconds.
+    """
+    if not audio_filepath.lower().endswith(".wav"):
+        with open(output_file, "wb") as f:
+            f.write(decode_audio(audio_filepath, offset, duration))
+        return
+
+    with wave.open(audio_filepath, "rb") as source:
+        rate = source.getframerate()
+        source.setpos(min(int(round(offset * rate)), source.getnframes()))
+        frames = source.readframes(int(round(duration * rate)))
+        with wave.open(output_file, "wb") as chunk:
+            chunk.setparams(source.getparams())
+            chunk.writeframes(frames)
+
+
+def create_segmented_manifest(audio_dir, pdf_dir, output_file, min_duration=1.0, max_duration=None,
+                              cut_dir=None, cache_dir=None):
+    """
+    Create a training manifest with one entry per transcript segment instead of one per lecture.
+    Entries have audio_filepath, offset, duration and text. With cut_dir, every segment is also
+    written as its own WAV file in cut_dir and the entry points to it (offset 0).
+    Args:
+        audio_dir (str): Directory containing audio_<n>.wav files.
+        pdf_dir (str): Directory containing the transcript PDFs lec<n>.pdf.
+        output_file (str): Path to the output JSONL manifest file.
+        min_duration (float): Minimum segment duration in seconds.
+        max_duration (float): Maximum segment duration in seconds (None for no limit).
+        cut_dir (str): Directory where segment WAV files are written (None to only use offsets).
+        cache_dir (str): Text cache directory of process_pdfs, reused for the raw text (optional).
+    """
+    if cut_dir:
+        os.makedirs(cut_dir, exist_ok=True)
+
+    audio_files = sorted((f for f in os.listdir(audio_dir) if lecture_number(f) is not None), key=lecture_number)
+    num_segments, total_duration = 0, 0.0
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        for audio_file in audio_files:
+            audio_number = lecture_number(audio_file)
+            audio_filepath = os.path.join(audio_dir, audio_file).replace("\\", "/")
+            pdf_path = os.path.join(pdf_dir, f"lec{audio_number}.pdf")
+
+            if not os.path.exists(pdf_path):
+                print(f"Warning: Transcript for {audio_file} not found. Skipping.")
+                continue
+
+            with span("segment", audio_file) as item:
+                # Use the trim actually applied in the audio stage when it was recorded
+                metadata = read_sidecar(audio_filepath) or {}
+                head_trim = metadata.get("head_trim", HEAD_TRIM)
+
+                raw_text = load_raw_text(pdf_path, cache_dir)
+                segments = build_segments(raw_text, get_audio_duration(audio_filepath), head_trim, min_duration, max_duration)
+
+                for i, segment in enumerate(segments, start=1):
+                    entry = {"audio_filepath": audio_filepath, "offset": segment["offset"], "duration": segment["duration"], "text": segment["text"]}
+                    if cut_dir:
+                        chunk_filepath = os.path.join(cut_dir, f"audio_{audio_number}_{i:04d}.wav").replace("\\", "/")
+                        cut_wav(audio_filepath, chunk_filepath, segment["offset"], segment["duration"])
+                        entry = {"audio_filepath": chunk_filepath, "duration": segment["duration"], "text": segment["text"]}
+                    f.write(json.dumps(entry) + "\n")
+                    total_duration += segment["duration"]
+
+                num_segments += len(segments)
+                item.bytes_in = file_size(pdf_path)
+
+    print(f"Segmented manifest with {num_segments} entries ({total_duration / 3600:.2f} hours) created at: {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split lectures into utterances using the 'Refer Slide Time' markers of the transcripts.")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio", help="Directory containing audio_<n>.wav files")
+    parser.add_argument("--pdf-dir", default="./transcripts", help="Directory containing the transcript PDFs")
+    parser.add_argument("--output", default="train_manifest_segments.jsonl", help="Output JSONL manifest file")
+    parser.add_argument("--min-duration", type=float, default=1.0, help="Shorter segments are merged into the next one")
+    parser.add_argument("--max-duration", type=float, default=None, help="Longer segments are dropped")
+    parser.add_argument("--cut-dir", default=None, help="Write every segment as its own WAV file in this directory")
+    parser.add_argument("--cache-dir", default="./preprocessed_text/.cache", help="Text cache directory of text_preprocessor.py")
+    args = parser.parse_args()
+
+    create_segmented_manifest(args.audio_dir, args.pdf_dir, args.output, args.min_duration, args.max_duration,
+                              args.cut_dir, args.cache_dir)
@@ -0,0 +1,244 @@
+import io
+import os
+import json
+import time
+import wave
+import random
+import tarfile
+import argparse
+from audio_preprocessor import decode_audio
+
+
+SHARD_SIZE = 1024 * 1024 * 1024  # Maximum size of a shard in bytes (1 GB)
+DEV_FRACTION = 0.05              # Fraction of the samples put in the dev split
+SEED = 0                         # Seed of the shuffle, the same seed gives the same shards
+
+
+def manifest_line_offsets(manifest_path):
+    """
+    Read the byte offset of every non-empty line of a JSONL manifest in one pass.
+    Only the offsets are kept in memory, entries are parsed again when they are written.
+    """
+    offsets = []
+    with open(manifest_path, "rb") as f:
+        position = 0
+        for line in f:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+    return offsets
+
+
+def read_audio_bytes(entry):
+    """
+    Get the audio bytes of a manifest entry.
+    Entries without an offset are the whole file, in its own format (WAV, FLAC or Opus). Entries with
+    an offset (segmented manifests) are cut out of their lecture WAV without decoding, or decoded to
+    WAV when the lecture is compressed.
+    Returns:
+        tuple: File content and its extension without the dot ("wav", "flac" or "opus").
+    """
+    audio_filepath = entry["audio_filepath"]
+    extension = os.path.splitext(audio_filepath)[1].lstrip(".").lower()
+    if "offset" not in entry:
+        with open(audio_filepath, "rb") as f:
+            return f.read(), extension
+    if extension != "wav":
+        return decode_audio(audio_filepath, entry["offset"], entry["duration"]), "wav"
+
+    buffer = io.BytesIO()
+    with wave.open(audio_filepath, "rb") as source:
+        rate = source.getframerate()
+        source.setpos(min(int(round(entry["offset"] * rate)), source.getnframes()))
+        frames = source.readframes(int(round(entry["duration"] * rate)))
+        with wave.open(buffer, "wb") as chunk:
+            chunk.setparams(source.getparams())
+            chunk.writeframes(frames)
+    return buffer.getvalue(), "wav"
+
+
+def add_member(tar, name, data):
+    """Add a file with the given name and bytes to an open tar file."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+class ShardWriter:
+    """
+    Writes samples into numbered tar shards <prefix>-000000.tar, <prefix>-000001.tar, ...
+    A new shard is started when the next sample would make the current one larger than max_size.
+    Each shard is written to a .tmp file and renamed once it is complete.
+    """
+
+    def __init__(self, output_dir: str, prefix: str, max_size: int = SHARD_SIZE):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_size = max_size
+        self.shards = []
+        self._tar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_shard(self):
+        name = f"{self.prefix}-{len(self.shards):06d}.tar"
+        self._path = os.path.join(self.output_dir, name)
+        self._tar = tarfile.open(self._path + ".tmp", "w")
+        self.shards.append({"path": name, "num_samples": 0, "duration": 0.0, "size": 0})
+
+    def _close_shard(self):
+        self._tar.close()
+        self.shards[-1]["size"] = os.path.getsize(self._path + ".tmp")
+        self.shards[-1]["duration"] = round(self.shards[-1]["duration"], 3)
+        os.replace(self._path + ".tmp", self._path)
+        self._tar = None
+
+    def write(self, key, audio, text, metadata, audio_format="wav"):
+        """
+        Add one sample, stored as <key>.wav (or .flac, .opus), <key>.txt and <key>.json.
+        Args:
+            key (str): Name of the sample in the shard, without dots.
+            audio (bytes): Audio file content.
+            text (str): Transcript.
+            metadata (dict): Duration and source of the sample.
+            audio_format (str): Extension of the audio member.
+        """
+        members = [(f"{key}.{audio_format}", audio), (f"{key}.txt", text.encode("utf-8")),
+                   (f"{key}.json", json.dumps(metadata).encode("utf-8"))]
+        # Every member takes a 512 byte header and is padded to a multiple of 512 bytes
+        sample_size = sum(512 + -(-len(data) // 512) * 512 for _, data in members)
+
+        if self._tar is not None and self.shards[-1]["num_samples"]:
+            # The archive ends with two empty blocks and is padded to a whole record
+            end_size = -(-(self._tar.offset + sample_size + 1024) // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+            if end_size > self.max_size:
+                self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+
+        for name, data in members:
+            add_member(self._tar, name, data)
+        self.shards[-1]["num_samples"] += 1
+        self.shards[-1]["duration"] += metadata["duration"]
+
+    def close(self):
+        if self._tar is not None:
+            self._close_shard()
+
+
+def export_shards(manifest_path, output_dir, max_shard_size=SHARD_SIZE, dev_fraction=DEV_FRACTION, seed=SEED):
+    """
+    Pack the audio and transcripts of a manifest into size-bounded tar shards for sequential reading.
+    Samples are shuffled with the seed and split into "train" and "dev"; each sample is stored
+    WebDataset-style as <key>.wav, <key>.txt and <key>.json (duration, source audio_filepath and offset).
+    An index, shards.json, lists the shards of each split with their sample counts and durations.
+    Args:
+        manifest_path (str): Path to the JSONL manifest (lecture or segmented).
+        output_dir (str): Directory where the shards and shards.json are written.
+        max_shard_size (int): Maximum size of a shard in bytes.
+        dev_fraction (float): Fraction of the samples put in the dev split.
+        seed (int): Seed of the shuffle.
+    Returns:
+        dict: The shard index.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.perf_counter()
+
+    offsets = manifest_line_offsets(manifest_path)
+    random.Random(seed).shuffle(offsets)
+    num_dev = int(round(len(offsets) * dev_fraction))
+    splits = {"train": offsets[num_dev:], "dev": offsets[:num_dev]}
+
+    index = {
+        "manifest": manifest_path,
+        "seed": seed,
+        "dev_fraction": dev_fraction,
+        "max_shard_size": max_shard_size,
+        "splits": {}
+    }
+
+    with open(manifest_path, "rb") as manifest:
+        for split, split_offsets in splits.items():
+            with ShardWriter(output_dir, split, max_shard_size) as writer:
+                for i, offset in enumerate(split_offsets):
+                    manifest.seek(offset)
+                    entry = json.loads(manifest.readline())
+                    metadata = {"duration": entry["duration"], "audio_filepath": entry["audio_filepath"]}
+                    if "offset" in entry:
+                        metadata["offset"] = entry["offset"]
+                    audio, audio_format = read_audio_bytes(entry)
+                    writer.write(f"{split}_{i:08d}", audio, entry["text"], metadata, audio_format)
+
+            index["splits"][split] = {
+                "num_samples": sum(shard["num_samples"] for shard in writer.shards),
+                "duration": round(sum(shard["duration"] for shard in writer.shards), 3),
+                "shards": writer.shards
+            }
+            print(f"{split}: {index['splits'][split]['num_samples']} samples "
+                  f"({index['splits'][split]['duration'] / 3600:.2f} hours) in {len(writer.shards)} shards")
+
+    index_path = os.path.join(output_dir, "shards.json")
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"Shards written to {output_dir} in {time.perf_counter() - start_time:.1f} s, index at {index_path}")
+    return index
+
+
+def iter_shards(index_path, split="train"):
+    """
+    Stream the samples of a split, reading each shard sequentially from start to end.
+    Args:
+        index_path (str): Path to the shards.json written by export_shards.
+        split (str): "train" or "dev".
+    Yields:
+        dict: key, audio (file bytes), audio_format ("wav", "flac" or "opus"), text and the metadata
+        fields (duration, audio_filepath, ...).
+    """
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    shard_dir = os.path.dirname(index_path)
+
+    for shard in index["splits"][split]["shards"]:
+        # "r|" reads the tar as a stream, members are never looked up by name
+        with tarfile.open(os.path.join(shard_dir, shard["path"]), "r|") as tar:
+            sample = {}
+            for member in tar:
+                key, extension = member.name.rsplit(".", 1)
+                if sample and sample["key"] != key:
+                    yield sample
+                    sample = {}
+                sample["key"] = key
+                data = tar.extractfile(member).read()
+                if extension in ("wav", "flac", "opus"):
+                    sample["audio"] = data
+                    sample["audio_format"] = extension
+                elif extension == "txt":
+                    sample["text"] = data.decode("utf-8")
+                elif extension == "json":
+                    sample.update(json.loads(data))
+            if sample:
+                yield sample
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a JSONL manifest into tar shards, or list the samples of exported shards.")
+    parser.add_argument("manifest", help="JSONL manifest to export, or shards.json with --list")
+    parser.add_argument("--output-dir", default="./shards", help="Directory where the shards are written")
+    parser.add_argument("--shard-size", type=float, default=SHARD_SIZE / 1024 ** 2, help="Maximum shard size in MB")
+    parser.add_argument("--dev-fraction", type=float, default=DEV_FRACTION, help="Fraction of the samples put in the dev split")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the shuffle")
+    parser.add_argument("--list", choices=["train", "dev"], default=None, help="Print the samples of a split of shards.json")
+    args = parser.parse_args()
+
+    if args.list:
+        for sample in iter_shards(args.manifest, args.list):
+            print(f"{sample['key']}\t{sample['duration']:.2f} s\t{sample['audio_filepath']}")
+    else:
+        export_shards(args.manifest, args.output_dir, int(args.shard_size * 1024 ** 2), args.dev_fraction, args.seed)
@@ -1,84 +1,77 @@
-import pdfplumber
 import fitz  # PyMuPDF
 import os
+import socket
+import time
 import string
 import re
+import hashlib
+import inspect
+import argparse
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from num2words import num2words
+from metrics import span, file_size
 
 
-def get_non_bold_lines(pdf_path):
+# Bump these when the output changes without the code of extract_text / clean_text changing
+# (e.g. a PyMuPDF or num2words upgrade), to invalidate the cached text
+EXTRACT_TEXT_VERSION = 1
+CLEAN_TEXT_VERSION = 1
+
+
+def is_bold(span):
     """
-    Identify non-bold lines on the first page of a PDF.
+    Check whether a PyMuPDF text span is bold, from its font flags or its font name.
     Args:
-        pdf_path (str): Path to the PDF file.
+        span (dict): Span from page.get_text("dict").
     Returns:
-        list: A list of non-bold lines (text) from the first page.
+        bool: True if the span is bold.
     """
-    with pdfplumber.open(pdf_path) as pdf:
-        if not pdf.pages:  
-            return []
-        
-        first_page = pdf.pages[0]  # Get the first page
-        chars = first_page.chars
-        lines = {}                 # Dictionary to group characters by their y-coordinate (line)
-
-        # Group characters by their vertical position (y-coordinate)
-        for char in chars:
-            line_y = round(char["top"], 1)  
-            if line_y not in lines:
-                lines[line_y] = []
-            lines[line_y].append(char)
-
-        non_bold_lines = []
-
-        # Check each line and collect non-bold lines
-        for line_chars in lines.values():
-            if not any("Bold" in char["fontname"] for char in line_chars):
-                line_text = "".join(char["text"] for char in line_chars).strip()
-                if line_text:  # Exclude empty lines
-                    non_bold_lines.append(line_text)
-
-        return non_bold_lines
+    return bool(span.get("flags", 0) & fitz.TEXT_FONT_BOLD) or "bold" in span.get("font", "").lower()
 
 
 def extract_text(pdf_path):
     """
     Extract text from a PDF, excluding bold lines from the first page.
+    The PDF is opened once with PyMuPDF. On the first page, every visual line (spans sharing
+    the same top coordinate) that contains bold text is left out, e.g. the lecture title header.
     Args:
         pdf_path (str): Path to the PDF file.
     Returns:
         str: Extracted text from the PDF, excluding bold lines from the first page.
     """
-    # Get non-bold lines from the first page using pdfplumber
-    non_bold_lines_first_page = get_non_bold_lines(pdf_path)
-
-    # Open the PDF document using PyMuPDF
-    doc = fitz.open(pdf_path)
     text = []
 
-    # Iterate over each page
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)  
-        blocks = page.get_text("dict")["blocks"]  
-        page_lines = []
-
-        for block in blocks:
-            for line in block.get("lines", []):
-                line_text = "".join([span.get("text", "") for span in line.get("spans", [])]).strip()
-
-                # Exclude bold lines on the first page
-                if page_num == 0 and line_text not in non_bold_lines_first_page:
-                    continue
+    with fitz.open(pdf_path) as doc:
+        # Iterate over each page
+        for page_num, page in enumerate(doc):
+            blocks = page.get_text("dict")["blocks"]
+            lines = [line for block in blocks for line in block.get("lines", [])]
+            page_lines = []
+
+            # Top coordinates of the first page rows holding bold text
+            bold_rows = set()
+            if page_num == 0:
+                bold_rows = {
+                    round(span["bbox"][1], 1)
+                    for line in lines for span in line.get("spans", [])
+                    if span.get("text", "").strip() and is_bold(span)
+                }
+
+            for line in lines:
+                spans = line.get("spans", [])
+                line_text = "".join([span.get("text", "") for span in spans]).strip()
+
+                # Exclude bold and empty lines on the first page
+                if page_num == 0:
+                    if not line_text or any(round(span["bbox"][1], 1) in bold_rows for span in spans):
+                        continue
 
                 page_lines.append(line_text)
 
-        # Add remaining lines to the text output
-        if page_lines:
-            text.append("\n".join(page_lines))
-
-    # Close the document
-    doc.close()
+            # Add remaining lines to the text output
+            if page_lines:
+                text.append("\n".join(page_lines))
 
     return "\n".join(text)
 
@@ -137,32 +130,174 @@ def clean_text(raw_text):
     return text
 
 
-def process_pdfs(input_dir, output_dir):
+def file_sha256(path):
     """
-    Process PDFs to extract text, clean it, and save it as .txt files.
+    Compute the SHA-256 hash of a file's content.
     Args:
-        input_dir (str): Directory containing the input PDF files.
-        output_dir (str): Directory to save the processed .txt files.
+        path (str): Path to the file.
+    Returns:
+        str: Hex digest.
     """
-    os.makedirs(output_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rules_versions():
+    """
+    Versions of the extraction and cleaning rules used in cache keys.
+    They change when EXTRACT_TEXT_VERSION or CLEAN_TEXT_VERSION is bumped and when the source
+    of extract_text or clean_text is edited, so stale cached text is never reused.
+    Returns:
+        tuple: (extraction version, extraction + cleaning version)
+    """
+    def source_hash(function):
+        return hashlib.sha1(inspect.getsource(function).encode("utf-8")).hexdigest()[:10]
 
-    for file_name in os.listdir(input_dir):
-        if file_name.endswith(".pdf"):
-            pdf_path = os.path.join(input_dir, file_name)
-            output_path = os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}.txt")
+    raw_version = f"e{EXTRACT_TEXT_VERSION}-{source_hash(extract_text)}"
+    clean_version = f"{raw_version}.c{CLEAN_TEXT_VERSION}-{source_hash(clean_text)}"
+    return raw_version, clean_version
 
-            print(f"Processing: {file_name}")
-            
-            raw_text = extract_text(pdf_path)
-            processed_text = clean_text(raw_text)
 
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(processed_text)
+def write_atomic(path, text):
+    """Write a text file so that readers never see a partially written file."""
+    # Unique per host and process: a job handed over to another worker may be run twice at once
+    tmp_path = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
 
-    print("Processing complete.")
+
+def load_raw_text(pdf_path, cache_dir=None):
+    """
+    Get the raw (uncleaned) text of a PDF from the text cache of process_pdfs,
+    extracting and caching it if it is not there yet.
+    Args:
+        pdf_path (str): Path to the PDF file.
+        cache_dir (str): Text cache directory, or None to always extract.
+    Returns:
+        str: Raw text of the PDF, as returned by extract_text.
+    """
+    if cache_dir is None:
+        return extract_text(pdf_path)
+
+    raw_version, _ = rules_versions()
+    raw_cache = os.path.join(cache_dir, f"{file_sha256(pdf_path)}.{raw_version}.raw.txt")
+    if os.path.exists(raw_cache):
+        with open(raw_cache, "r", encoding="utf-8") as f:
+            return f.read()
+
+    raw_text = extract_text(pdf_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(raw_cache, raw_text)
+    return raw_text
+
+
+def process_pdf(pdf_path, output_path, cache_dir, raw_version, clean_version):
+    """
+    Extract and clean one PDF, reusing cached results keyed by the PDF content hash.
+    The raw text is cached per extraction version and the cleaned text per cleaning version,
+    so editing clean_text only re-runs the cleaning, not the PDF extraction.
+    Returns:
+        dict: file name, status ("hit", "cleaned", "extracted" or "failed") and number of PDF bytes.
+    """
+    file_name = os.path.basename(pdf_path)
+    result = {"file": file_name, "status": "hit", "bytes": os.path.getsize(pdf_path)}
+
+    with span("text", file_name) as item:
+        item.bytes_in = result["bytes"]
+        try:
+            pdf_hash = file_sha256(pdf_path)
+            raw_cache = os.path.join(cache_dir, f"{pdf_hash}.{raw_version}.raw.txt")
+            clean_cache = os.path.join(cache_dir, f"{pdf_hash}.{clean_version}.txt")
+
+            if os.path.exists(clean_cache):
+                with open(clean_cache, "r", encoding="utf-8") as f:
+                    processed_text = f.read()
+            else:
+                if os.path.exists(raw_cache):
+                    result["status"] = "cleaned"
+                    with open(raw_cache, "r", encoding="utf-8") as f:
+                        raw_text = f.read()
+                else:
+                    result["status"] = "extracted"
+                    raw_text = extract_text(pdf_path)
+                    write_atomic(raw_cache, raw_text)
+
+                processed_text = clean_text(raw_text)
+                write_atomic(clean_cache, processed_text)
+
+            # Only rewrite the output when it differs from the cached text
+            current_text = None
+            if os.path.exists(output_path):
+                with open(output_path, "r", encoding="utf-8") as f:
+                    current_text = f.read()
+            if current_text != processed_text:
+                write_atomic(output_path, processed_text)
+
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+        item.bytes_out = file_size(output_path)
+        item.outcome = result["status"]
+        item.error = result.get("error")
+
+    return result
+
+
+def process_pdfs(input_dir, output_dir, num_workers=None, cache_dir=None):
+    """
+    Process PDFs to extract text, clean it, and save it as .txt files.
+    PDFs are processed in parallel by a pool of processes. Results are cached by PDF content
+    hash and rules version (see rules_versions), so unchanged PDFs are not processed again.
+    Args:
+        input_dir (str): Directory containing the input PDF files.
+        output_dir (str): Directory to save the processed .txt files.
+        num_workers (int): Number of worker processes (default: number of CPUs).
+        cache_dir (str): Directory of the text cache (default: <output_dir>/.cache).
+    Returns:
+        list: One result dict per PDF.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache_dir = cache_dir or os.path.join(output_dir, ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    raw_version, clean_version = rules_versions()
+
+    file_names = sorted(f for f in os.listdir(input_dir) if f.endswith(".pdf"))
+    start_time = time.time()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                process_pdf,
+                os.path.join(input_dir, file_name),
+                os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}.txt"),
+                cache_dir, raw_version, clean_version
+            )
+            for file_name in file_names
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    elapsed_time = max(time.time() - start_time, 1e-9)
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("hit", "cleaned", "extracted", "failed")}
+    total_mb = sum(r["bytes"] for r in results) / 1e6
+    print(f"Processing complete. {counts['hit']} cache hits, {counts['cleaned'] + counts['extracted']} misses "
+          f"({counts['extracted']} extracted, {counts['cleaned']} re-cleaned), {counts['failed']} failed.")
+    print(f"{len(results)} PDFs in {elapsed_time:.2f} s: {len(results) / elapsed_time:.1f} PDFs/s, {total_mb / elapsed_time:.2f} MB/s")
+    return results
 
 
 if __name__ == "__main__":
-    input_dir = "./transcripts"
-    output_dir = "./preprocessed_text"
-    process_pdfs(input_dir, output_dir)
+    parser = argparse.ArgumentParser(description="Extract and clean the text of transcript PDFs.")
+    parser.add_argument("--input-dir", default="./transcripts", help="Directory containing the PDF files")
+    parser.add_argument("--output-dir", default="./preprocessed_text", help="Directory where the .txt files are written")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--cache-dir", default=None, help="Text cache directory (default: <output-dir>/.cache)")
+    args = parser.parse_args()
+
+    process_pdfs(args.input_dir, args.output_dir, args.workers, args.cache_dir)
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import wave
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from segmenter import cut_wav
+from metrics import span, file_size
+
+
+FRAME_SECONDS = 0.03    # Length of the frames whose energy is measured
+THRESHOLD_DB = -40.0    # Frames quieter than this (dB relative to full scale) are silence
+MIN_SILENCE = 0.3       # Only pauses at least this long are used as cut points
+MIN_SEGMENT = 2.0       # Segments are at least this long (except a file shorter than that)
+MAX_SEGMENT = 20.0      # Segments are at most this long, forced cuts go to the quietest frame
+BLOCK_SECONDS = 60.0    # Audio read and processed at once in chunked mode
+
+
+def iter_frame_energies(audio_filepath, frame_seconds=FRAME_SECONDS, block_seconds=BLOCK_SECONDS):
+    """
+    Stream the frame energies of a 16-bit mono WAV file, reading it in blocks with the wave module.
+    Args:
+        audio_filepath (str): Path to the WAV file.
+        frame_seconds (float): Frame length in seconds.
+        block_seconds (float): Seconds of audio read at once, None to read the whole file.
+    Yields:
+        np.ndarray: Energies in dBFS of the frames of one block (the last partial frame is dropped).
+    """
+    with wave.open(audio_filepath, "rb") as audio:
+        if audio.getsampwidth() != 2 or audio.getnchannels() != 1:
+            raise ValueError(f"{audio_filepath}: expected 16-bit mono PCM")
+        frame_length = int(round(frame_seconds * audio.getframerate()))
+        if block_seconds is None:
+            frames_per_block = audio.getnframes()
+        else:
+            # A block always holds a whole number of energy frames
+            frames_per_block = max(int(block_seconds / frame_seconds), 1) * frame_length
+
+        while True:
+            data = audio.readframes(frames_per_block)
+            samples = np.frombuffer(data, dtype="<i2")
+            num_frames = len(samples) // frame_length
+            if num_frames == 0:
+                return
+            frames = samples[:num_frames * frame_length].reshape(num_frames, frame_length).astype(np.float32)
+            power = np.mean(frames * frames, axis=1) / (32768.0 * 32768.0)
+            yield 10.0 * np.log10(power + 1e-10)
+
+
+def silence_runs(silent):
+    """
+    Find the runs of True values in a boolean array.
+    Returns:
+        tuple: (starts, ends) arrays, each run covers [start, end).
+    """
+    padded = np.concatenate(([False], silent, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def find_segments(energy_blocks, frame_seconds=FRAME_SECONDS, threshold_db=THRESHOLD_DB, min_silence=MIN_SILENCE,
+                  min_segment=MIN_SEGMENT, max_segment=MAX_SEGMENT):
+    """
+    Choose cut points from streamed frame energies.
+    A segment is cut in the middle of the first pause of at least min_silence seconds found after
+    min_segment seconds. If no pause is found before max_segment seconds, it is cut at the quietest
+    frame between min_segment and max_segment. Only the energies since the last cut are kept, so
+    memory does not grow with the length of the file.
+    Args:
+        energy_blocks (iterable): Arrays of frame energies in dBFS, e.g. from iter_frame_energies.
+        frame_seconds (float): Frame length in seconds.
+        threshold_db (float): Silence threshold in dBFS.
+        min_silence (float): Minimum pause length in seconds.
+        min_segment (float): Minimum segment length in seconds (at least one frame, so that every cut moves forward).
+        max_segment (float): Maximum segment length in seconds.
+    Returns:
+        list: (start, end) tuples in seconds covering the whole file.
+    """
+    min_silence_frames = max(int(round(min_silence / frame_seconds)), 1)
+    min_segment_frames = max(int(round(min_segment / frame_seconds)), 1)
+    max_segment_frames = max(int(round(max_segment / frame_seconds)), min_segment_frames + 1)
+
+    cuts = []             # Frame index of every cut
+    buffer = np.empty(0, dtype=np.float32)
+    buffer_start = 0      # Frame index of buffer[0], i.e. of the last cut
+
+    def next_cut():
+        starts, ends = silence_runs(buffer < threshold_db)
+        # Ignore a pause still going on at the end of the buffer, it may continue in the next block
+        complete = ends < len(buffer)
+        long_enough = (ends - starts) >= min_silence_frames
+        middles = (starts + ends) // 2
+        candidates = middles[complete & long_enough & (middles >= min_segment_frames) & (middles <= max_segment_frames)]
+        if len(candidates):
+            return int(candidates[0])
+        if len(buffer) > max_segment_frames:
+            return min_segment_frames + int(np.argmin(buffer[min_segment_frames:max_segment_frames]))
+        return None
+
+    for energies in energy_blocks:
+        buffer = np.concatenate((buffer, energies))
+        cut = next_cut()
+        while cut is not None:
+            cuts.append(buffer_start + cut)
+            buffer = buffer[cut:]
+            buffer_start += cut
+            cut = next_cut()
+
+    total_frames = buffer_start + len(buffer)
+
+    # The rest of the file is the last segment, merged into the previous one if too short
+    if cuts and len(buffer) < min_segment_frames:
+        cuts.pop()
+
+    bounds = [0] + cuts + [total_frames]
+    return [
+        (round(start * frame_seconds, 3), round(end * frame_seconds, 3))
+        for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+    ]
+
+
+def segment_file(audio_filepath, block_seconds=BLOCK_SECONDS, **options):
+    """
+    Split one WAV file on pauses.
+    Args:
+        audio_filepath (str): Path to the WAV file.
+        block_seconds (float): Seconds of audio processed at once, None to load the whole file.
+        **options: threshold_db, min_silence, min_segment, max_segment (see find_segments).
+    Returns:
+        dict: audio_filepath, segments ((start, end) tuples in seconds), audio duration and processing time.
+    """
+    start_time = time.perf_counter()
+    with span("vad", audio_filepath) as item:
+        item.bytes_in = file_size(audio_filepath)
+        frame_seconds = options.pop("frame_seconds", FRAME_SECONDS)
+        energies = iter_frame_energies(audio_filepath, frame_seconds, block_seconds)
+        segments = find_segments(energies, frame_seconds, **options)
+        with wave.open(audio_filepath, "rb") as audio:
+            duration = audio.getnframes() / float(audio.getframerate())
+    return {
+        "audio_filepath": audio_filepath,
+        "segments": segments,
+        "duration": duration,
+        "processing_time": time.perf_counter() - start_time
+    }
+
+
+def segment_files(audio_dir, output_file, num_workers=None, cut_dir=None, block_seconds=BLOCK_SECONDS, **options):
+    """
+    Split every WAV file of a directory on pauses with a pool of processes and write the segments
+    as JSONL entries with audio_filepath, offset and duration.
+    Args:
+        audio_dir (str): Directory containing the WAV files.
+        output_file (str): Path of the JSONL segments file.
+        num_workers (int): Number of worker processes (default: number of CPUs).
+        cut_dir (str): Also write every segment as its own WAV file in this directory (optional).
+        block_seconds (float): Seconds of audio processed at once, None to load whole files.
+        **options: threshold_db, min_silence, min_segment, max_segment (see find_segments).
+    """
+    audio_files = sorted(os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.endswith(".wav"))
+    if cut_dir:
+        os.makedirs(cut_dir, exist_ok=True)
+
+    start_time = time.perf_counter()
+    total_audio, num_segments = 0.0, 0
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor, open(output_file, "w", encoding="utf-8") as f:
+        futures = [executor.submit(segment_file, path, block_seconds, **options) for path in audio_files]
+        for future in futures:
+            result = future.result()
+            audio_filepath = result["audio_filepath"].replace("\\", "/")
+            base_name = os.path.splitext(os.path.basename(audio_filepath))[0]
+
+            for i, (start, end) in enumerate(result["segments"], start=1):
+                entry = {"audio_filepath": audio_filepath, "offset": start, "duration": round(end - start, 3)}
+                if cut_dir:
+                    chunk_filepath = os.path.join(cut_dir, f"{base_name}_{i:04d}.wav").replace("\\", "/")
+                    cut_wav(audio_filepath, chunk_filepath, start, end - start)
+                    entry = {"audio_filepath": chunk_filepath, "duration": round(end - start, 3)}
+                f.write(json.dumps(entry) + "\n")
+
+            total_audio += result["duration"]
+            num_segments += len(result["segments"])
+
+    elapsed_time = time.perf_counter() - start_time
+    print(f"{num_segments} segments from {len(audio_files)} files ({total_audio / 3600:.2f} hours) in {elapsed_time:.1f} s, "
+          f"real-time factor {elapsed_time / max(total_audio, 1e-9):.5f}. Written to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split long lecture WAVs on pauses using frame energies.")
+    parser.add_argument("--audio-dir", default="./preprocessed_audio", help="Directory containing the WAV files")
+    parser.add_argument("--output", default="vad_segments.jsonl", help="Output JSONL file of segments")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--cut-dir", default=None, help="Write every segment as its own WAV file in this directory")
+    parser.add_argument("--block-seconds", type=float, default=BLOCK_SECONDS, help="Seconds of audio processed at once, 0 to load whole files")
+    parser.add_argument("--threshold-db", type=float, default=THRESHOLD_DB, help="Silence threshold in dBFS")
+    parser.add_argument("--min-silence", type=float, default=MIN_SILENCE, help="Minimum pause length in seconds")
+    parser.add_argument("--min-segment", type=float, default=MIN_SEGMENT, help="Minimum segment length in seconds")
+    parser.add_argument("--max-segment", type=float, default=MAX_SEGMENT, help="Maximum segment length in seconds")
+    args = parser.parse_args()
+
+    segment_files(args.audio_dir, args.output, args.workers, args.cut_dir, args.block_seconds or None,
+                  threshold_db=args.threshold_db, min_silence=args.min_silence,
+                  min_segment=args.min_segment, max_segment=args.max_segment)
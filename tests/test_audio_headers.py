@@ -0,0 +1,39 @@
+import wave
+import pytest
+from audio_headers import probe_audio
+
+
+def write_wav(path, seconds=1.0, sample_rate=16000):
+    with wave.open(str(path), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(sample_rate)
+        audio.writeframes(b"\x00\x01" * int(seconds * sample_rate))
+
+
+def test_wav_info(tmp_path):
+    path = tmp_path / "audio_1.wav"
+    write_wav(path, 2.0)
+    info = probe_audio(str(path))
+    assert (info["format"], info["sample_rate"], info["channels"], info["num_samples"]) == ("wav", 16000, 1, 32000)
+    assert info["duration"] == 2.0 and info["data_offset"] == 44
+
+
+@pytest.mark.parametrize("size", [4, 13, 20, 30, 36, 40])
+def test_truncated_wav_raises_value_error(tmp_path, size):
+    path = tmp_path / "audio_1.wav"
+    write_wav(path)
+    data = path.read_bytes()[:size]
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        probe_audio(str(path))
+
+
+def test_zero_block_align_raises_value_error(tmp_path):
+    path = tmp_path / "audio_1.wav"
+    write_wav(path)
+    data = bytearray(path.read_bytes())
+    data[32:34] = b"\x00\x00"  # block_align of the fmt chunk
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        probe_audio(str(path))
@@ -0,0 +1,30 @@
+import subprocess
+import pytest
+import audio_preprocessor
+from audio_preprocessor import decode_audio
+
+
+def fake_ffmpeg(monkeypatch, output):
+    monkeypatch.setattr(audio_preprocessor, "probe_audio", lambda path: {"sample_rate": 16000})
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=output))
+
+
+@pytest.mark.parametrize("output", [
+    b"",
+    b"RIFF\xff\xff\xff\xffWAVE",
+    b"RIFF\xff\xff\xff\xffWAVEfmt \x00\x00\x00\x00",
+    b"RIFF\xff\xff\xff\xffWAVELIST\x04\x00\x00\x00abcd",
+])
+def test_output_without_data_chunk(monkeypatch, output):
+    # These used to loop forever looking for the data chunk
+    fake_ffmpeg(monkeypatch, output)
+    with pytest.raises(ValueError):
+        decode_audio("lecture.flac", 10.0)
+
+
+def test_data_size_filled_in(monkeypatch):
+    fmt = b"fmt \x10\x00\x00\x00" + bytes(16)
+    fake_ffmpeg(monkeypatch, b"RIFF\xff\xff\xff\xffWAVE" + fmt + b"data\xff\xff\xff\xff" + bytes(6))
+    wav = decode_audio("lecture.flac")
+    assert int.from_bytes(wav[4:8], "little") == len(wav) - 8
+    assert wav[36:40] == b"data" and int.from_bytes(wav[40:44], "little") == 6
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import time
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+import requests
+import batch_scraper
+from batch_scraper import DriverPool, run_batch
+from catalog import save_catalog
+from downloader import DataDownloader
+from selenium.common.exceptions import WebDriverException
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A local copy of course pages: /courses/<id>/index.html listing links to the MP4 and PDF of every lecture."""
+    root = tmp_path / "site"
+    root.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def write_course(root, course, lectures, broken=()):
+    """Write a course page and its files; the links of the lectures in broken are missing, as on a page the scraper fails on."""
+    course_dir = root / "courses" / course
+    course_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for i in range(1, lectures + 1):
+        (course_dir / f"video_{i}.mp4").write_bytes(b"\x00\x00\x00\x18ftypmp42" + bytes([i]) * 5000)
+        (course_dir / f"lec{i}.pdf").write_bytes(b"%PDF-1.4 lecture " + bytes([i]) * 500)
+        links = "" if i in broken else f'<a class="video" href="video_{i}.mp4">video</a><a class="transcript" href="lec{i}.pdf">pdf</a>'
+        rows.append(f'<div class="lecture" data-index="{i}"><span>Lecture {i}</span>{links}</div>')
+    (course_dir / "index.html").write_text("<html><body>" + "".join(rows) + "</body></html>")
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_calls = 0
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    """Replace the browser scrape by one reading the fixture pages over HTTP, counting the scrapes and drivers."""
+    calls = {"scrapes": [], "drivers": 0, "active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    def scrape_catalog(self, catalog_path):
+        assert isinstance(self.driver, FakeDriver)
+        with lock:
+            calls["scrapes"].append(self.course_url)
+            calls["active"] += 1
+            calls["max_active"] = max(calls["max_active"], calls["active"])
+        try:
+            time.sleep(0.1)
+            page_url = self.course_url.rstrip("/") + "/"
+            page = requests.get(page_url, timeout=10).text
+            lectures = []
+            for index, body in re.findall(r'<div class="lecture" data-index="(\d+)">(.*?)</div>', page):
+                video = re.search(r'class="video" href="([^"]+)"', body)
+                transcript = re.search(r'class="transcript" href="([^"]+)"', body)
+                lectures.append({"index": int(index), "title": f"Lecture {index}",
+                                 "video_url": page_url + video.group(1) if video else None,
+                                 "transcript_url": page_url + transcript.group(1) if transcript else None})
+            catalog = {"course_url": self.course_url, "scraped_at": "", "lectures": lectures}
+            save_catalog(catalog, catalog_path)
+            return catalog
+        finally:
+            with lock:
+                calls["active"] -= 1
+
+    def driver_factory():
+        with lock:
+            calls["drivers"] += 1
+        return FakeDriver()
+
+    monkeypatch.setattr(DataDownloader, "scrape_catalog", scrape_catalog)
+    return calls, driver_factory
+
+
+def read_status(output_dir, course):
+    with open(os.path.join(output_dir, course, "status.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_batch_scrapes_and_downloads_every_course(site, scraper, tmp_path):
+    root, base_url = site
+    calls, driver_factory = scraper
+    courses = [f"c{i}" for i in range(1, 5)]
+    for course in courses:
+        write_course(root, course, 3)
+    output_dir = str(tmp_path / "out")
+
+    statuses = run_batch([f"{base_url}/courses/{c}" for c in courses], output_dir, num_drivers=2, driver_factory=driver_factory)
+
+    assert all(status["state"] == "done" for status in statuses.values())
+    assert calls["drivers"] <= 2 and calls["max_active"] <= 2
+    for course in courses:
+        for i in range(1, 4):
+            assert os.path.exists(os.path.join(output_dir, course, "videos", f"video_{i}.mp4"))
+            assert os.path.exists(os.path.join(output_dir, course, "transcripts", f"lec{i}.pdf"))
+
+
+def test_failed_scrape_is_retried_on_restart(site, scraper, tmp_path):
+    root, base_url = site
+    calls, driver_factory = scraper
+    write_course(root, "good", 2)
+    write_course(root, "broken", 3, broken=(2,))
+    write_course(root, "empty", 0)
+    urls = [f"{base_url}/courses/{c}" for c in ("good", "broken", "empty")]
+    output_dir = str(tmp_path / "out")
+
+    statuses = run_batch(urls, output_dir, driver_factory=driver_factory)
+    assert statuses[urls[0]]["state"] == "done"
+    for course in ("broken", "empty"):
+        status = read_status(output_dir, course)
+        assert status["state"] == "pending"
+        assert status["error"]
+        assert not os.path.exists(os.path.join(output_dir, course, "videos"))
+
+    # The pages are fixed: the restarted batch scrapes the two failed courses again, not the done one
+    write_course(root, "broken", 3)
+    write_course(root, "empty", 1)
+    calls["scrapes"].clear()
+    statuses = run_batch(urls, output_dir, driver_factory=driver_factory)
+    assert sorted(calls["scrapes"]) == sorted(urls[1:])
+    assert all(status["state"] == "done" for status in statuses.values())
+    assert "error" not in read_status(output_dir, "broken")
+
+
+def test_scraped_course_is_only_downloaded_on_restart(site, scraper, tmp_path):
+    root, base_url = site
+    calls, driver_factory = scraper
+    write_course(root, "c1", 2)
+    url = f"{base_url}/courses/c1"
+    output_dir = str(tmp_path / "out")
+
+    # A batch that crashed after the scrape: catalog and "scraped" status, no files
+    course_dir = os.path.join(output_dir, "c1")
+    DataDownloader(url, driver=FakeDriver()).scrape_catalog(os.path.join(course_dir, "catalog.json"))
+    batch_scraper.write_status(os.path.join(course_dir, "status.json"), {"course_url": url, "state": "scraped"})
+    calls["scrapes"].clear()
+
+    statuses = run_batch([url], output_dir, driver_factory=driver_factory)
+    assert calls["scrapes"] == []
+    assert statuses[url]["state"] == "done"
+    assert os.path.exists(os.path.join(course_dir, "videos", "video_2.mp4"))
+
+
+def test_crashed_driver_is_replaced():
+    started = []
+
+    def driver_factory():
+        started.append(FakeDriver())
+        return started[-1]
+
+    pool = DriverPool(1, driver_factory)
+    with pool.acquire() as driver:
+        pass
+    with pytest.raises(WebDriverException):
+        with pool.acquire() as same_driver:
+            assert same_driver is driver
+            raise WebDriverException("invalid session id")
+    assert driver.quit_calls == 1
+
+    # Other errors leave the driver in the pool
+    with pytest.raises(RuntimeError):
+        with pool.acquire() as new_driver:
+            assert new_driver is not driver
+            raise RuntimeError("no lectures found")
+    with pool.acquire() as reused:
+        assert reused is new_driver
+    pool.close()
+    assert len(started) == 2 and new_driver.quit_calls == 1
+
+
+def test_waiting_course_gets_a_new_driver_after_a_crash():
+    pool = DriverPool(1, FakeDriver)
+    crashed, acquired = threading.Event(), []
+
+    def crash():
+        with pytest.raises(WebDriverException):
+            with pool.acquire():
+                crashed.wait(5)
+                raise WebDriverException("chrome not reachable")
+
+    def wait_for_driver():
+        with pool.acquire() as driver:
+            acquired.append(driver)
+
+    first = threading.Thread(target=crash)
+    first.start()
+    time.sleep(0.1)
+    second = threading.Thread(target=wait_for_driver)
+    second.start()
+    time.sleep(0.1)
+    assert not acquired
+    crashed.set()
+    first.join(5)
+    second.join(5)
+    assert len(acquired) == 1 and acquired[0].quit_calls == 0
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from fetcher import fetch_file, fetch_files, create_session
+
+
+class FakeVideoServer(ThreadingHTTPServer):
+    """Serves fake MP4 files from memory, with ETags, Range and If-Range like a static file server."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeVideoHandler)
+        self.files = {}             # path -> bytes
+        self.ignore_range = False   # Answer every GET with the whole file
+        self.delay = 0.0            # Seconds every GET takes
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+def etag(data):
+    return f'"{len(data)}-{hash(data) & 0xFFFFFFFF:x}"'
+
+
+class FakeVideoHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag(data))
+        self.end_headers()
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+            self.send_file()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def send_file(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and not self.server.ignore_range and (if_range is None or if_range == etag(data)):
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            body = data[start:]
+        else:
+            self.send_response(200)
+            body = data
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag(data))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = FakeVideoServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fake_mp4(size, seed=0):
+    """Bytes starting like an MP4 (ftyp box), then a pattern that differs with the seed."""
+    body = bytes((i * 7 + seed) % 251 for i in range(size))
+    return (b"\x00\x00\x00\x18ftypmp42" + body)[:size]
+
+
+def start_part(server, output_file, path, size):
+    """Leave the first size bytes of a download on disk, as an interrupted fetch_file would."""
+    data = server.files[path]
+    with open(output_file + ".part", "wb") as f:
+        f.write(data[:size])
+    with open(output_file + ".part.json", "w", encoding="utf-8") as f:
+        json.dump({"etag": etag(data), "last_modified": None}, f)
+
+
+def test_download_then_skip(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    output_file = str(tmp_path / "video_1.mp4")
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "done"
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+    assert not os.path.exists(output_file + ".part.json")
+
+    assert fetch_file(server.url("/video_1.mp4"), output_file)["status"] == "skipped"
+
+
+def test_resume_part_file(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    output_file = str(tmp_path / "video_1.mp4")
+    start_part(server, output_file, "/video_1.mp4", 100000)
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "resumed"
+    assert result["bytes"] == 200000
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_part_of_replaced_file_is_not_resumed(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    output_file = str(tmp_path / "video_1.mp4")
+    start_part(server, output_file, "/video_1.mp4", 100000)
+    server.files["/video_1.mp4"] = fake_mp4(300000, seed=1)
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "done"
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_part_without_validator_is_not_resumed(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    output_file = str(tmp_path / "video_1.mp4")
+    with open(output_file + ".part", "wb") as f:
+        f.write(fake_mp4(100000, seed=1))
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["bytes"] == 300000
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_finished_file_replaced_on_server(server, tmp_path):
+    output_file = str(tmp_path / "video_1.mp4")
+    with open(output_file, "wb") as f:
+        f.write(fake_mp4(100000))
+    server.files["/video_1.mp4"] = fake_mp4(300000, seed=1)
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "done"
+    assert result["bytes"] == 300000
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_server_ignoring_range(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    server.ignore_range = True
+    output_file = str(tmp_path / "video_1.mp4")
+    start_part(server, output_file, "/video_1.mp4", 100000)
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "done"
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_complete_part_file_answered_416(server, tmp_path):
+    server.files["/video_1.mp4"] = fake_mp4(300000)
+    output_file = str(tmp_path / "video_1.mp4")
+    start_part(server, output_file, "/video_1.mp4", 300000)
+
+    result = fetch_file(server.url("/video_1.mp4"), output_file)
+    assert result["status"] == "resumed"
+    assert result["bytes"] == 0
+    assert open(output_file, "rb").read() == server.files["/video_1.mp4"]
+
+
+def test_per_host_cap(server, tmp_path):
+    server.delay = 0.2
+    jobs = []
+    for i in range(1, 7):
+        server.files[f"/video_{i}.mp4"] = fake_mp4(50000, seed=i)
+        jobs.append((server.url(f"/video_{i}.mp4"), str(tmp_path / f"video_{i}.mp4")))
+
+    results = fetch_files(jobs, max_workers=6, per_host=2, session=create_session(pool_size=6))
+    assert [r["status"] for r in results] == ["done"] * 6
+    assert server.max_active == 2
+    for i, (_, output_file) in enumerate(jobs, 1):
+        assert open(output_file, "rb").read() == server.files[f"/video_{i}.mp4"]
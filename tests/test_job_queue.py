@@ -0,0 +1,116 @@
+import os
+import time
+import sqlite3
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+import job_queue
+from job_queue import JobQueue, enqueue_course, run_worker
+
+
+def write_pdfs(transcripts_dir, count):
+    os.makedirs(transcripts_dir, exist_ok=True)
+    for i in range(1, count + 1):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Lecture {i}: the gradient of the loss with respect to the weights.", fontsize=10)
+        doc.save(os.path.join(transcripts_dir, f"lec{i}.pdf"))
+        doc.close()
+
+
+def test_workers_share_jobs(tmp_path):
+    queue_path = str(tmp_path / "jobs.db")
+    transcripts_dir, text_dir = str(tmp_path / "transcripts"), str(tmp_path / "text")
+    write_pdfs(transcripts_dir, 12)
+    assert enqueue_course(JobQueue(queue_path), transcripts_dir=transcripts_dir, text_dir=text_dir) == 12
+    # Adding the course again adds nothing
+    assert enqueue_course(JobQueue(queue_path), transcripts_dir=transcripts_dir, text_dir=text_dir) == 0
+
+    # Separate processes, as workers on several machines would be
+    with ProcessPoolExecutor(max_workers=3, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(run_worker, queue_path, f"worker-{i}", None, 60, False, 0.1) for i in range(3)]
+        counts = [future.result() for future in futures]
+
+    assert sum(c["done"] for c in counts) == 12
+    assert sum(c["failed"] for c in counts) == 0
+    assert JobQueue(queue_path).counts() == {"text": {"done": 12}}
+    assert sorted(os.listdir(text_dir)) == sorted([".cache"] + [f"lec{i}.txt" for i in range(1, 13)])
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue_path = str(tmp_path / "jobs.db")
+    transcripts_dir, text_dir = str(tmp_path / "transcripts"), str(tmp_path / "text")
+    write_pdfs(transcripts_dir, 1)
+    enqueue_course(JobQueue(queue_path), transcripts_dir=transcripts_dir, text_dir=text_dir)
+
+    # A worker that claims the job and dies without a heartbeat
+    dead = JobQueue(queue_path, lease_seconds=0.2)
+    job = dead.claim("dead-worker")
+    assert job is not None and dead.claim("other-worker") is None
+    time.sleep(0.3)
+
+    counts = run_worker(queue_path, "live-worker", lease_seconds=60, poll_interval=0.1)
+    assert counts == {"done": 1, "failed": 0}
+    # The dead worker can no longer report the job
+    assert not dead.complete(job["id"], "dead-worker")
+
+
+def test_heartbeat_survives_locked_database(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "jobs.db")
+    JobQueue(queue_path).add("text", "slow", {})
+
+    heartbeat = JobQueue.heartbeat
+    calls = []
+
+    def flaky_heartbeat(self, job_id, worker):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return heartbeat(self, job_id, worker)
+
+    # The job outlives its lease several times over, only heartbeats keep it
+    monkeypatch.setattr(JobQueue, "heartbeat", flaky_heartbeat)
+    monkeypatch.setattr(job_queue, "run_job", lambda job: time.sleep(1.5))
+    counts = run_worker(queue_path, "worker", lease_seconds=0.4, poll_interval=0.1)
+
+    assert len(calls) >= 3
+    assert counts == {"done": 1, "failed": 0}
+
+
+def test_result_recorded_after_locked_database(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "jobs.db")
+    JobQueue(queue_path).add("text", "quick", {})
+
+    complete = JobQueue.complete
+    calls = []
+
+    def flaky_complete(self, job_id, worker):
+        calls.append(job_id)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return complete(self, job_id, worker)
+
+    monkeypatch.setattr(JobQueue, "complete", flaky_complete)
+    monkeypatch.setattr(job_queue, "run_job", lambda job: None)
+    monkeypatch.setattr(job_queue, "REPORT_BACKOFF", 0.01)
+    counts = run_worker(queue_path, "worker", poll_interval=0.1)
+
+    assert len(calls) == 3
+    assert counts == {"done": 1, "failed": 0}
+    assert JobQueue(queue_path).counts() == {"text": {"done": 1}}
+
+
+def test_worker_survives_unrecordable_result(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "jobs.db")
+    JobQueue(queue_path).add("text", "bad", {})
+
+    def locked(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    # The result is dropped and the job stays leased until its lease runs out
+    monkeypatch.setattr(JobQueue, "fail", locked)
+    monkeypatch.setattr(job_queue, "run_job", lambda job: 1 / 0)
+    monkeypatch.setattr(job_queue, "REPORT_BACKOFF", 0.01)
+    counts = run_worker(queue_path, "worker", lease_seconds=0.3, poll_interval=0.1)
+
+    assert counts == {"done": 0, "failed": 0}
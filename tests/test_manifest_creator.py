@@ -0,0 +1,93 @@
+import os
+import json
+import wave
+import pytest
+from manifest_creator import create_training_manifest, add_manifest_fields
+
+
+def write_wav(path, seconds, sample_rate=16000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(2 * int(seconds * sample_rate)))
+
+
+def read_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unreadable_entries_are_skipped(tmp_path):
+    audio_dir, text_dir = tmp_path / "audio", tmp_path / "text"
+    os.makedirs(audio_dir)
+    os.makedirs(text_dir)
+    for number in range(1, 5):
+        write_wav(audio_dir / f"audio_{number}.wav", number)
+        (text_dir / f"lec{number}.txt").write_text(f"lecture {number}", encoding="utf-8")
+    # Truncated audio header, text that is not UTF-8, text that cannot be opened as a file
+    (audio_dir / "audio_2.wav").write_bytes((audio_dir / "audio_2.wav").read_bytes()[:30])
+    (text_dir / "lec3.txt").write_bytes(b"lecture \xff\xfe 3")
+    os.remove(text_dir / "lec4.txt")
+    os.makedirs(text_dir / "lec4.txt")
+
+    output_file = str(tmp_path / "manifest.jsonl")
+    create_training_manifest(str(audio_dir), str(text_dir), output_file, num_workers=2)
+
+    entries = read_manifest(output_file)
+    assert [(e["duration"], e["text"]) for e in entries] == [(1.0, "lecture 1")]
+
+    # The skipped entries are built again by an update once their files are fixed
+    (text_dir / "lec3.txt").write_text("lecture 3", encoding="utf-8")
+    create_training_manifest(str(audio_dir), str(text_dir), output_file, num_workers=2, update=True)
+    assert [e["text"] for e in read_manifest(output_file)] == ["lecture 1", "lecture 3"]
+
+
+def test_add_fields_checks_the_entry_count(tmp_path):
+    output_file = tmp_path / "manifest.jsonl"
+    lines = [json.dumps({"audio_filepath": f"audio_{i}.wav", "duration": 1.0, "text": "a"}) + "\n" for i in range(3)]
+    output_file.write_text("".join(lines), encoding="utf-8")
+
+    for fields in ([{"snr_db": 1.0}] * 2, [{"snr_db": 1.0}] * 4):
+        with pytest.raises(ValueError):
+            add_manifest_fields(str(output_file), iter(fields))
+        assert output_file.read_text(encoding="utf-8") == "".join(lines)
+        assert not os.path.exists(str(output_file) + ".tmp")
+
+    add_manifest_fields(str(output_file), [{"snr_db": float(i)} for i in range(3)])
+    assert [e["snr_db"] for e in read_manifest(output_file)] == [0.0, 1.0, 2.0]
+
+
+def test_update_appends_new_lectures_in_place(tmp_path):
+    audio_dir, text_dir = tmp_path / "audio", tmp_path / "text"
+    os.makedirs(audio_dir)
+    os.makedirs(text_dir)
+
+    def add_lecture(number):
+        write_wav(audio_dir / f"audio_{number}.wav", 1)
+        (text_dir / f"lec{number}.txt").write_text(f"lecture {number}", encoding="utf-8")
+
+    for number in (2, 3):
+        add_lecture(number)
+    output_file = str(tmp_path / "manifest.jsonl")
+    create_training_manifest(str(audio_dir), str(text_dir), output_file)
+    inode, first_lines = os.stat(output_file).st_ino, open(output_file, "rb").read()
+
+    # Lectures after the existing ones are appended to the same file
+    add_lecture(4)
+    create_training_manifest(str(audio_dir), str(text_dir), output_file, update=True)
+    assert os.stat(output_file).st_ino == inode
+    assert open(output_file, "rb").read().startswith(first_lines)
+    assert [e["text"] for e in read_manifest(output_file)] == ["lecture 2", "lecture 3", "lecture 4"]
+
+    # A lecture sorting before them needs a new file, in lecture order
+    add_lecture(1)
+    create_training_manifest(str(audio_dir), str(text_dir), output_file, update=True)
+    assert os.stat(output_file).st_ino != inode
+    assert [e["text"] for e in read_manifest(output_file)] == ["lecture 1", "lecture 2", "lecture 3", "lecture 4"]
+
+    # The state file still matches, so the next update reuses every entry
+    inode = os.stat(output_file).st_ino
+    add_lecture(5)
+    create_training_manifest(str(audio_dir), str(text_dir), output_file, update=True)
+    assert os.stat(output_file).st_ino == inode and len(read_manifest(output_file)) == 5
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from manifest_dataset import DurationBucketSampler
+
+
+def test_shards_cover_the_batches_evenly():
+    durations = np.random.default_rng(0).uniform(1, 20, 500)
+    shards = [DurationBucketSampler(durations, max_batch_seconds=100, rank=rank, world_size=2, worker_id=worker, num_workers=2)
+              for rank in range(2) for worker in range(2)]
+    for epoch in range(3):
+        for sampler in shards:
+            sampler.set_epoch(epoch)
+        batches = [list(sampler) for sampler in shards]
+        assert len({len(b) for b in batches}) == 1
+        assert all(len(sampler) == len(b) for sampler, b in zip(shards, batches))
+        positions = np.concatenate([np.concatenate(b) for b in batches])
+        assert len(positions) == len(set(positions.tolist()))
+
+
+def test_fewer_batches_than_shards():
+    durations = np.full(10, 5.0)
+    # Two batches of 5 entries for 4 shards
+    with pytest.raises(ValueError):
+        DurationBucketSampler(durations, max_batch_seconds=25, num_buckets=1, world_size=2, num_workers=2)
+    assert len(DurationBucketSampler(durations, max_batch_seconds=25, num_buckets=1, world_size=2)) == 1
+
+
+def test_len_does_not_rebuild_the_batches(monkeypatch):
+    sampler = DurationBucketSampler(np.arange(1, 101, dtype=np.float64), max_batch_seconds=200)
+    calls = []
+    all_batches = sampler.all_batches
+    monkeypatch.setattr(sampler, "all_batches", lambda: calls.append(1) or all_batches())
+    assert len(sampler) == len(sampler) > 0 and not calls
+    sampler.set_epoch(1)
+    len(sampler), len(sampler)
+    assert len(calls) == 1
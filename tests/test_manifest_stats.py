@@ -0,0 +1,42 @@
+import json
+import manifest_stats
+from manifest_stats import LiveStats, load_stats
+
+
+def entry(i):
+    return json.dumps({"audio_filepath": f"audio_{i}.wav", "duration": 10.0, "text": f"word{i} common"}) + "\n"
+
+
+def test_live_stats_only_read_appended_lines(tmp_path):
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest_path.write_text("".join(entry(i) for i in range(3)), encoding="utf-8")
+    load_stats(str(manifest_path), num_workers=1)
+
+    live = LiveStats(str(manifest_path))
+    assert live.update() == 0 and live.stats.num_entries == 3
+
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write(entry(3) + entry(4)[:10])
+    assert live.update() == 1
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write(entry(4)[10:])
+    assert live.update() == 1
+    assert live.stats.num_entries == 5 and len(live.stats.vocabulary) == 6
+
+
+def test_live_stats_count_lines_appended_during_the_cache_check(tmp_path, monkeypatch):
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest_path.write_text("".join(entry(i) for i in range(3)), encoding="utf-8")
+    load_stats(str(manifest_path), num_workers=1)
+
+    read_cached_stats = manifest_stats.read_cached_stats
+
+    def append_while_reading(*args):
+        stats = read_cached_stats(*args)
+        with open(manifest_path, "a", encoding="utf-8") as f:
+            f.write(entry(3))
+        return stats
+
+    monkeypatch.setattr(manifest_stats, "read_cached_stats", append_while_reading)
+    live = LiveStats(str(manifest_path))
+    assert live.update() == 1 and live.stats.num_entries == 4
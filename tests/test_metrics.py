@@ -0,0 +1,45 @@
+import os
+import json
+import multiprocessing
+import metrics
+
+
+def record_spans(directory, stage, count):
+    os.environ[metrics.METRICS_DIR_ENV] = directory
+    for i in range(count):
+        with metrics.span(stage, f"file_{i}", report=False) as item:
+            item.bytes_in = 10
+
+
+def test_one_file_per_process(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    monkeypatch.setenv(metrics.METRICS_DIR_ENV, directory)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=record_spans, args=(directory, "audio", 20)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    record_spans(directory, "text", 5)
+
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".jsonl"))
+    assert len(files) == 4 and all(f.startswith("metrics-") for f in files)
+    spans = metrics.read_spans(directory)
+    assert sum(s["stage"] == "audio" for s in spans) == 60
+    assert sum(s["stage"] == "text" for s in spans) == 5
+
+
+def test_torn_lines_are_skipped(tmp_path):
+    record = {"stage": "audio", "item": "a", "seconds": 1.5, "bytes_in": 3, "bytes_out": 4, "outcome": "ok"}
+    with open(tmp_path / "metrics.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+        f.write(json.dumps(record)[:20] + json.dumps(record) + "\n")
+        f.write(json.dumps(record)[:25])
+    with open(tmp_path / "metrics-host-1.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps(dict(record, stage="text")) + "\n")
+
+    assert sorted(s["stage"] for s in metrics.read_spans(str(tmp_path))) == ["audio", "text"]
+    metrics.write_prometheus(str(tmp_path), str(tmp_path / "metrics.prom"))
+    prom = (tmp_path / "metrics.prom").read_text()
+    assert 'nptel_span_seconds_count{stage="audio",outcome="ok"} 1' in prom
+    assert 'nptel_bytes_in_total{stage="text",outcome="ok"} 3' in prom
@@ -0,0 +1,27 @@
+import numpy as np
+from vad_segmenter import find_segments
+
+
+def energies(pattern, frames_per_step=10):
+    """Frame energies in dBFS: -20 for speech ("s"), -60 for silence ("."), frames_per_step frames per character."""
+    return np.repeat(np.array([-20.0 if c == "s" else -60.0 for c in pattern], dtype=np.float32), frames_per_step)
+
+
+def test_cuts_in_pauses():
+    segments = find_segments([energies("sssss..sssss..sssss")], frame_seconds=0.1, min_silence=1.0, min_segment=2.0, max_segment=20.0)
+    assert segments == [(0.0, 6.0), (6.0, 13.0), (13.0, 19.0)]
+
+
+def test_zero_min_segment_starting_in_silence():
+    # A file starting with a pause longer than max_segment used to give a forced cut at frame 0,
+    # which never moved the buffer forward
+    segments = find_segments([energies("......sss..sss")], frame_seconds=0.1, min_silence=0.1, min_segment=0.0, max_segment=0.5)
+    assert segments[0][0] == 0.0 and segments[-1][1] == 14.0
+    assert all(end > start for start, end in segments)
+
+
+def test_blocks_give_the_same_cuts():
+    whole = energies("sssss..sssss..sssss....ss")
+    blocks = np.array_split(whole, 7)
+    options = dict(frame_seconds=0.1, min_silence=1.0, min_segment=2.0, max_segment=20.0)
+    assert find_segments(blocks, **options) == find_segments([whole], **options)